@@ -0,0 +1,241 @@
+# -*- coding: utf-8 -*-
+"""
+FarmTech - Cálculo de aplicação de insumos
+Descrição: Calcula a quantidade de insumo por cultura (total e por faixa),
+tanto para um par escolhido no menu quanto para todas as combinações de uma vez,
+e a quantidade exata de cada faixa a partir da divisão real do terreno. Os
+resultados por par ficam em um cache que se invalida quando os registros mudam.
+"""
+
+import math
+import threading
+from array import array
+from collections import OrderedDict
+
+import metricas
+from geometria import faixas_circulo, faixas_poligono, geometria_retangulo, ler_geometria
+
+# ===========================
+# CÁLCULO INDIVIDUAL
+# ===========================
+
+@metricas.cronometrado("calcular_aplicacao")
+def calcular_aplicacao(cultura, insumo):
+    """Retorna (total, por_faixa) em litros para uma cultura e um insumo."""
+    total = cultura["area"] * insumo["dose_m2"]
+    por_faixa = total / cultura["faixas"] if cultura["faixas"] > 0 else 0
+    return total, por_faixa
+
+# ===========================
+# CÁLCULO POR FAIXA
+# ===========================
+
+@metricas.cronometrado("dividir_faixas")
+def areas_das_faixas(cultura, quantidade=None, largura=None, rumo=0.0):
+    """
+    Áreas reais (m²) das faixas paralelas de uma cultura, em ordem.
+
+    As faixas são definidas pela quantidade (padrão: as faixas da cultura) ou
+    pela largura em metros, e pelo rumo em graus a partir do norte. O círculo é
+    dividido de forma analítica; polígonos e retângulos, pelo contorno guardado.
+    Sem contorno (cadastros antigos ou só com a área), o terreno é tratado como
+    um quadrado de mesma área.
+    """
+    if quantidade is None and largura is None:
+        quantidade = cultura["faixas"]
+    if cultura["formato"] == "circular":
+        return faixas_circulo(math.sqrt(cultura["area"] / math.pi), quantidade, largura)
+    poligonos = ler_geometria(cultura["geometria"])
+    if not poligonos:
+        lado = math.sqrt(cultura["area"])
+        poligonos = geometria_retangulo(lado, lado)
+    return faixas_poligono(poligonos, quantidade, largura, rumo)
+
+
+def aplicacao_por_faixa(cultura, insumo, quantidade=None, largura=None, rumo=0.0):
+    """Lista de (área em m², litros) de cada faixa da cultura para o insumo."""
+    dose = insumo["dose_m2"]
+    return [(area, area * dose) for area in areas_das_faixas(cultura, quantidade, largura, rumo)]
+
+# ===========================
+# CACHE DE RESULTADOS
+# ===========================
+
+# Quantidade máxima de resultados guardados (os menos usados saem primeiro)
+CAPACIDADE_CACHE = 4096
+
+# Divisões em faixas guardadas (cada uma pode ter centenas de áreas)
+CAPACIDADE_CACHE_FAIXAS = 256
+
+
+class _LRU:
+    """Dicionário limitado que descarta o item usado há mais tempo (seguro entre threads)."""
+
+    def __init__(self, capacidade):
+        self.capacidade = capacidade
+        self._itens = OrderedDict()
+        self._trava = threading.Lock()
+
+    def __len__(self):
+        return len(self._itens)
+
+    def obter(self, chave):
+        with self._trava:
+            item = self._itens.get(chave)
+            if item is not None:
+                self._itens.move_to_end(chave)
+            return item
+
+    def guardar(self, chave, item):
+        with self._trava:
+            self._itens[chave] = item
+            self._itens.move_to_end(chave)
+            while len(self._itens) > self.capacidade:
+                self._itens.popitem(last=False)
+
+    def limpar(self):
+        with self._trava:
+            self._itens.clear()
+
+
+class CacheAplicacao:
+    """
+    Memoriza os cálculos de aplicação por par cultura × insumo (total e por
+    faixa) e as áreas das faixas reais de cada cultura, que são a parte cara e
+    servem para todos os insumos.
+
+    As chaves são os IDs e cada resultado guarda as versões dos registros de
+    que depende (Registro.versao): se a cultura ou o insumo mudou desde o
+    cálculo (inclusive por outro processo, via diário), o resultado é
+    recalculado na consulta. Os registros devem ser visões Registro das tabelas.
+    """
+
+    def __init__(self, capacidade=CAPACIDADE_CACHE, capacidade_faixas=CAPACIDADE_CACHE_FAIXAS):
+        self._pares = _LRU(capacidade)
+        self._faixas = _LRU(capacidade_faixas)
+
+    def _memorizado(self, lru, chave, versoes, calcular):
+        item = lru.obter(chave)
+        if item is not None and item[0] == versoes:
+            metricas.contar("cache_aplicacao", resultado="acerto")
+            return item[1]
+        metricas.contar("cache_aplicacao", resultado="falha")
+        valor = calcular()
+        lru.guardar(chave, (versoes, valor))
+        return valor
+
+    def aplicacao(self, cultura, insumo):
+        """(total, por_faixa) em litros, como calcular_aplicacao."""
+        return self._memorizado(
+            self._pares, (cultura.id, insumo.id), (cultura.versao, insumo.versao),
+            lambda: calcular_aplicacao(cultura, insumo),
+        )
+
+    def areas_das_faixas(self, cultura, quantidade=None, largura=None, rumo=0.0):
+        """Áreas das faixas reais da cultura, como areas_das_faixas (tupla)."""
+        return self._memorizado(
+            self._faixas, (cultura.id, quantidade, largura, rumo), cultura.versao,
+            lambda: tuple(areas_das_faixas(cultura, quantidade, largura, rumo)),
+        )
+
+    def aplicacao_por_faixa(self, cultura, insumo, quantidade=None, largura=None, rumo=0.0):
+        """Lista de (área, litros) de cada faixa, como aplicacao_por_faixa."""
+        dose = insumo["dose_m2"]
+        return [(area, area * dose) for area in self.areas_das_faixas(cultura, quantidade, largura, rumo)]
+
+    def limpar(self):
+        self._pares.limpar()
+        self._faixas.limpar()
+
+
+# Cache compartilhado pelo menu, pela linha de comando e pelo serviço
+cache = CacheAplicacao()
+
+# ===========================
+# CÁLCULO EM LOTE
+# ===========================
+
+class MatrizAplicacao:
+    """
+    Resultado do cálculo de todas as combinações cultura × insumo.
+
+    Os valores ficam em dois arrays float64 (total e por_faixa) organizados
+    por insumo: a posição de (cultura c, insumo i) é i * len(ids_culturas) + c.
+    """
+
+    def __init__(self, ids_culturas, ids_insumos, total, por_faixa):
+        self.ids_culturas = ids_culturas
+        self.ids_insumos = ids_insumos
+        self.total = total
+        self.por_faixa = por_faixa
+        self._coluna_cultura = {id: c for c, id in enumerate(ids_culturas)}
+        self._linha_insumo = {id: i for i, id in enumerate(ids_insumos)}
+
+    def __len__(self):
+        return len(self.total)
+
+    def _posicao(self, id_cultura, id_insumo):
+        return self._linha_insumo[id_insumo] * len(self.ids_culturas) + self._coluna_cultura[id_cultura]
+
+    def valor(self, id_cultura, id_insumo):
+        """Retorna (total, por_faixa) de um par de IDs."""
+        posicao = self._posicao(id_cultura, id_insumo)
+        return self.total[posicao], self.por_faixa[posicao]
+
+    def por_insumo(self, id_insumo):
+        """Totais de um insumo para todas as culturas (fatia do array, na ordem de ids_culturas)."""
+        n = len(self.ids_culturas)
+        inicio = self._linha_insumo[id_insumo] * n
+        return self.total[inicio:inicio + n]
+
+    def linhas(self):
+        """Itera tuplas (id_cultura, id_insumo, total, por_faixa) para montar tabelas ou CSVs."""
+        n = len(self.ids_culturas)
+        for i, id_insumo in enumerate(self.ids_insumos):
+            inicio = i * n
+            yield from zip(
+                self.ids_culturas,
+                (id_insumo,) * n,
+                self.total[inicio:inicio + n],
+                self.por_faixa[inicio:inicio + n],
+            )
+
+
+@metricas.cronometrado("calcular_matriz")
+def calcular_matriz(culturas, insumos, ids_culturas=None, ids_insumos=None):
+    """
+    Calcula total e quantidade por faixa para todas as culturas × insumos.
+
+    As colunas de área e faixas são lidas uma única vez e cada insumo gera
+    uma fatia inteira da matriz em um único passo sobre os arrays. É possível
+    restringir o cálculo a um subconjunto de culturas e/ou insumos pelos IDs.
+    """
+    if ids_culturas is None:
+        ids_culturas = array("q", culturas.coluna("id"))
+        areas = culturas.coluna("area")
+        faixas = culturas.coluna("faixas")
+    else:
+        ids_culturas = array("q", ids_culturas)
+        posicoes = culturas.posicoes(ids_culturas)
+        todas_areas, todas_faixas = culturas.coluna("area"), culturas.coluna("faixas")
+        areas = [todas_areas[p] for p in posicoes]
+        faixas = [todas_faixas[p] for p in posicoes]
+
+    if ids_insumos is None:
+        ids_insumos = array("q", insumos.coluna("id"))
+        doses = insumos.coluna("dose_m2")
+    else:
+        ids_insumos = array("q", ids_insumos)
+        todas_doses = insumos.coluna("dose_m2")
+        doses = [todas_doses[p] for p in insumos.posicoes(ids_insumos)]
+
+    # Área média por faixa, com a mesma proteção de faixas == 0 do cálculo individual
+    area_por_faixa = [a / f if f > 0 else 0.0 for a, f in zip(areas, faixas)]
+
+    total = array("d")
+    por_faixa = array("d")
+    for dose in doses:
+        total.extend([a * dose for a in areas])
+        por_faixa.extend([a * dose for a in area_por_faixa])
+
+    return MatrizAplicacao(ids_culturas, ids_insumos, total, por_faixa)
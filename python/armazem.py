@@ -0,0 +1,865 @@
+# -*- coding: utf-8 -*-
+"""
+FarmTech - Armazenamento colunar em memória
+Descrição: Guarda culturas e insumos em vetores tipados (array) em vez de uma
+lista de dicionários, mantendo o acesso no estilo cultura["area"].
+"""
+
+import math
+import sys
+import threading
+import unicodedata
+from array import array
+from bisect import bisect_left, bisect_right, insort
+from collections.abc import MutableMapping
+from itertools import accumulate, compress, count
+
+import metricas
+
+# ===========================
+# TIPOS DE COLUNA
+# ===========================
+
+# "d" = float64, "i" = int32, "texto" = str internado, "categoria" = código int8
+TEXTO = "texto"
+CATEGORIA = "categoria"
+
+# Formatos conhecidos de terreno (o código é a posição na tupla)
+FORMATOS = ("retangular", "circular", "poligonal")
+
+# Números de versão, únicos no processo (ver Tabela.versao)
+_versoes = count(1)
+
+# Maior caractere possível: prefixo + FIM_PREFIXO limita as chaves que começam com o prefixo
+FIM_PREFIXO = "\U0010ffff"
+
+# ===========================
+# ERROS E NORMALIZAÇÃO
+# ===========================
+
+class NomeDuplicadoError(ValueError):
+    """Já existe um registro com o mesmo nome (ignorando maiúsculas e espaços extras)."""
+
+
+def normalizar_nome(nome):
+    """Chave usada no índice de nomes: sem espaços extras e sem diferença de caixa."""
+    nome = " ".join(str(nome).split())
+    if not nome.isascii():
+        nome = unicodedata.normalize("NFC", nome)
+    return nome.casefold()
+
+# ===========================
+# VISÃO DE REGISTRO
+# ===========================
+
+class Registro(MutableMapping):
+    """Visão de um registro (pelo seu ID estável) que se comporta como o antigo dicionário."""
+
+    __slots__ = ("_tabela", "id")
+
+    def __init__(self, tabela, id):
+        self._tabela = tabela
+        self.id = id
+
+    def __getitem__(self, coluna):
+        if coluna == "id":
+            return self.id
+        return self._tabela._ler(coluna, self._tabela._posicao(self.id))
+
+    def __setitem__(self, coluna, valor):
+        if coluna == "id":
+            raise TypeError("O ID de um registro não pode ser alterado.")
+        self._tabela._escrever(coluna, self._tabela._posicao(self.id), valor)
+
+    def __delitem__(self, coluna):
+        raise TypeError("Não é possível remover colunas de um registro.")
+
+    def __iter__(self):
+        yield "id"
+        yield from self._tabela.colunas
+
+    def __len__(self):
+        return len(self._tabela.colunas) + 1
+
+    @property
+    def versao(self):
+        """Muda a cada alteração do registro (ver Tabela.versao)."""
+        return self._tabela.versao(self.id)
+
+    def __repr__(self):
+        return repr(dict(self))
+
+# ===========================
+# ÍNDICE ORDENADO
+# ===========================
+
+class IndiceOrdenado:
+    """
+    Entradas (chave, id) de uma coluna mantidas em ordem, para buscas por
+    faixa de valores com bisect: localizar o intervalo custa O(log n) e
+    percorrê-lo, O(k). Chaves iguais ficam em ordem de ID.
+    """
+
+    __slots__ = ("_entradas",)
+
+    def __init__(self, entradas):
+        self._entradas = entradas
+
+    def __len__(self):
+        return len(self._entradas)
+
+    def _incluir(self, chave, id):
+        insort(self._entradas, (chave, id))
+
+    def _retirar(self, chave, id):
+        entradas = self._entradas
+        del entradas[bisect_left(entradas, (chave, id))]
+
+    def _acrescentar(self, novas):
+        # O sort do Python junta as duas sequências já ordenadas em tempo linear
+        self._entradas.extend(sorted(novas))
+        self._entradas.sort()
+
+    def intervalo(self, minimo=None, maximo=None):
+        """(início, fim) das entradas com minimo <= chave <= maximo (None = sem limite)."""
+        entradas = self._entradas
+        inicio = 0 if minimo is None else bisect_left(entradas, (minimo,))
+        fim = len(entradas) if maximo is None else bisect_right(entradas, (maximo, float("inf")))
+        return inicio, max(inicio, fim)
+
+    def ids(self, inicio=0, fim=None, decrescente=False):
+        """IDs das entradas entre as posições inicio e fim, em ordem crescente (ou decrescente) da chave."""
+        entradas = self._entradas
+        fim = len(entradas) if fim is None else fim
+        posicoes = range(fim - 1, inicio - 1, -1) if decrescente else range(inicio, fim)
+        return (entradas[posicao][1] for posicao in posicoes)
+
+# ===========================
+# RESUMO INCREMENTAL
+# ===========================
+
+class ResumoColuna:
+    """
+    Quantidade, soma, média e variância de uma coluna numérica, mantidas a
+    cada alteração sem reler a coluna: inclusões seguem o método de Welford,
+    remoções desfazem exatamente a atualização correspondente e lotes são
+    juntados pela fórmula de Chan. A soma dos quadrados dos desvios (m2) é
+    mantida em vez da variância, o que evita o cancelamento numérico de
+    soma(x²) - n·média².
+
+    Mínimo e máximo também são mantidos; remover o valor extremo os deixa em
+    None até a Tabela recalculá-los (ver Tabela.estatisticas).
+    """
+
+    __slots__ = ("quantidade", "soma", "media", "_m2", "minimo", "maximo")
+
+    def __init__(self, valores=()):
+        # Montagem em duas passadas (média e desvios), exata para a carga inicial
+        valores = valores if isinstance(valores, (list, array)) else list(valores)
+        self.quantidade = len(valores)
+        self.soma = math.fsum(valores)
+        self.media = self.soma / self.quantidade if self.quantidade else 0.0
+        media = self.media
+        self._m2 = math.fsum((v - media) * (v - media) for v in valores)
+        self.minimo = min(valores, default=None)
+        self.maximo = max(valores, default=None)
+
+    def _incluir(self, valor):
+        self.quantidade += 1
+        self.soma += valor
+        desvio = valor - self.media
+        self.media += desvio / self.quantidade
+        self._m2 += desvio * (valor - self.media)
+        if self.quantidade == 1:
+            self.minimo = self.maximo = valor
+        else:
+            if self.minimo is not None and valor < self.minimo:
+                self.minimo = valor
+            if self.maximo is not None and valor > self.maximo:
+                self.maximo = valor
+
+    def _retirar(self, valor):
+        if self.quantidade <= 1:
+            self.quantidade, self.soma, self.media, self._m2 = 0, 0.0, 0.0, 0.0
+            self.minimo = self.maximo = None
+            return
+        if valor == self.minimo:
+            self.minimo = None
+        if valor == self.maximo:
+            self.maximo = None
+        self.quantidade -= 1
+        self.soma -= valor
+        desvio = valor - self.media
+        self.media -= desvio / self.quantidade
+        # Arredondamentos acumulados não podem deixar m2 negativo
+        self._m2 = max(0.0, self._m2 - desvio * (valor - self.media))
+
+    def _juntar(self, outro):
+        if not outro.quantidade:
+            return
+        quantidade = self.quantidade + outro.quantidade
+        desvio = outro.media - self.media
+        self.media += desvio * outro.quantidade / quantidade
+        self._m2 += outro._m2 + desvio * desvio * self.quantidade * outro.quantidade / quantidade
+        if self.quantidade == 0:
+            self.minimo, self.maximo = outro.minimo, outro.maximo
+        else:
+            if self.minimo is not None:
+                self.minimo = min(self.minimo, outro.minimo)
+            if self.maximo is not None:
+                self.maximo = max(self.maximo, outro.maximo)
+        self.quantidade = quantidade
+        self.soma += outro.soma
+
+    @property
+    def variancia(self):
+        """Variância amostral (divisor n - 1, como var() do R); None com menos de 2 valores."""
+        return self._m2 / (self.quantidade - 1) if self.quantidade > 1 else None
+
+    @property
+    def desvio(self):
+        """Desvio padrão amostral (como sd() do R); None com menos de 2 valores."""
+        variancia = self.variancia
+        return None if variancia is None else math.sqrt(variancia)
+
+    def como_dict(self):
+        """quantidade, soma, media, desvio, minimo e maximo (media None sem valores)."""
+        return {
+            "quantidade": self.quantidade,
+            "soma": self.soma,
+            "media": self.media if self.quantidade else None,
+            "desvio": self.desvio,
+            "minimo": self.minimo,
+            "maximo": self.maximo,
+        }
+
+
+def juntar_estatisticas(resumos):
+    """
+    Junta resumos no formato de Tabela.estatisticas (ex.: de várias fazendas)
+    em um só, como se viessem de uma única coluna: o m2 de cada parte é
+    reconstruído do desvio e as partes são juntadas pela fórmula de Chan.
+    """
+    total = ResumoColuna()
+    for resumo in resumos:
+        if not resumo["quantidade"]:
+            continue
+        parte = ResumoColuna()
+        parte.quantidade, parte.soma, parte.media = resumo["quantidade"], resumo["soma"], resumo["media"]
+        parte._m2 = (resumo["desvio"] or 0.0) ** 2 * (resumo["quantidade"] - 1)
+        parte.minimo, parte.maximo = resumo["minimo"], resumo["maximo"]
+        total._juntar(parte)
+    return total.como_dict()
+
+# ===========================
+# TABELA COLUNAR
+# ===========================
+
+class Tabela:
+    """
+    Coleção de registros armazenada por colunas.
+
+    Cada coluna numérica é um array tipado; textos são internados com
+    sys.intern e categorias (como o formato) viram um código de 1 byte.
+    Cada registro tem um ID estável, indexado junto com o nome normalizado;
+    remoções apenas marcam a posição como apagada (lápide) e as posições
+    são reaproveitadas quando as lápides passam de 1/4 da tabela.
+
+    Cada registro também tem uma versão, que muda a cada alteração, para que
+    resultados calculados a partir dele (ex.: o cache de aplicação) saibam
+    quando ficaram velhos.
+
+    As colunas de INDICES_ORDENADOS ganham um IndiceOrdenado (ver consulta.py)
+    na primeira consulta, que daí em diante é atualizado a cada alteração.
+    Do mesmo modo, as de ESTATISTICAS ganham um ResumoColuna no primeiro
+    pedido de estatisticas().
+    """
+
+    ESQUEMA = ()
+
+    # Valores usados para colunas opcionais ausentes no registro ou no lote
+    PADROES = {}
+
+    # Tabelas sem coluna "nome" (ex.: o histórico de aplicações) não têm índice de nomes
+    INDICE_NOMES = True
+
+    # Colunas que aceitam consultas por faixa e ordenação pelo índice (ver indice)
+    INDICES_ORDENADOS = ()
+
+    # Colunas numéricas com resumo mantido a cada alteração (ver estatisticas)
+    ESTATISTICAS = ()
+
+    def __init__(self, registros=()):
+        self.colunas = tuple(nome for nome, _ in self.ESQUEMA)
+        self._tipos = dict(self.ESQUEMA)
+        self._dados = {}
+        self._categorias = {}
+        for nome, tipo in self.ESQUEMA:
+            if tipo == TEXTO:
+                self._dados[nome] = []
+            elif tipo == CATEGORIA:
+                self._dados[nome] = array("b")
+                self._categorias[nome] = ([], {})
+            else:
+                self._dados[nome] = array(tipo)
+        self._ids = array("q")
+        self._ativo = array("b")
+        self._por_id = {}
+        self._por_nome = {}
+        self._ordenados = {}
+        self._resumos = {}
+        # Montagem preguiçosa de índices e resumos, que acontece em consultas:
+        # leitores simultâneos (ex.: o serviço, com a trava de leitura) não montam em dobro
+        self._trava_montagem = threading.Lock()
+        self._proximo_id = 1
+        self._somente_leitura = False
+        self._nova_geracao()
+        for registro in registros:
+            self.inserir(registro)
+
+    # ---------- versões ----------
+
+    def _nova_geracao(self):
+        # Registros nunca alterados compartilham a versão da geração (carga da tabela)
+        self._geracao = next(_versoes)
+        self._versoes = {}
+
+    def versao(self, id):
+        """
+        Versão do registro: muda a cada alteração, remoção ou recarga da tabela.
+        Os números vêm de um contador único no processo, então uma versão
+        nunca se repete, nem entre tabelas diferentes.
+        """
+        return self._versoes.get(id, self._geracao)
+
+    # ---------- conversão de valores ----------
+
+    def _codificar(self, coluna, valor):
+        tipo = self._tipos[coluna]
+        if tipo == TEXTO:
+            return sys.intern(str(valor))
+        if tipo == CATEGORIA:
+            valores, codigos = self._categorias[coluna]
+            if valor not in codigos:
+                if len(valores) >= 127:
+                    raise ValueError(f"Categorias demais na coluna '{coluna}'.")
+                codigos[valor] = len(valores)
+                valores.append(sys.intern(valor))
+            return codigos[valor]
+        if tipo == "d":
+            return float(valor)
+        return int(valor)
+
+    def _posicao(self, id):
+        try:
+            return self._por_id[id]
+        except KeyError:
+            raise KeyError(f"Registro {id} inexistente.") from None
+
+    def _ler(self, coluna, posicao):
+        valor = self._dados[coluna][posicao]
+        if self._tipos[coluna] == CATEGORIA:
+            return self._categorias[coluna][0][valor]
+        return valor
+
+    def _garantir_mutavel(self):
+        """Copia para arrays próprios as colunas que ainda apontam para um arquivo mapeado (mmap)."""
+        if not self._somente_leitura:
+            return
+        for coluna, vetor in self._dados.items():
+            if isinstance(vetor, memoryview):
+                copia = array(vetor.format)
+                copia.frombytes(vetor.cast("B"))
+                self._dados[coluna] = copia
+        if isinstance(self._ids, memoryview):
+            copia = array("q")
+            copia.frombytes(self._ids.cast("B"))
+            self._ids = copia
+        self._somente_leitura = False
+
+    def _escrever(self, coluna, posicao, valor):
+        self._garantir_mutavel()
+        valor = self._codificar(coluna, valor)
+        if coluna == "nome":
+            chave = normalizar_nome(valor)
+            dono = self._por_nome.get(chave)
+            if dono is not None and dono != self._ids[posicao]:
+                raise NomeDuplicadoError(f"Já existe um registro chamado '{valor}'.")
+            del self._por_nome[normalizar_nome(self._dados["nome"][posicao])]
+            self._por_nome[chave] = self._ids[posicao]
+        indice = self._ordenados.get(coluna)
+        if indice is not None:
+            indice._retirar(self._chave_na_posicao(coluna, posicao), self._ids[posicao])
+        resumo = self._resumos.get(coluna)
+        if resumo is not None:
+            resumo._retirar(self._dados[coluna][posicao])
+        self._dados[coluna][posicao] = valor
+        if indice is not None:
+            indice._incluir(self._chave_na_posicao(coluna, posicao), self._ids[posicao])
+        if resumo is not None:
+            resumo._incluir(valor)
+        self._versoes[self._ids[posicao]] = next(_versoes)
+
+    # ---------- consultas por ID e nome ----------
+
+    def __len__(self):
+        return len(self._por_id)
+
+    def __bool__(self):
+        return bool(self._por_id)
+
+    @property
+    def proximo_id(self):
+        return self._proximo_id
+
+    def reservar_ids(self, proximo_id):
+        """Garante que novos registros recebam IDs a partir de proximo_id."""
+        self._proximo_id = max(self._proximo_id, proximo_id)
+
+    def __contains__(self, id):
+        return id in self._por_id
+
+    def __iter__(self):
+        ids = self._ids
+        for posicao, ativo in enumerate(self._ativo):
+            if ativo:
+                yield Registro(self, ids[posicao])
+
+    def por_id(self, id):
+        """Devolve o registro com o ID informado, ou None."""
+        if id in self._por_id:
+            return Registro(self, id)
+        return None
+
+    def por_nome(self, nome):
+        """Devolve o registro com o nome informado (sem diferenciar caixa), ou None."""
+        id = self._por_nome.get(normalizar_nome(nome))
+        return None if id is None else Registro(self, id)
+
+    @metricas.cronometrado("busca")
+    def localizar(self, texto):
+        """Localiza um registro pelo ID (se o texto for numérico) ou pelo nome."""
+        texto = texto.strip()
+        if texto.isdigit():
+            registro = self.por_id(int(texto))
+            if registro is not None:
+                return registro
+        return self.por_nome(texto)
+
+    # ---------- alterações ----------
+
+    def inserir(self, registro, id=None):
+        """Acrescenta um registro (dicionário ou Registro) e devolve sua visão."""
+        if id is None:
+            id = registro.get("id") or self._proximo_id
+        if id in self._por_id:
+            raise ValueError(f"ID {id} já está em uso.")
+        self._garantir_mutavel()
+        valores = [
+            self._codificar(c, registro[c] if c in registro else self.PADROES[c]) for c in self.colunas
+        ]
+        if self.INDICE_NOMES:
+            chave = normalizar_nome(valores[self.colunas.index("nome")])
+            if chave in self._por_nome:
+                raise NomeDuplicadoError(f"Já existe um registro chamado '{registro['nome']}'.")
+            self._por_nome[chave] = id
+
+        for coluna, valor in zip(self.colunas, valores):
+            self._dados[coluna].append(valor)
+        self._por_id[id] = len(self._ids)
+        self._ids.append(id)
+        self._ativo.append(1)
+        for coluna, indice in self._ordenados.items():
+            indice._incluir(self._chave_na_posicao(coluna, len(self._ids) - 1), id)
+        for coluna, resumo in self._resumos.items():
+            resumo._incluir(self._dados[coluna][-1])
+        self._versoes[id] = next(_versoes)
+        self._proximo_id = max(self._proximo_id, id + 1)
+        return Registro(self, id)
+
+    def estender(self, lote):
+        """
+        Acrescenta um lote no formato {coluna: valores} (como os de leitura.py).
+
+        Os vetores numéricos são anexados de uma vez; se o lote não trouxer a
+        coluna "id", os IDs são gerados em sequência. Nada é alterado se houver
+        nome ou ID repetido.
+        """
+        quantidade = len(lote[self.colunas[0]])
+        if "id" in lote:
+            ids = array("q", lote["id"])
+        else:
+            ids = array("q", range(self._proximo_id, self._proximo_id + quantidade))
+        if self.INDICE_NOMES:
+            nomes = [sys.intern(str(nome)) for nome in lote["nome"]]
+            chaves = [normalizar_nome(nome) for nome in nomes]
+            if len(set(chaves)) != quantidade or not self._por_nome.keys().isdisjoint(chaves):
+                raise NomeDuplicadoError("O lote contém nomes já cadastrados ou repetidos.")
+        if len(set(ids)) != quantidade or not self._por_id.keys().isdisjoint(ids):
+            raise ValueError("O lote contém IDs já em uso ou repetidos.")
+
+        self._garantir_mutavel()
+        inicio = len(self._ids)
+        for coluna, tipo in self.ESQUEMA:
+            if coluna not in lote:
+                lote = {**lote, coluna: [self.PADROES[coluna]] * quantidade}
+            if coluna == "nome":
+                self._dados[coluna].extend(nomes)
+            elif tipo == TEXTO:
+                self._dados[coluna].extend(sys.intern(str(v)) for v in lote[coluna])
+            elif tipo == CATEGORIA:
+                for valor in set(lote[coluna]):
+                    self._codificar(coluna, valor)
+                codigos = self._categorias[coluna][1]
+                self._dados[coluna].extend(array("b", map(codigos.__getitem__, lote[coluna])))
+            else:
+                self._dados[coluna].extend(array(tipo, lote[coluna]))
+        self._ids.extend(ids)
+        self._ativo.extend(array("b", [1]) * quantidade)
+        self._por_id.update(zip(ids, range(inicio, inicio + quantidade)))
+        if self.INDICE_NOMES:
+            self._por_nome.update(zip(chaves, ids))
+        for coluna, indice in self._ordenados.items():
+            indice._acrescentar(
+                (self._chave_na_posicao(coluna, posicao), id) for posicao, id in enumerate(ids, start=inicio)
+            )
+        for coluna, resumo in self._resumos.items():
+            resumo._juntar(ResumoColuna(self._dados[coluna][inicio:]))
+        if self._versoes:
+            # IDs novos já valem pela versão da geração; só os que já existiram mudam
+            versao = next(_versoes)
+            self._versoes.update((id, versao) for id in ids if id in self._versoes)
+        if quantidade:
+            self._proximo_id = max(self._proximo_id, max(ids) + 1)
+
+    def remover(self, id):
+        """Remove o registro (lápide) e o devolve como dicionário."""
+        posicao = self._posicao(id)
+        removido = dict(Registro(self, id))
+        for coluna, indice in self._ordenados.items():
+            indice._retirar(self._chave_na_posicao(coluna, posicao), id)
+        for coluna, resumo in self._resumos.items():
+            resumo._retirar(self._dados[coluna][posicao])
+        del self._por_id[id]
+        if self.INDICE_NOMES:
+            del self._por_nome[normalizar_nome(removido["nome"])]
+        self._ativo[posicao] = 0
+        self._versoes[id] = next(_versoes)
+        if (len(self._ativo) - len(self._por_id)) * 4 > len(self._ativo):
+            self.limpar_removidos()
+        return removido
+
+    def limpar_removidos(self):
+        """Descarta as posições marcadas como apagadas e reconstrói o índice de IDs."""
+        if len(self._ativo) == len(self._por_id):
+            return
+        ativo = self._ativo
+        for coluna in self.colunas:
+            vetor = self._dados[coluna]
+            mantidos = compress(vetor, ativo)
+            if isinstance(vetor, list):
+                self._dados[coluna] = list(mantidos)
+            else:
+                codigo = vetor.format if isinstance(vetor, memoryview) else vetor.typecode
+                self._dados[coluna] = array(codigo, mantidos)
+        self._ids = array("q", compress(self._ids, ativo))
+        self._somente_leitura = False
+        self._ativo = array("b", [1]) * len(self._ids)
+        self._por_id = {id: posicao for posicao, id in enumerate(self._ids)}
+
+    def clear(self):
+        # Vetores novos em vez de esvaziar os atuais: nada a copiar de um mmap
+        for nome, tipo in self.ESQUEMA:
+            self._dados[nome] = [] if tipo == TEXTO else array("b" if tipo == CATEGORIA else tipo)
+        self._ids = array("q")
+        self._ativo = array("b")
+        self._somente_leitura = False
+        self._por_id.clear()
+        self._por_nome.clear()
+        self._ordenados.clear()
+        self._resumos.clear()
+        self._nova_geracao()
+
+    # ---------- conteúdo bruto (fotografia binária) ----------
+
+    def exportar(self):
+        """
+        Retorna o conteúdo bruto da tabela: {coluna: vetor}, IDs, valores de
+        cada categoria e as chaves normalizadas dos nomes, na ordem das posições.
+        """
+        self.limpar_removidos()
+        id_para_chave = {id: chave for chave, id in self._por_nome.items()}
+        chaves = [id_para_chave[id] for id in self._ids] if self.INDICE_NOMES else []
+        categorias = {c: list(valores) for c, (valores, _) in self._categorias.items()}
+        return dict(self._dados), self._ids, categorias, chaves
+
+    def adotar(self, dados, ids, categorias, chaves):
+        """
+        Substitui todo o conteúdo por colunas já prontas, como as views de um
+        arquivo mapeado em memória. As colunas numéricas podem ser memoryviews
+        somente leitura: elas só são copiadas na primeira alteração.
+        """
+        for coluna, valores in categorias.items():
+            self._categorias[coluna] = (list(valores), {v: i for i, v in enumerate(valores)})
+        self._dados = dict(dados)
+        self._ids = ids
+        self._ativo = array("b", [1]) * len(ids)
+        self._por_id = dict(zip(ids, range(len(ids))))
+        self._por_nome = dict(zip(chaves, ids))
+        self._ordenados = {}
+        self._resumos = {}
+        self._nova_geracao()
+        self._somente_leitura = any(isinstance(v, memoryview) for v in self._dados.values()) \
+            or isinstance(ids, memoryview)
+        if len(ids):
+            self._proximo_id = max(self._proximo_id, max(ids) + 1)
+
+    # ---------- índices ordenados ----------
+
+    def _chave_na_posicao(self, coluna, posicao):
+        valor = self._dados[coluna][posicao]
+        return normalizar_nome(valor) if coluna == "nome" else valor
+
+    def chave_indice(self, coluna, valor):
+        """
+        Converte um valor da coluna na chave do seu índice ordenado: o nome
+        normalizado, o código da categoria (-1 se não existir) ou o número.
+        """
+        if coluna == "nome":
+            return normalizar_nome(valor)
+        tipo = self._tipos[coluna]
+        if tipo == CATEGORIA:
+            return self._categorias[coluna][1].get(valor, -1)
+        if tipo == TEXTO:
+            return str(valor)
+        return float(valor)
+
+    def chave_de(self, coluna, id):
+        """Chave do registro no índice ordenado da coluna (ver chave_indice)."""
+        return self._chave_na_posicao(coluna, self._posicao(id))
+
+    def valores_categoria(self, coluna):
+        """Valores de uma coluna de categoria, na ordem dos códigos (a ordem em que apareceram)."""
+        return list(self._categorias[coluna][0])
+
+    def indice(self, coluna):
+        """
+        Índice ordenado da coluna. É montado na primeira chamada, ordenando as
+        chaves de uma vez, e mantido a cada inclusão, alteração ou remoção.
+        A montagem é feita por uma thread só: as demais esperam o índice pronto.
+        """
+        indice = self._ordenados.get(coluna)
+        if indice is not None:
+            return indice
+        if coluna not in self.INDICES_ORDENADOS:
+            raise ValueError(f"A coluna '{coluna}' não tem índice ordenado.")
+        with self._trava_montagem:
+            indice = self._ordenados.get(coluna)
+            if indice is None:
+                if coluna == "nome":
+                    entradas = sorted(self._por_nome.items())
+                else:
+                    ativo = self._ativo
+                    entradas = sorted(zip(compress(self._dados[coluna], ativo), compress(self._ids, ativo)))
+                # Publicado só depois de pronto: quem lê _ordenados nunca vê um índice pela metade
+                indice = self._ordenados[coluna] = IndiceOrdenado(entradas)
+                metricas.contar("indices_montados", coluna=coluna)
+        return indice
+
+    # ---------- estatísticas ----------
+
+    def estatisticas(self, coluna):
+        """
+        Resumo da coluna: quantidade, soma, média, desvio padrão amostral (como
+        sd() do R; None com menos de 2 registros), mínimo e máximo (None se
+        vazia). O resumo é montado na primeira chamada e mantido a cada
+        inclusão, alteração ou remoção; daí em diante a consulta custa O(1).
+        Só a remoção do menor ou do maior valor obriga a recalcular esse
+        extremo: pelas pontas do índice ordenado, se já montado, ou relendo a coluna.
+        Montagem e recálculo são feitos por uma thread só, como em indice.
+        """
+        resumo = self._resumos.get(coluna)
+        if resumo is not None and not (resumo.quantidade and (resumo.minimo is None or resumo.maximo is None)):
+            return resumo.como_dict()
+        if resumo is None and coluna not in self.ESTATISTICAS:
+            raise ValueError(f"A coluna '{coluna}' não tem estatísticas.")
+        with self._trava_montagem:
+            resumo = self._resumos.get(coluna)
+            if resumo is None:
+                resumo = ResumoColuna(compress(self._dados[coluna], self._ativo))
+                metricas.contar("resumos_montados", coluna=coluna)
+            if resumo.quantidade and (resumo.minimo is None or resumo.maximo is None):
+                indice = self._ordenados.get(coluna)
+                if indice is not None:
+                    resumo.minimo, resumo.maximo = indice._entradas[0][0], indice._entradas[-1][0]
+                else:
+                    valores = list(compress(self._dados[coluna], self._ativo))
+                    resumo.minimo, resumo.maximo = min(valores), max(valores)
+            # Publicado só depois de completo (com mínimo e máximo)
+            self._resumos[coluna] = resumo
+            return resumo.como_dict()
+
+    # ---------- acesso em bloco ----------
+
+    def coluna(self, nome):
+        """
+        Devolve o vetor de uma coluna (sem cópia, exceto categorias) para
+        cálculos em bloco. Com lápides pendentes, devolve uma cópia só com os
+        registros ativos: a leitura nunca reorganiza a tabela, então pode
+        correr em paralelo com outras (quem altera chama limpar_removidos).
+        """
+        vetor = self._ids if nome == "id" else self._dados[nome]
+        if len(self._ativo) != len(self._por_id):
+            mantidos = compress(vetor, self._ativo)
+            if isinstance(vetor, list):
+                vetor = list(mantidos)
+            else:
+                vetor = array(vetor.format if isinstance(vetor, memoryview) else vetor.typecode, mantidos)
+        if nome != "id" and self._tipos[nome] == CATEGORIA:
+            valores = self._categorias[nome][0]
+            return [valores[codigo] for codigo in vetor]
+        return vetor
+
+    def posicoes(self, ids):
+        """Posições (nos vetores devolvidos por coluna) dos IDs informados."""
+        if len(self._ativo) == len(self._por_id):
+            return [self._posicao(id) for id in ids]
+        # Com lápides, a posição no vetor sem elas: quantos ativos vêm antes
+        antes = array("q", accumulate(self._ativo, initial=0))
+        return [antes[self._posicao(id)] for id in ids]
+
+    def linhas(self, colunas=None):
+        """Itera as linhas como tuplas de valores, na ordem das colunas pedidas."""
+        colunas = colunas or self.colunas
+        return zip(*(self.coluna(c) for c in colunas))
+
+    def soma(self, nome):
+        return sum(self.coluna(nome))
+
+
+class TabelaCulturas(Tabela):
+    ESQUEMA = (
+        ("nome", TEXTO),
+        ("formato", CATEGORIA),
+        ("area", "d"),
+        ("faixas", "i"),
+        ("area_faixa", "d"),
+        ("geometria", TEXTO),  # contorno em metros (JSON): polígonos e retângulos
+    )
+    PADROES = {"geometria": ""}
+    INDICES_ORDENADOS = ("nome", "formato", "area", "faixas", "area_faixa")
+    ESTATISTICAS = ("area", "faixas", "area_faixa")
+
+    def __init__(self, registros=()):
+        super().__init__()
+        # Reserva os códigos dos formatos conhecidos na ordem de FORMATOS
+        for formato in FORMATOS:
+            self._codificar("formato", formato)
+        for registro in registros:
+            self.inserir(registro)
+
+
+class TabelaInsumos(Tabela):
+    ESQUEMA = (
+        ("nome", TEXTO),
+        ("dose_m2", "d"),
+        ("estoque", "d"),  # litros em estoque (baixados a cada aplicação registrada)
+    )
+    PADROES = {"estoque": 0.0}
+    INDICES_ORDENADOS = ("nome", "dose_m2", "estoque")
+    ESTATISTICAS = ("dose_m2", "estoque")
+
+
+class TabelaAplicacoes(Tabela):
+    """
+    Histórico de aplicações (cultura, insumo, data, safra, litros).
+
+    Mantém os totais (litros e quantidade de aplicações) por cultura, insumo e
+    safra, e por qualquer combinação deles, atualizados a cada inclusão,
+    alteração ou remoção: total(insumo=3, safra="2025/2026") não percorre o
+    histórico. Como as entradas do diário também passam por aqui, os totais
+    acompanham o que outros processos registram.
+    """
+
+    ESQUEMA = (
+        ("cultura", "q"),  # ID da cultura
+        ("insumo", "q"),   # ID do insumo
+        ("data", TEXTO),   # AAAA-MM-DD
+        ("safra", CATEGORIA),
+        ("litros", "d"),
+    )
+    INDICE_NOMES = False
+
+    # Colunas que definem em quais totais cada aplicação entra
+    _AGREGADAS = ("cultura", "insumo", "safra", "litros")
+
+    def __init__(self, registros=()):
+        self._totais = {}
+        super().__init__(registros)
+
+    # ---------- totais ----------
+
+    def _acumular(self, cultura, insumo, safra, litros, sinal):
+        totais = self._totais
+        for chave in (
+            (cultura, insumo, safra), (cultura, insumo, None), (cultura, None, safra), (None, insumo, safra),
+            (cultura, None, None), (None, insumo, None), (None, None, safra), (None, None, None),
+        ):
+            total = totais.get(chave)
+            if total is None:
+                total = totais[chave] = [0.0, 0]
+            total[0] += sinal * litros
+            total[1] += sinal
+            if total[1] == 0:
+                del totais[chave]
+
+    def _acumular_posicao(self, posicao, sinal):
+        self._acumular(*(self._ler(c, posicao) for c in self._AGREGADAS), sinal)
+
+    def _recalcular_totais(self):
+        self._totais = {}
+        for cultura, insumo, safra, litros in self.linhas(self._AGREGADAS):
+            self._acumular(cultura, insumo, safra, litros, 1)
+
+    def total(self, cultura=None, insumo=None, safra=None):
+        """(litros, aplicações) filtrando por ID da cultura, ID do insumo e/ou safra (None = todos)."""
+        litros, quantidade = self._totais.get((cultura, insumo, safra), (0.0, 0))
+        return litros, quantidade
+
+    def safras(self):
+        """Safras com alguma aplicação registrada, em ordem."""
+        return sorted(s for c, i, s in self._totais if c is None and i is None and s is not None)
+
+    # ---------- alterações (mantêm os totais em dia) ----------
+
+    def inserir(self, registro, id=None):
+        novo = super().inserir(registro, id)
+        self._acumular_posicao(self._posicao(novo.id), 1)
+        return novo
+
+    def estender(self, lote):
+        inicio = len(self._ids)
+        super().estender(lote)
+        for posicao in range(inicio, len(self._ids)):
+            self._acumular_posicao(posicao, 1)
+
+    def _escrever(self, coluna, posicao, valor):
+        if coluna not in self._AGREGADAS:
+            return super()._escrever(coluna, posicao, valor)
+        self._acumular_posicao(posicao, -1)
+        try:
+            super()._escrever(coluna, posicao, valor)
+        finally:
+            self._acumular_posicao(posicao, 1)
+
+    def remover(self, id):
+        self._acumular_posicao(self._posicao(id), -1)
+        return super().remover(id)
+
+    def clear(self):
+        super().clear()
+        self._totais = {}
+
+    def adotar(self, dados, ids, categorias, chaves):
+        super().adotar(dados, ids, categorias, chaves)
+        self._recalcular_totais()
@@ -0,0 +1,459 @@
+# -*- coding: utf-8 -*-
+"""
+FarmTech - Armazenamento em SQLite
+Descrição: Alternativa ao diário + CSVs (ver persistencia.py), escolhida com
+FARMTECH_ARMAZENAMENTO=sqlite. Cada alteração é gravada em dados/farmtech.db
+dentro de uma transação (modo WAL), já na tabela da coleção, que tem índices
+por nome e por área; não há fotografia a regravar nem diário a reaplicar.
+
+As coleções continuam em memória (armazem.py) para os cálculos; o banco é a
+cópia durável e permite consultas indexadas sem carregar as tabelas (buscar).
+Na primeira abertura, os CSVs e o diário existentes são importados; compactar()
+regrava os CSVs, que seguem sendo o formato lido pelo R (r/analise.r).
+
+Vários processos podem usar o mesmo banco: as gravações são serializadas pela
+trava de escrita do SQLite e cada processo aplica, ao iniciar uma transação, as
+alterações dos outros guardadas na tabela "diario" (podada periodicamente).
+"""
+
+import json
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+import metricas
+from persistencia import COLUNAS, JANELA_GRAVACAO, LIMITE_DIARIO, TIPOS, Diario, _aplicar, _verificar
+
+# ===========================
+# CONFIGURAÇÃO
+# ===========================
+
+ARQUIVO_BANCO = "farmtech.db"
+
+# Espera máxima (s) pela trava de escrita de outro processo
+ESPERA_TRAVA = 60
+
+# Linhas lidas do banco por vez ao carregar as tabelas
+TAMANHO_LEITURA = 50000
+
+TIPOS_SQL = {int: "INTEGER", float: "REAL", str: "TEXT"}
+
+# Índices de cada coleção: nome do índice -> colunas
+INDICES = {
+    "culturas": {"nome": "nome COLLATE NOCASE", "area": "area"},
+    "insumos": {"nome": "nome COLLATE NOCASE"},
+    "aplicacoes": {"insumo_safra": "insumo, safra", "cultura_safra": "cultura, safra"},
+}
+
+# Colunas em que buscar() aceita faixa de valores (as indexadas)
+COLUNAS_FAIXA = {"culturas": ("area",), "insumos": (), "aplicacoes": ("insumo", "cultura")}
+
+# ===========================
+# BANCO
+# ===========================
+
+class BancoSQLite:
+    """
+    Armazenamento das coleções em um banco SQLite, com a mesma interface do
+    Diario (carregar, transacao, registrar, em_lote, compactar...).
+
+    transacao() abre uma transação de escrita (BEGIN IMMEDIATE), que trava o
+    banco para os outros processos, e aplica o que eles gravaram. Cada
+    alteração atualiza a tabela da coleção e anexa uma linha à tabela
+    "diario", com o seq da alteração. Fora de em_lote(), cada transação é
+    confirmada com fsync (synchronous=FULL); dentro, as transações são
+    confirmadas sem fsync e um único fsync é feito ao final do bloco. Com
+    janela > 0, o fsync das transações fora de em_lote() é adiado por até
+    janela segundos, como no Diario; fechar() grava o que estiver pendente.
+
+    As coleções alteradas desde a última exportação dos CSVs ficam anotadas
+    no banco (estado "alteradas", comum a todos os processos): compactar()
+    só regrava os CSVs dessas.
+    """
+
+    def __init__(self, dados_dir, colecoes, janela=None):
+        self.dados_dir = dados_dir
+        self.colecoes = colecoes
+        self.caminho = os.path.join(dados_dir, ARQUIVO_BANCO)
+        self.seq = 0
+        self.pendentes = 0
+        self._conexao = None
+        self._rlock = threading.RLock()
+        self._profundidade = 0
+        self._em_lote = False
+        self._sincrono = True
+        self._sem_fsync = False
+        self._sincronizar_ao_sair = False
+        self._alteradas = set()
+        self.janela = JANELA_GRAVACAO if janela is None else janela
+        self._agendada = None
+
+        # Comandos preparados de cada coleção (o sqlite3 guarda os já compilados)
+        self._sql = {}
+        for colecao, colunas in COLUNAS.items():
+            campos = [c for c in colunas if c != "id"]
+            self._sql[colecao] = {
+                "campos": campos,
+                "inserir": f"INSERT INTO {colecao} (id, {', '.join(campos)}) "
+                           f"VALUES ({', '.join('?' * (len(campos) + 1))})",
+                "atualizar": f"UPDATE {colecao} SET {', '.join(f'{c} = ?' for c in campos)} WHERE id = ?",
+                "remover": f"DELETE FROM {colecao} WHERE id = ?",
+            }
+
+    # ---------- conexão e esquema ----------
+
+    def _conectar(self):
+        if self._conexao is not None:
+            return self._conexao
+        # Autocommit do módulo desligado: as transações são abertas aqui (BEGIN)
+        conexao = sqlite3.connect(
+            self.caminho, timeout=ESPERA_TRAVA, isolation_level=None, check_same_thread=False
+        )
+        conexao.execute("PRAGMA journal_mode=WAL")
+        conexao.execute("PRAGMA synchronous=FULL")
+        self._conexao, self._sincrono = conexao, True
+        try:
+            conexao.execute("BEGIN IMMEDIATE")
+            self._criar_esquema()
+            if self._ler_estado("base") is None:
+                self._importar_pasta()
+            conexao.execute("COMMIT")
+            self._definir_sincrono(self.janela <= 0)
+        except BaseException:
+            self.fechar()  # fechar sem confirmar desfaz a criação pela metade
+            raise
+        return conexao
+
+    def _criar_esquema(self):
+        conexao = self._conexao
+        for colecao, colunas in COLUNAS.items():
+            campos = ", ".join(f"{c} {TIPOS_SQL[TIPOS[colecao][c]]} NOT NULL" for c in colunas if c != "id")
+            conexao.execute(f"CREATE TABLE IF NOT EXISTS {colecao} (id INTEGER PRIMARY KEY, {campos})")
+            # Colunas novas (ex.: "estoque") em bancos antigos recebem o valor padrão
+            existentes = {linha[1] for linha in conexao.execute(f"PRAGMA table_info({colecao})")}
+            padroes = self.colecoes[colecao].PADROES
+            for c in colunas:
+                if c not in existentes:
+                    conexao.execute(f"ALTER TABLE {colecao} ADD COLUMN {c} {TIPOS_SQL[TIPOS[colecao][c]]}")
+                    conexao.execute(f"UPDATE {colecao} SET {c} = ?", (padroes[c],))
+            for nome, colunas_indice in INDICES[colecao].items():
+                conexao.execute(f"CREATE INDEX IF NOT EXISTS {colecao}_{nome} ON {colecao} ({colunas_indice})")
+        conexao.execute(
+            "CREATE TABLE IF NOT EXISTS diario ("
+            "seq INTEGER PRIMARY KEY, op TEXT NOT NULL, colecao TEXT NOT NULL, id INTEGER NOT NULL, dados TEXT)"
+        )
+        conexao.execute("CREATE TABLE IF NOT EXISTS estado (chave TEXT PRIMARY KEY, valor TEXT NOT NULL)")
+
+    def _importar_pasta(self):
+        """Primeira abertura: traz os CSVs e o diário que já existirem na pasta."""
+        diario = Diario(self.dados_dir, self.colecoes)
+        diario.carregar()
+        diario.fechar()
+        for colecao in COLUNAS:
+            registros = self.colecoes[colecao]
+            self._conexao.executemany(
+                self._sql[colecao]["inserir"], registros.linhas(["id", *self._sql[colecao]["campos"]])
+            )
+            metricas.contar("registros_importados", len(registros), colecao=colecao)
+        self.seq = diario.seq
+        self._podar()
+        # O diário importado pode ter alterações que os CSVs ainda não têm
+        self._gravar_estado("alteradas", list(COLUNAS))
+
+    def _ler_estado(self, chave, padrao=None):
+        linha = self._conexao.execute("SELECT valor FROM estado WHERE chave = ?", (chave,)).fetchone()
+        return json.loads(linha[0]) if linha else padrao
+
+    def _gravar_estado(self, chave, valor):
+        self._conexao.execute("INSERT OR REPLACE INTO estado (chave, valor) VALUES (?, ?)", (chave, json.dumps(valor)))
+
+    def _definir_sincrono(self, sincrono):
+        """Liga ou desliga o fsync a cada confirmação (só pode mudar fora de transação)."""
+        if sincrono != self._sincrono:
+            self._conexao.execute(f"PRAGMA synchronous={'FULL' if sincrono else 'NORMAL'}")
+            self._sincrono = sincrono
+
+    # ---------- leitura ----------
+
+    def _ler_tabela(self, colecao):
+        registros = self.colecoes[colecao]
+        colunas = COLUNAS[colecao]
+        cursor = self._conexao.execute(f"SELECT {', '.join(colunas)} FROM {colecao} ORDER BY id")
+        while True:
+            linhas = cursor.fetchmany(TAMANHO_LEITURA)
+            if not linhas:
+                break
+            registros.estender(dict(zip(colunas, map(list, zip(*linhas)))))
+
+    def carregar(self):
+        """Carrega as coleções do banco (na primeira vez, importando os CSVs da pasta)."""
+        with metricas.medir("carregar"), self._rlock:
+            conexao = self._conectar()
+            # Transação de leitura: as tabelas são lidas no mesmo instante
+            conexao.execute("BEGIN")
+            try:
+                self._carregar()
+            finally:
+                conexao.execute("COMMIT")
+        for colecao, registros in self.colecoes.items():
+            metricas.contar("registros_carregados", len(registros), colecao=colecao)
+
+    def _carregar(self):
+        for colecao in COLUNAS:
+            self.colecoes[colecao].clear()
+            self._ler_tabela(colecao)
+        # IDs de registros apagados não são reaproveitados
+        proximos = self._ler_estado("proximo_id", {})
+        for colecao in COLUNAS:
+            self.colecoes[colecao].reservar_ids(proximos.get(colecao, 1))
+        self._alteradas = set(self._ler_estado("alteradas", []))
+        ultimo, self.pendentes = self._conexao.execute("SELECT MAX(seq), COUNT(*) FROM diario").fetchone()
+        self.seq = ultimo or self._ler_estado("base", 0)
+
+    def atualizar(self):
+        """Incorpora as alterações gravadas por outros processos desde a última leitura."""
+        with self._rlock:
+            if self._profundidade:
+                return  # dentro de uma transação os dados já estão em dia
+            conexao = self._conectar()
+            conexao.execute("BEGIN")
+            try:
+                self._atualizar()
+            finally:
+                conexao.execute("COMMIT")
+
+    def _atualizar(self):
+        # Se outro processo podou o diário além do que já lemos, recarrega tudo
+        if self.seq < self._ler_estado("base", 0):
+            self._carregar()
+            return
+        # Outro processo pode ter exportado os CSVs (e limpado as anotações)
+        self._alteradas = set(self._ler_estado("alteradas", []))
+        linhas = self._conexao.execute(
+            "SELECT seq, op, colecao, id, dados FROM diario WHERE seq > ? ORDER BY seq", (self.seq,)
+        )
+        for seq, op, colecao, id, dados in linhas:
+            entrada = {"op": op, "colecao": colecao, "id": id}
+            if dados is not None:
+                entrada["dados"] = json.loads(dados)
+            _aplicar(self.colecoes, entrada)
+            self.seq = seq
+            self.pendentes += 1
+
+    def buscar(self, colecao, nome=None, coluna=None, minimo=None, maximo=None, limite=None):
+        """
+        Consulta o banco direto, pelos índices, sem depender das tabelas em
+        memória: nome exato (sem diferença de caixa) e/ou coluna entre minimo e
+        maximo (ex.: culturas com área entre 1 e 5 ha). Devolve dicionários.
+        """
+        condicoes, parametros = [], []
+        if nome is not None:
+            condicoes.append("nome = ? COLLATE NOCASE")
+            parametros.append(" ".join(str(nome).split()))
+        if coluna is not None:
+            if coluna not in COLUNAS_FAIXA[colecao]:
+                raise ValueError(f"Busca por faixa não suportada em {colecao}.{coluna}.")
+            if minimo is not None:
+                condicoes.append(f"{coluna} >= ?")
+                parametros.append(minimo)
+            if maximo is not None:
+                condicoes.append(f"{coluna} <= ?")
+                parametros.append(maximo)
+        colunas = ["id", *self._sql[colecao]["campos"]]
+        sql = f"SELECT {', '.join(colunas)} FROM {colecao}"
+        if condicoes:
+            sql += " WHERE " + " AND ".join(condicoes)
+        if coluna is not None:
+            sql += f" ORDER BY {coluna}"
+        if limite is not None:
+            sql += " LIMIT ?"
+            parametros.append(int(limite))
+        with self._rlock:
+            linhas = self._conectar().execute(sql, parametros).fetchall()
+        return [dict(zip(colunas, linha)) for linha in linhas]
+
+    # ---------- transações ----------
+
+    @contextmanager
+    def transacao(self, esperado=()):
+        """
+        Trava o banco para uma sequência de leituras e alterações, como
+        Diario.transacao: aplica o que outros processos gravaram e confere os
+        registros em esperado (lança ConflitoError se algum mudou). Pode ser
+        aninhada; só a mais externa abre e confirma a transação do SQLite.
+        """
+        with self._rlock:
+            conexao = self._conectar()
+            externa = self._profundidade == 0
+            if externa:
+                with metricas.medir("espera_trava"):
+                    conexao.execute("BEGIN IMMEDIATE")
+            self._profundidade += 1
+            try:
+                if externa:
+                    self._atualizar()
+                _verificar(self.colecoes, esperado)
+                yield self
+            finally:
+                self._profundidade -= 1
+                if externa:
+                    # As coleções em memória já mudaram: o que foi registrado é
+                    # confirmado mesmo que o bloco termine com erro (como no diário)
+                    conexao.execute("COMMIT")
+                    self._sem_fsync = self._sem_fsync or not self._sincrono
+                    if self._sincronizar_ao_sair:
+                        self._sincronizar_ao_sair = False
+                        self.sincronizar()
+                    elif self._sem_fsync and not self._em_lote:
+                        self._agendar()
+
+    # ---------- escrita ----------
+
+    def _marcar_alterada(self, colecao):
+        """Anota (dentro da transação) que o CSV da coleção ficou desatualizado."""
+        if colecao not in self._alteradas:
+            self._alteradas.add(colecao)
+            self._gravar_estado("alteradas", sorted(self._alteradas))
+
+    def registrar(self, op, colecao, id, dados=None):
+        """Grava uma alteração já feita em memória na tabela da coleção e no diário."""
+        sql = self._sql[colecao]
+        with self.transacao():
+            self.seq += 1
+            valores = None
+            if dados is not None:
+                valores = {c: dados[c] for c in sql["campos"]}
+            if op == "inserir":
+                self._conexao.execute(sql["inserir"], (id, *valores.values()))
+            elif op == "atualizar":
+                self._conexao.execute(sql["atualizar"], (*valores.values(), id))
+            elif op == "remover":
+                self._conexao.execute(sql["remover"], (id,))
+            else:
+                raise ValueError(f"Operação desconhecida: {op!r}")
+            self._conexao.execute(
+                "INSERT INTO diario (seq, op, colecao, id, dados) VALUES (?, ?, ?, ?, ?)",
+                (self.seq, op, colecao, id, None if valores is None else json.dumps(valores, ensure_ascii=False)),
+            )
+            self.pendentes += 1
+            self._marcar_alterada(colecao)
+            metricas.contar("alteracoes", colecao=colecao, op=op)
+            if not self._em_lote and self.pendentes >= LIMITE_DIARIO:
+                self._podar()
+
+    def registrar_insercoes(self, colecao, ids):
+        """
+        Registra de uma vez a inclusão de muitos registros já inseridos na
+        tabela. Acima do limite do diário, as linhas vão direto para a tabela
+        (executemany) e o diário é podado: os outros processos recarregam.
+        """
+        with self.transacao():
+            tabela = self.colecoes[colecao]
+            if len(ids) < LIMITE_DIARIO:
+                with self.em_lote():
+                    for id in ids:
+                        self.registrar("inserir", colecao, id, dados=tabela.por_id(id))
+                return
+            campos = self._sql[colecao]["campos"]
+            self._conexao.executemany(
+                self._sql[colecao]["inserir"],
+                ((id, *(registro[c] for c in campos)) for id, registro in zip(ids, map(tabela.por_id, ids))),
+            )
+            self.seq += 1
+            self._marcar_alterada(colecao)
+            metricas.contar("alteracoes", len(ids), colecao=colecao, op="inserir")
+            self._podar()
+
+    def _podar(self):
+        """Esvazia o diário (dentro de uma transação); quem estiver atrás recarrega as tabelas."""
+        self._conexao.execute("DELETE FROM diario")
+        self._gravar_estado("base", self.seq)
+        self._gravar_estado("proximo_id", {c: self.colecoes[c].proximo_id for c in COLUNAS})
+        self.pendentes = 0
+
+    def _confirmar_no_disco(self):
+        # Com synchronous=FULL, confirmar uma transação faz fsync do WAL inteiro,
+        # inclusive das transações confirmadas sem fsync (em_lote ou janela)
+        self._definir_sincrono(True)
+        try:
+            with metricas.medir("fsync"):
+                self._conexao.execute("BEGIN IMMEDIATE")
+                self._gravar_estado("sincronizado", self.seq)
+                self._conexao.execute("COMMIT")
+            self._sem_fsync = False
+        finally:
+            self._definir_sincrono(not self._em_lote and self.janela <= 0)
+
+    def _agendar(self):
+        """Agenda o fsync para daqui a janela segundos, juntando as transações que chegarem até lá."""
+        if self._agendada is None and self.janela > 0:
+            self._agendada = threading.Timer(self.janela, self._descarregar)
+            self._agendada.daemon = True
+            self._agendada.start()
+
+    def _descarregar(self):
+        """Faz o fsync das transações já confirmadas (também na thread do fsync adiado)."""
+        with self._rlock:
+            if self._agendada is not None:
+                self._agendada.cancel()
+                self._agendada = None
+            if self._profundidade:
+                self._sincronizar_ao_sair = True
+            elif self._sem_fsync and self._conexao is not None:
+                self._confirmar_no_disco()
+
+    def sincronizar(self):
+        """Garante no disco as transações já confirmadas e poda o diário se passou do limite."""
+        with self._rlock:
+            if self._conexao is None:
+                return
+            if self.pendentes >= LIMITE_DIARIO:
+                with self.transacao():
+                    self._podar()
+            # No meio de uma transação, o fsync fica para a confirmação
+            self._descarregar()
+
+    @contextmanager
+    def em_lote(self):
+        """
+        Agrupa várias alterações com um único fsync ao final do bloco. Dentro
+        de uma transação o bloco já é confirmado de uma vez, com um só fsync.
+        """
+        with self._rlock:
+            anterior, self._em_lote = self._em_lote, True
+            if not anterior and not self._profundidade:
+                self._conectar()
+                self._definir_sincrono(False)
+        try:
+            yield self
+        finally:
+            with self._rlock:
+                self._em_lote = anterior
+                if not anterior:
+                    if not self._profundidade and self._conexao is not None:
+                        self._definir_sincrono(self.janela <= 0)
+                    self.sincronizar()
+
+    def compactar(self, todas=False):
+        """
+        Poda o diário, regrava os CSVs (lidos pelo R) das coleções alteradas
+        (todas, com todas=True) e devolve ao banco as páginas do WAL.
+        """
+        with metricas.medir("salvar"), self._rlock:
+            with self.transacao():
+                self._podar()
+                # Com o banco travado, os CSVs saem iguais ao que está gravado
+                Diario(self.dados_dir, self.colecoes).exportar(self.seq, None if todas else self._alteradas)
+                self._alteradas = set()
+                self._gravar_estado("alteradas", [])
+            self.sincronizar()
+            self._conexao.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+    def fechar(self):
+        """Grava no disco o que estiver pendente (inclusive um fsync adiado) e fecha o banco."""
+        with self._rlock:
+            self._descarregar()
+            if self._conexao is not None:
+                self._conexao.close()
+                self._conexao = None
@@ -0,0 +1,284 @@
+# -*- coding: utf-8 -*-
+"""
+FarmTech - Medição de desempenho
+Descrição: Gera bases sintéticas (determinísticas) de culturas e insumos e mede
+tempo e pico de memória das operações principais: carregar, salvar (tudo ou
+só a coleção alterada), listar, calcular a aplicação e registrar alterações. O resultado sai em JSON, para
+comparar versões e detectar regressões antes de atualizar os servidores.
+
+Exemplos:
+    python benchmark.py --tamanhos 1000 100000 --saida resultados.json
+    python benchmark.py --tamanhos 1000 100000 --comparar resultados.json
+    python benchmark.py --tamanhos 100000 --armazenamento csv sqlite
+"""
+
+import argparse
+import csv
+import gc
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import operacoes
+from aplicacao import calcular_matriz
+from armazem import TabelaAplicacoes, TabelaCulturas, TabelaInsumos
+from geometria import area_circulo, area_retangulo
+from linha_comando import _escrever_registros
+from persistencia import COLUNAS, TIPOS_ARMAZENAMENTO, abrir_armazenamento
+
+# Alterações registradas na medição do diário (limitadas ao tamanho da base)
+ALTERACOES = 10000
+
+# ===========================
+# DADOS SINTÉTICOS
+# ===========================
+
+def gerar_culturas(quantidade, semente=42):
+    """Produz culturas sintéticas (dicionários), metade retangulares e metade circulares em média."""
+    aleatorio = random.Random(semente)
+    for i in range(1, quantidade + 1):
+        if aleatorio.random() < 0.5:
+            formato = "retangular"
+            area = area_retangulo(round(aleatorio.uniform(10, 1000), 2), round(aleatorio.uniform(10, 1000), 2))
+        else:
+            formato = "circular"
+            area = area_circulo(round(aleatorio.uniform(5, 500), 2))
+        faixas = aleatorio.randint(1, 50)
+        yield {
+            "nome": f"Cultura {i:08d}",
+            "formato": formato,
+            "area": area,
+            "faixas": faixas,
+            "area_faixa": area / faixas,
+            "id": i,
+            "geometria": "",
+        }
+
+
+def gerar_insumos(quantidade, semente=42):
+    """Produz insumos sintéticos (dicionários) com doses entre 0,001 e 0,5 L/m²."""
+    aleatorio = random.Random(semente + 1)
+    for i in range(1, quantidade + 1):
+        yield {"nome": f"Insumo {i:05d}", "dose_m2": round(aleatorio.uniform(0.001, 0.5), 4), "id": i, "estoque": 0.0}
+
+
+def gravar_base(pasta, culturas, insumos, semente=42):
+    """Grava culturas.csv e insumos.csv sintéticos em pasta, sem manter tudo em memória."""
+    os.makedirs(pasta, exist_ok=True)
+    for colecao, registros in (
+        ("culturas", gerar_culturas(culturas, semente)),
+        ("insumos", gerar_insumos(insumos, semente)),
+        ("aplicacoes", ()),
+    ):
+        colunas = COLUNAS[colecao]
+        with open(os.path.join(pasta, f"{colecao}.csv"), "w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            writer.writerow(colunas)
+            writer.writerows([registro[c] for c in colunas] for registro in registros)
+
+# ===========================
+# MEDIÇÃO
+# ===========================
+
+def medir(funcao, repeticoes=3, memoria=True):
+    """
+    Executa funcao repeticoes vezes e devolve os tempos (s) e a mediana.
+    Com memoria=True, executa mais uma vez sob tracemalloc para obter o pico
+    de memória alocada pelo Python (páginas de mmap não entram nessa conta).
+    """
+    tempos = []
+    for _ in range(repeticoes):
+        gc.collect()
+        inicio = time.perf_counter()
+        funcao()
+        tempos.append(time.perf_counter() - inicio)
+
+    resultado = {"segundos": tempos, "mediana": statistics.median(tempos)}
+    if memoria:
+        gc.collect()
+        tracemalloc.start()
+        try:
+            funcao()
+            resultado["pico_memoria_bytes"] = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+    return resultado
+
+
+def _novo_diario(pasta, armazenamento="csv"):
+    culturas, insumos = TabelaCulturas(), TabelaInsumos()
+    colecoes = {"culturas": culturas, "insumos": insumos, "aplicacoes": TabelaAplicacoes()}
+    return abrir_armazenamento(pasta, colecoes, armazenamento), culturas, insumos
+
+
+def medir_base(pasta, linhas, insumos, repeticoes=3, memoria=True, semente=42, armazenamento="csv"):
+    """Gera uma base com linhas culturas e mede cada operação sobre ela."""
+    gravar_base(pasta, linhas, insumos, semente)
+    carregados = {}
+
+    def carregar_csv():
+        # Sem a fotografia binária (ou o banco): lê o CSV e regenera o .bin ou o banco
+        for arquivo in [f"{c}.bin" for c in COLUNAS] + ["farmtech.db", "farmtech.db-wal", "farmtech.db-shm"]:
+            if os.path.exists(os.path.join(pasta, arquivo)):
+                os.remove(os.path.join(pasta, arquivo))
+        diario, _, _ = _novo_diario(pasta, armazenamento)
+        diario.carregar()
+        diario.fechar()
+
+    def carregar_binario():
+        # Carga normal: fotografia binária ou banco SQLite
+        if "diario" in carregados:
+            carregados["diario"].fechar()
+        diario, culturas_, insumos_ = _novo_diario(pasta, armazenamento)
+        diario.carregar()
+        carregados.update(diario=diario, culturas=culturas_, insumos=insumos_)
+
+    def salvar():
+        # Regrava todas as coleções: sem alterações, compactar() não gravaria nada
+        carregados["diario"].compactar(todas=True)
+
+    def salvar_alteracao():
+        # O caso comum: uma alteração e só a coleção alterada é regravada
+        diario, culturas_ = carregados["diario"], carregados["culturas"]
+        faixas = culturas_.por_id(1)["faixas"] % 50 + 1
+        operacoes.atualizar_cultura(culturas_, diario, 1, {"faixas": faixas})
+        diario.compactar()
+
+    def listar():
+        culturas_ = carregados["culturas"]
+        with open(os.devnull, "w", encoding="utf-8") as nulo:
+            _escrever_registros(culturas_, ["id", *culturas_.colunas], "texto", nulo)
+
+    def aplicar():
+        calcular_matriz(carregados["culturas"], carregados["insumos"])
+
+    def atualizar_em_lote():
+        diario, culturas_ = carregados["diario"], carregados["culturas"]
+        with diario.transacao(), diario.em_lote():
+            for id in range(1, min(linhas, ALTERACOES) + 1):
+                faixas = culturas_.por_id(id)["faixas"] % 50 + 1
+                operacoes.atualizar_cultura(culturas_, diario, id, {"faixas": faixas})
+
+    resultados = []
+    for nome, funcao in (
+        ("carregar_csv", carregar_csv),
+        ("carregar_binario", carregar_binario),
+        ("salvar", salvar),
+        ("salvar_alteracao", salvar_alteracao),
+        ("listar", listar),
+        ("aplicar", aplicar),
+        ("atualizar_em_lote", atualizar_em_lote),
+    ):
+        medicao = medir(funcao, repeticoes, memoria)
+        resultados.append({
+            "operacao": nome, "linhas": linhas, "insumos": insumos, "armazenamento": armazenamento, **medicao,
+        })
+        _progresso(resultados[-1])
+
+    carregados["diario"].fechar()
+    return resultados
+
+
+def _progresso(resultado):
+    pico = resultado.get("pico_memoria_bytes")
+    memoria = f", pico {pico / 2**20:.1f} MiB" if pico is not None else ""
+    sys.stderr.write(
+        f"  {resultado['operacao']:<18} {resultado.get('armazenamento', 'csv'):<7} {resultado['linhas']:>10} linhas: "
+        f"{resultado['mediana'] * 1000:.1f} ms{memoria}\n"
+    )
+
+# ===========================
+# COMPARAÇÃO ENTRE EXECUÇÕES
+# ===========================
+
+def comparar(atual, anterior, tolerancia=0.2):
+    """
+    Compara as medianas de duas execuções (mesma operação, tamanho e
+    armazenamento) e devolve as regressões: itens cujo tempo cresceu mais que a
+    tolerância (0.2 = 20%).
+    """
+    def chave(r):
+        return r["operacao"], r["linhas"], r.get("armazenamento", "csv")
+
+    base = {chave(r): r for r in anterior["resultados"]}
+    regressoes = []
+    for resultado in atual["resultados"]:
+        antes = base.get(chave(resultado))
+        if antes is None or antes["mediana"] <= 0:
+            continue
+        razao = resultado["mediana"] / antes["mediana"]
+        if razao > 1 + tolerancia:
+            regressoes.append({
+                "operacao": resultado["operacao"],
+                "linhas": resultado["linhas"],
+                "armazenamento": resultado.get("armazenamento", "csv"),
+                "antes": antes["mediana"],
+                "depois": resultado["mediana"],
+                "razao": razao,
+            })
+    return regressoes
+
+# ===========================
+# LINHA DE COMANDO
+# ===========================
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="FarmTech - medição de desempenho com dados sintéticos.")
+    parser.add_argument("--tamanhos", type=int, nargs="+", default=[1000, 10000, 100000],
+                        help="quantidades de culturas a gerar (ex.: 1000 ... 10000000)")
+    parser.add_argument("--insumos", type=int, default=10, help="quantidade de insumos (padrão: 10)")
+    parser.add_argument("--repeticoes", type=int, default=3, help="execuções cronometradas por operação")
+    parser.add_argument("--semente", type=int, default=42, help="semente do gerador (padrão: 42)")
+    parser.add_argument("--sem-memoria", action="store_true", help="não mede o pico de memória (mais rápido)")
+    parser.add_argument("--armazenamento", nargs="+", choices=TIPOS_ARMAZENAMENTO, default=["csv"],
+                        help="armazenamentos a medir (padrão: csv)")
+    parser.add_argument("--pasta", help="pasta de trabalho (padrão: pasta temporária, apagada ao final)")
+    parser.add_argument("--saida", help="arquivo JSON de resultados (padrão: saída padrão)")
+    parser.add_argument("--comparar", help="JSON de uma execução anterior; sai com código 1 se houver regressão")
+    parser.add_argument("--tolerancia", type=float, default=0.2, help="aumento de tempo tolerado (padrão: 0.2)")
+    args = parser.parse_args(argv)
+
+    execucao = {
+        "python": platform.python_version(),
+        "plataforma": platform.platform(),
+        "data": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "semente": args.semente,
+        "repeticoes": args.repeticoes,
+        "resultados": [],
+    }
+    with tempfile.TemporaryDirectory(prefix="farmtech-bench-") as temporaria:
+        for armazenamento in args.armazenamento:
+            for linhas in args.tamanhos:
+                sys.stderr.write(f"📏 {linhas} culturas, {args.insumos} insumos ({armazenamento})\n")
+                pasta = os.path.join(args.pasta or temporaria, armazenamento, str(linhas))
+                execucao["resultados"] += medir_base(
+                    pasta, linhas, args.insumos, args.repeticoes, not args.sem_memoria, args.semente, armazenamento
+                )
+
+    conteudo = json.dumps(execucao, ensure_ascii=False, indent=2)
+    if args.saida:
+        with open(args.saida, "w", encoding="utf-8") as f:
+            f.write(conteudo + "\n")
+    else:
+        print(conteudo)
+
+    if args.comparar:
+        with open(args.comparar, "r", encoding="utf-8") as f:
+            regressoes = comparar(execucao, json.load(f), args.tolerancia)
+        for r in regressoes:
+            sys.stderr.write(
+                f"⚠️  Regressão em {r['operacao']} ({r['armazenamento']}, {r['linhas']} linhas): "
+                f"{r['antes'] * 1000:.1f} ms -> {r['depois'] * 1000:.1f} ms ({r['razao']:.2f}x)\n"
+            )
+        return 1 if regressoes else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
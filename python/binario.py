@@ -0,0 +1,148 @@
+# -*- coding: utf-8 -*-
+"""
+FarmTech - Fotografia binária das tabelas
+Descrição: Grava cada tabela em um arquivo .bin de colunas de largura fixa
+(mais uma tabela de textos) que é aberto com mmap, evitando interpretar o
+CSV a cada inicialização. Os CSVs continuam sendo o formato de troca (R).
+"""
+
+import mmap
+import os
+import struct
+
+from armazem import CATEGORIA, TEXTO
+
+# ===========================
+# FORMATO DO ARQUIVO
+# ===========================
+
+MAGICO = b"FTSB"
+VERSAO = 1
+
+# Cabeçalho: mágico, versão, nº de seções, nº de registros,
+# mtime_ns e tamanho do CSV de origem (para detectar fotografia desatualizada)
+CABECALHO = struct.Struct("<4sHHQqq")
+
+# Seção: nome (32 bytes), tipo ("d", "i", "b", "q" ou "s" = textos), início e tamanho em bytes
+SECAO = struct.Struct("<32s1sQQ")
+
+# Terminador de cada texto dentro de uma seção "s"
+TERMINADOR = "\0"
+
+# ===========================
+# FUNÇÕES AUXILIARES
+# ===========================
+
+def assinatura(caminho_csv):
+    """Identifica a versão do CSV pela data de modificação e tamanho."""
+    info = os.stat(caminho_csv)
+    return info.st_mtime_ns, info.st_size
+
+
+def _textos_em_bytes(textos):
+    if not textos:
+        return b""
+    return (TERMINADOR.join(textos) + TERMINADOR).encode("utf-8")
+
+
+def _bytes_em_textos(dados):
+    # Nomes são únicos, então não há ganho em interná-los aqui
+    return str(dados, "utf-8").split(TERMINADOR)[:-1]
+
+# ===========================
+# GRAVAÇÃO
+# ===========================
+
+def gravar_binario(caminho, tabela, caminho_csv):
+    """Grava a fotografia binária da tabela, associada ao estado atual do CSV de origem."""
+    dados, ids, categorias, chaves = tabela.exportar()
+
+    secoes = [("#id", "q", bytes(memoryview(ids).cast("B")))]
+    for coluna, tipo in tabela.ESQUEMA:
+        vetor = dados[coluna]
+        if tipo == TEXTO:
+            secoes.append((coluna, "s", _textos_em_bytes(vetor)))
+        else:
+            codigo = "b" if tipo == CATEGORIA else tipo
+            secoes.append((coluna, codigo, bytes(memoryview(vetor).cast("B"))))
+    for coluna, valores in categorias.items():
+        secoes.append((coluna + "#categorias", "s", _textos_em_bytes(valores)))
+    secoes.append(("#chaves", "s", _textos_em_bytes(chaves)))
+
+    # Cada seção começa em um múltiplo de 8 bytes
+    inicio = CABECALHO.size + SECAO.size * len(secoes)
+    descritores, posicoes = [], []
+    for nome, codigo, conteudo in secoes:
+        inicio += -inicio % 8
+        posicoes.append(inicio)
+        descritores.append(SECAO.pack(nome.encode("utf-8"), codigo.encode("ascii"), inicio, len(conteudo)))
+        inicio += len(conteudo)
+
+    mtime_ns, tamanho = assinatura(caminho_csv)
+    temporario = caminho + ".tmp"
+    with open(temporario, "wb") as f:
+        f.write(CABECALHO.pack(MAGICO, VERSAO, len(secoes), len(ids), mtime_ns, tamanho))
+        f.write(b"".join(descritores))
+        for posicao, (_, _, conteudo) in zip(posicoes, secoes):
+            f.write(b"\0" * (posicao - f.tell()))
+            f.write(conteudo)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temporario, caminho)
+
+# ===========================
+# LEITURA
+# ===========================
+
+def abrir_binario(caminho, tabela, caminho_csv):
+    """
+    Carrega a tabela a partir da fotografia binária, se ela existir e
+    corresponder ao CSV atual. Retorna False quando é preciso ler o CSV.
+
+    As colunas numéricas ficam como views do mmap (páginas compartilhadas
+    entre processos) até a primeira alteração da tabela.
+    """
+    if not os.path.exists(caminho) or not os.path.exists(caminho_csv):
+        return False
+
+    with open(caminho, "rb") as f:
+        try:
+            mapa = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            return False  # arquivo vazio
+
+    if len(mapa) < CABECALHO.size:
+        return False
+    magico, versao, n_secoes, quantidade, mtime_ns, tamanho = CABECALHO.unpack_from(mapa, 0)
+    if magico != MAGICO or versao != VERSAO or (mtime_ns, tamanho) != assinatura(caminho_csv):
+        return False
+    if quantidade == 0:
+        return True
+
+    visao = memoryview(mapa)
+    secoes = {}
+    for i in range(n_secoes):
+        nome, codigo, inicio, tamanho_secao = SECAO.unpack_from(mapa, CABECALHO.size + i * SECAO.size)
+        conteudo = visao[inicio:inicio + tamanho_secao]
+        codigo = codigo.decode("ascii")
+        if codigo == "s":
+            secoes[nome.rstrip(b"\0").decode("utf-8")] = conteudo
+        else:
+            secoes[nome.rstrip(b"\0").decode("utf-8")] = conteudo.cast(codigo)
+
+    if any(coluna not in secoes for coluna in tabela.colunas):
+        return False  # fotografia de uma versão com menos colunas
+
+    dados, categorias = {}, {}
+    for coluna, tipo in tabela.ESQUEMA:
+        if tipo == TEXTO:
+            dados[coluna] = _bytes_em_textos(secoes[coluna])
+        else:
+            dados[coluna] = secoes[coluna]
+        if tipo == CATEGORIA:
+            categorias[coluna] = _bytes_em_textos(secoes[coluna + "#categorias"])
+    chaves = _bytes_em_textos(secoes["#chaves"])
+
+    tabela.adotar(dados, secoes["#id"], categorias, chaves)
+    return True
+
@@ -0,0 +1,341 @@
+# -*- coding: utf-8 -*-
+"""
+FarmTech - Clima local com cache
+Descrição: Obtém o clima atual do local da fazenda por um provedor plugável
+(OpenWeatherMap, a mesma API usada em r/analise.r, ou um arquivo JSON para
+testes e uso sem internet), guarda cada leitura em dados/clima.json por
+FARMTECH_CLIMA_TTL segundos e avalia se o momento é adequado para pulverizar
+(vento, chuva, umidade e temperatura).
+
+Pedidos simultâneos do mesmo local (threads do serviço HTTP ou vários
+processos na mesma pasta de dados) são agrupados: só um consulta o provedor e
+os demais usam a leitura que ele gravou. Se o provedor falhar, vale a última
+leitura por até TOLERANCIA_DESATUALIZADA segundos, marcada como desatualizada.
+
+Configuração (variáveis de ambiente):
+    FARMTECH_CLIMA               openweather, arquivo ou nenhum (padrão: openweather
+                                 se houver chave, arquivo se existir dados/clima_offline.json)
+    FARMTECH_OPENWEATHER_CHAVE   chave da API do OpenWeatherMap
+    FARMTECH_CLIMA_ARQUIVO       JSON lido pelo provedor "arquivo" (formato do OpenWeatherMap)
+    FARMTECH_CLIMA_TTL           segundos em que uma leitura vale (padrão: 600)
+    FARMTECH_LOCAL               latitude,longitude da fazenda (padrão: Belo Horizonte - MG)
+    FARMTECH_LOCAL_NOME          nome do local mostrado nas leituras
+"""
+
+import json
+import os
+import threading
+import time
+from urllib.error import URLError
+from urllib.parse import urlencode
+from urllib.request import urlopen
+
+import metricas
+from concorrencia import TravaArquivo
+
+# ===========================
+# CONFIGURAÇÃO
+# ===========================
+
+PROVEDOR = os.environ.get("FARMTECH_CLIMA", "")
+TIPOS_PROVEDOR = ("openweather", "arquivo", "nenhum")
+CHAVE_OPENWEATHER = os.environ.get("FARMTECH_OPENWEATHER_CHAVE", "")
+URL_OPENWEATHER = "https://api.openweathermap.org/data/2.5/weather"
+
+# O OpenWeatherMap atualiza o clima atual a cada ~10 minutos
+TTL = float(os.environ.get("FARMTECH_CLIMA_TTL", "600"))
+# Por quanto tempo a última leitura ainda serve quando o provedor falha
+TOLERANCIA_DESATUALIZADA = 3 * 3600
+# Depois de uma falha, espera este tempo antes de consultar o provedor de novo
+ESPERA_APOS_FALHA = 60
+# Tempo máximo (s) de espera pela resposta da API
+TEMPO_LIMITE = 10
+
+LOCAL = os.environ.get("FARMTECH_LOCAL", "-19.9167,-43.9345")
+NOME_LOCAL = os.environ.get("FARMTECH_LOCAL_NOME", "Belo Horizonte - MG")
+
+ARQUIVO_CACHE = "clima.json"
+ARQUIVO_OFFLINE = "clima_offline.json"
+ARQUIVO_TRAVA = ".trava_clima"
+
+# Condições para pulverizar (boas práticas de aplicação contra deriva e lavagem)
+VENTO_MINIMO = 3.0        # km/h; abaixo disso há risco de inversão térmica
+VENTO_MAXIMO = 10.0       # km/h
+RAJADA_MAXIMA = 15.0      # km/h
+UMIDADE_MINIMA = 55.0     # %; ar seco evapora as gotas
+TEMPERATURA_MAXIMA = 30.0  # °C
+
+# ===========================
+# ERROS
+# ===========================
+
+class ErroClima(RuntimeError):
+    """O provedor de clima não respondeu e não há leitura recente no cache."""
+
+# ===========================
+# PROVEDORES
+# ===========================
+
+def _leitura_openweather(resposta, fonte):
+    """Converte uma resposta do OpenWeatherMap (units=metric) em uma leitura."""
+    try:
+        principal = resposta["main"]
+        vento = resposta.get("wind") or {}
+        tempo = (resposta.get("weather") or [{}])[0]
+        chuva = resposta.get("rain") or {}
+        codigo = int(tempo.get("id", 800))
+        return {
+            "temperatura": float(principal["temp"]),
+            "umidade": float(principal["humidity"]),
+            "vento": float(vento.get("speed", 0.0)) * 3.6,  # m/s -> km/h
+            "rajada": None if vento.get("gust") is None else float(vento["gust"]) * 3.6,
+            "chuva": float(chuva.get("1h", chuva.get("3h", 0.0))),
+            # Grupos 2xx (trovoada), 3xx (garoa) e 5xx (chuva) dos códigos do OpenWeatherMap
+            "chovendo": codigo // 100 in (2, 3, 5),
+            "condicao": tempo.get("description", ""),
+            "fonte": fonte,
+        }
+    except (KeyError, TypeError, ValueError) as erro:
+        raise ErroClima(f"Resposta de clima inválida ({fonte}): campo {erro} ausente ou inválido.") from None
+
+
+class ProvedorOpenWeather:
+    """Clima atual pela API do OpenWeatherMap (a mesma consulta de r/analise.r)."""
+
+    nome = "openweather"
+
+    def __init__(self, chave=None, tempo_limite=TEMPO_LIMITE):
+        self.chave = chave or CHAVE_OPENWEATHER
+        self.tempo_limite = tempo_limite
+        if not self.chave:
+            raise ErroClima("Informe a chave da API em FARMTECH_OPENWEATHER_CHAVE.")
+
+    def obter(self, lat, lon):
+        url = URL_OPENWEATHER + "?" + urlencode(
+            {"lat": lat, "lon": lon, "units": "metric", "lang": "pt_br", "appid": self.chave}
+        )
+        try:
+            with metricas.medir("clima_provedor", provedor=self.nome), urlopen(url, timeout=self.tempo_limite) as r:
+                resposta = json.loads(r.read().decode("utf-8"))
+        except (URLError, OSError, ValueError) as erro:
+            raise ErroClima(f"Não foi possível obter os dados de clima: {erro}") from None
+        return _leitura_openweather(resposta, self.nome)
+
+
+class ProvedorArquivo:
+    """
+    Clima lido de um arquivo JSON no formato da resposta do OpenWeatherMap,
+    para testes e uso sem internet. O arquivo é relido a cada consulta, então
+    basta editá-lo para simular outra condição.
+    """
+
+    nome = "arquivo"
+
+    def __init__(self, caminho):
+        self.caminho = caminho
+
+    def obter(self, lat, lon):
+        try:
+            with open(self.caminho, "r", encoding="utf-8") as arquivo:
+                resposta = json.load(arquivo)
+        except (OSError, ValueError) as erro:
+            raise ErroClima(f"Não foi possível ler o clima de {self.caminho}: {erro}") from None
+        return _leitura_openweather(resposta, self.nome)
+
+# ===========================
+# CACHE EM DISCO
+# ===========================
+
+def _chave(lat, lon):
+    """Chave do local no cache: duas casas decimais (~1 km) bastam para o clima."""
+    return f"{lat:.2f},{lon:.2f}"
+
+
+def ler_local(texto=None):
+    """'lat,lon' (padrão: FARMTECH_LOCAL) -> (lat, lon)."""
+    texto = LOCAL if texto is None else texto
+    try:
+        lat, lon = (float(v) for v in str(texto).split(","))
+    except ValueError:
+        raise ValueError(f"Local inválido: {texto!r} (use latitude,longitude, ex.: -19.9167,-43.9345).") from None
+    if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+        raise ValueError(f"Local fora do globo: {texto!r}.")
+    return lat, lon
+
+
+class CacheClima:
+    """
+    Leituras de clima por local em dados/clima.json, válidas por ttl segundos.
+
+    obter() devolve a leitura do cache se ainda válida; senão trava
+    dados/.trava_clima (entre threads e processos), relê o cache, que outro
+    pedido pode ter acabado de atualizar, e só então consulta o provedor.
+    Assim, pedidos simultâneos do mesmo local geram uma única consulta.
+    """
+
+    def __init__(self, dados_dir, provedor, ttl=TTL):
+        self.caminho = os.path.join(dados_dir, ARQUIVO_CACHE)
+        self.provedor = provedor
+        self.ttl = ttl
+        self._trava = TravaArquivo(os.path.join(dados_dir, ARQUIVO_TRAVA))
+        self._lido = (None, {})  # ((inode, mtime), conteúdo) do arquivo de cache
+
+    def _ler(self):
+        try:
+            estado = os.stat(self.caminho)
+            # O arquivo é sempre substituído (os.replace): um novo inode indica nova gravação
+            marca = (estado.st_ino, estado.st_mtime_ns)
+        except FileNotFoundError:
+            return {}
+        if marca != self._lido[0]:
+            try:
+                with open(self.caminho, "r", encoding="utf-8") as arquivo:
+                    conteudo = json.load(arquivo)
+            except ValueError:
+                conteudo = {}  # cache corrompido: será regravado na próxima consulta
+            self._lido = (marca, conteudo)
+        return self._lido[1]
+
+    def _gravar(self, conteudo):
+        temporario = self.caminho + ".tmp"
+        with open(temporario, "w", encoding="utf-8") as arquivo:
+            json.dump(conteudo, arquivo, ensure_ascii=False, indent=1)
+        os.replace(temporario, self.caminho)
+
+    def _valida(self, item, agora):
+        leitura = item.get("leitura")
+        return leitura is not None and agora - leitura["obtido_em"] < self.ttl
+
+    @staticmethod
+    def _resultado(item, agora, origem):
+        leitura = dict(item["leitura"])
+        leitura["idade"] = agora - leitura["obtido_em"]
+        leitura["desatualizada"] = origem == "desatualizada"
+        metricas.contar("clima", origem=origem)
+        return leitura
+
+    def obter(self, lat, lon, nome=None, forcar=False):
+        """
+        Leitura do clima em (lat, lon): temperatura (°C), umidade (%), vento e
+        rajada (km/h), chuva (mm na última hora), chovendo, condicao, fonte,
+        obtido_em (epoch), idade (s) e desatualizada. forcar ignora o TTL.
+        """
+        chave = _chave(lat, lon)
+        agora = time.time()
+        item = self._ler().get(chave, {})
+        if not forcar and self._valida(item, agora):
+            return self._resultado(item, agora, "cache")
+
+        with self._trava.exclusiva():
+            conteudo = dict(self._ler())
+            item = conteudo.get(chave, {})
+            agora = time.time()
+            if self._valida(item, agora) and (not forcar or item["leitura"]["obtido_em"] > agora - 1):
+                return self._resultado(item, agora, "agrupada")  # outro pedido acabou de consultar
+            if forcar or agora - item.get("falhou_em", 0) >= ESPERA_APOS_FALHA:
+                try:
+                    leitura = self.provedor.obter(lat, lon)
+                except ErroClima as erro:
+                    item = dict(item, falhou_em=agora, erro=str(erro))
+                    conteudo[chave] = item
+                    self._gravar(conteudo)
+                else:
+                    leitura.update(local=nome or chave, lat=lat, lon=lon, obtido_em=agora)
+                    conteudo[chave] = {"leitura": leitura}
+                    self._gravar(conteudo)
+                    return self._resultado(conteudo[chave], agora, "provedor")
+
+        leitura = item.get("leitura")
+        if leitura is not None and agora - leitura["obtido_em"] < TOLERANCIA_DESATUALIZADA:
+            return self._resultado(item, agora, "desatualizada")
+        raise ErroClima(item.get("erro") or "Não foi possível obter os dados de clima.")
+
+
+_caches = {}
+_trava_caches = threading.Lock()
+
+
+def abrir_clima(dados_dir, tipo=None):
+    """
+    Cache de clima da pasta de dados com o provedor configurado (tipo ou
+    FARMTECH_CLIMA), ou None se nenhum provedor estiver disponível.
+    Devolve sempre o mesmo objeto para a mesma pasta e tipo.
+    """
+    tipo = tipo or PROVEDOR
+    arquivo = os.environ.get("FARMTECH_CLIMA_ARQUIVO") or os.path.join(dados_dir, ARQUIVO_OFFLINE)
+    if not tipo:
+        tipo = "openweather" if CHAVE_OPENWEATHER else "arquivo" if os.path.exists(arquivo) else "nenhum"
+    if tipo not in TIPOS_PROVEDOR:
+        raise ValueError(f"Provedor de clima desconhecido: {tipo!r} (use {', '.join(TIPOS_PROVEDOR)}).")
+    if tipo == "nenhum":
+        return None
+    with _trava_caches:
+        chave = (os.path.abspath(dados_dir), tipo)
+        if chave not in _caches:
+            provedor = ProvedorOpenWeather() if tipo == "openweather" else ProvedorArquivo(arquivo)
+            _caches[chave] = CacheClima(dados_dir, provedor)
+        return _caches[chave]
+
+# ===========================
+# JANELA DE PULVERIZAÇÃO
+# ===========================
+
+def janela_pulverizacao(leitura):
+    """
+    Avalia se o clima da leitura permite pulverizar. Devolve
+    {"adequada": bool, "alertas": [motivos]}; sem alertas, a janela é adequada.
+    """
+    alertas = []
+    if leitura["chovendo"] or leitura["chuva"] > 0:
+        chuva = f"chuva de {leitura['chuva']:.1f} mm na última hora" if leitura["chuva"] > 0 else leitura["condicao"]
+        alertas.append(f"{chuva or 'chuva'}: o produto pode ser lavado")
+    if leitura["vento"] > VENTO_MAXIMO:
+        alertas.append(f"vento de {leitura['vento']:.0f} km/h, acima de {VENTO_MAXIMO:.0f} km/h: risco de deriva")
+    elif leitura["vento"] < VENTO_MINIMO:
+        alertas.append(f"vento de {leitura['vento']:.0f} km/h, abaixo de {VENTO_MINIMO:.0f} km/h: "
+                       "risco de inversão térmica")
+    if leitura.get("rajada") is not None and leitura["rajada"] > RAJADA_MAXIMA:
+        alertas.append(f"rajadas de {leitura['rajada']:.0f} km/h, acima de {RAJADA_MAXIMA:.0f} km/h")
+    if leitura["umidade"] < UMIDADE_MINIMA:
+        alertas.append(f"umidade de {leitura['umidade']:.0f}%, abaixo de {UMIDADE_MINIMA:.0f}%: "
+                       "as gotas evaporam")
+    if leitura["temperatura"] > TEMPERATURA_MAXIMA:
+        alertas.append(f"temperatura de {leitura['temperatura']:.1f} °C, acima de {TEMPERATURA_MAXIMA:.0f} °C")
+    return {"adequada": not alertas, "alertas": alertas}
+
+
+def clima_da_aplicacao(dados_dir, local=None, forcar=False):
+    """
+    Clima do local da fazenda e a janela de pulverização, para anexar aos
+    resultados de aplicação: {"clima": leitura, "janela": {...}}, {"erro": motivo}
+    se não houver leitura, ou None se nenhum provedor estiver configurado.
+    A falta de clima não impede o cálculo da aplicação: só um local informado
+    inválido levanta ValueError.
+    """
+    if local is not None:
+        local = ler_local(local)
+    try:
+        cache = abrir_clima(dados_dir)
+        if cache is None:
+            return None
+        lat, lon = local or ler_local()
+        leitura = cache.obter(lat, lon, NOME_LOCAL if local is None else None, forcar)
+    except (ErroClima, ValueError) as erro:
+        return {"erro": str(erro)}
+    return {"clima": leitura, "janela": janela_pulverizacao(leitura)}
+
+
+def resumo(resultado):
+    """Texto de uma linha com o clima e a janela (para o menu e a linha de comando)."""
+    if "erro" in resultado:
+        return f"⚠️   Clima indisponível: {resultado['erro']}"
+    leitura, janela = resultado["clima"], resultado["janela"]
+    texto = (
+        f"{leitura['local']}: {leitura['temperatura']:.1f} °C, umidade {leitura['umidade']:.0f}%, "
+        f"vento {leitura['vento']:.0f} km/h, {leitura['condicao'] or 'sem descrição'}"
+    )
+    if leitura["desatualizada"]:
+        texto += f" (leitura de {leitura['idade'] / 60:.0f} min atrás; provedor indisponível)"
+    if janela["adequada"]:
+        return f"🌤️  {texto}. ✅ Janela adequada para pulverizar."
+    return f"🌧️  {texto}. ⚠️   Evite pulverizar agora: " + "; ".join(janela["alertas"]) + "."
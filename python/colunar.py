@@ -0,0 +1,147 @@
+# -*- coding: utf-8 -*-
+"""
+FarmTech - Exportação colunar (Arrow IPC / Parquet)
+Descrição: Grava culturas, insumos e aplicações em Arrow IPC (.arrow, o
+formato Feather v2) ou Parquet a partir dos vetores das tabelas: as colunas
+numéricas viram buffers Arrow sem cópia nem conversão registro a registro,
+as categorias (formato, safra) viram colunas de dicionário com os próprios
+códigos de 1 byte e só os textos são convertidos. O R lê o .arrow mapeado em
+memória (arrow::read_feather), sem interpretar CSV.
+
+Com particionar, culturas.parquet (ou .arrow) vira uma pasta com uma
+subpasta por valor da categoria, no estilo Hive
+(culturas.parquet/formato=circular/part-0.parquet), que o R abre com
+arrow::open_dataset lendo só as partições filtradas.
+
+Requer o pacote opcional pyarrow (pip install pyarrow); o resto do sistema
+funciona sem ele.
+"""
+
+import os
+import shutil
+
+from armazem import CATEGORIA, TEXTO
+from operacoes import ErroOperacao
+
+# ===========================
+# CONFIGURAÇÃO
+# ===========================
+
+FORMATOS_COLUNARES = ("arrow", "parquet")
+EXTENSOES = {"arrow": ".arrow", "parquet": ".parquet"}
+
+# Compressão do Parquet (o Arrow IPC fica sem compressão para ser lido por mmap)
+COMPRESSAO_PARQUET = "zstd"
+
+# ===========================
+# CONVERSÃO PARA ARROW
+# ===========================
+
+def _pyarrow():
+    try:
+        import pyarrow  # dependência opcional: só carregada na exportação colunar
+    except ImportError:
+        raise ErroOperacao("A exportação em Arrow/Parquet requer o pyarrow (pip install pyarrow).") from None
+    return pyarrow
+
+
+def _tipo_numerico(pa, vetor):
+    """Tipo Arrow de um array/memoryview pelo código e tamanho do item."""
+    codigo = vetor.format if isinstance(vetor, memoryview) else vetor.typecode
+    if codigo == "d":
+        return pa.float64()
+    return {1: pa.int8(), 2: pa.int16(), 4: pa.int32(), 8: pa.int64()}[vetor.itemsize]
+
+
+def _coluna_arrow(pa, vetor, quantidade):
+    """Array Arrow que aponta para a memória do vetor (sem cópia)."""
+    return pa.Array.from_buffers(_tipo_numerico(pa, vetor), quantidade, [None, pa.py_buffer(vetor)])
+
+
+def tabela_arrow(tabela):
+    """
+    Converte uma Tabela (armazem.py) em pyarrow.Table com a coluna "id" e as
+    do ESQUEMA, na ordem das posições. Os buffers numéricos são compartilhados
+    com a tabela: a pyarrow.Table deve ser gravada antes de novas alterações.
+    """
+    pa = _pyarrow()
+    dados, ids, categorias, _ = tabela.exportar()
+    quantidade = len(ids)
+    colunas = {"id": _coluna_arrow(pa, ids, quantidade)}
+    for nome, tipo in tabela.ESQUEMA:
+        vetor = dados[nome]
+        if tipo == TEXTO:
+            colunas[nome] = pa.array(vetor, pa.string())
+        elif tipo == CATEGORIA:
+            colunas[nome] = pa.DictionaryArray.from_arrays(
+                _coluna_arrow(pa, vetor, quantidade), pa.array(categorias[nome], pa.string())
+            )
+        else:
+            colunas[nome] = _coluna_arrow(pa, vetor, quantidade)
+    return pa.table(colunas)
+
+# ===========================
+# GRAVAÇÃO
+# ===========================
+
+def _gravar_arquivo(pa, tabela, caminho, formato):
+    temporario = caminho + ".tmp"
+    if formato == "arrow":
+        with pa.OSFile(temporario, "wb") as arquivo, pa.ipc.new_file(arquivo, tabela.schema) as escritor:
+            escritor.write_table(tabela)
+    else:
+        import pyarrow.parquet as pq
+        pq.write_table(tabela, temporario, compression=COMPRESSAO_PARQUET)
+    if os.path.isdir(caminho):
+        shutil.rmtree(caminho)  # exportação anterior particionada
+    os.replace(temporario, caminho)
+
+
+def _gravar_particionado(tabela, pasta, formato, coluna):
+    """Grava a tabela como pasta de partições (ex.: culturas.parquet/formato=circular/part-0.parquet)."""
+    import pyarrow.dataset as ds
+    temporaria = pasta + ".tmp"
+    shutil.rmtree(temporaria, ignore_errors=True)
+    ds.write_dataset(
+        tabela, temporaria, format="ipc" if formato == "arrow" else "parquet",
+        partitioning=[coluna], partitioning_flavor="hive",
+        basename_template="part-{i}" + EXTENSOES[formato],
+        file_options=None if formato == "arrow" else ds.ParquetFileFormat().make_write_options(
+            compression=COMPRESSAO_PARQUET
+        ),
+    )
+    os.makedirs(temporaria, exist_ok=True)  # tabela vazia: nenhuma partição gravada
+    if os.path.isdir(pasta):
+        shutil.rmtree(pasta)
+    elif os.path.exists(pasta):
+        os.remove(pasta)  # exportação anterior em arquivo único
+    os.replace(temporaria, pasta)
+
+
+def exportar_colunar(colecoes, destino, formato="arrow", particionar=None):
+    """
+    Grava cada coleção ({nome: Tabela}) em destino como <nome>.arrow ou
+    <nome>.parquet. Com particionar (ex.: "formato"), as coleções que têm
+    essa categoria viram pastas de partições; as demais ficam em um arquivo.
+    Devolve {nome: (caminho, registros)}.
+    """
+    if formato not in FORMATOS_COLUNARES:
+        raise ErroOperacao(f"Formato colunar desconhecido: {formato!r} (use {' ou '.join(FORMATOS_COLUNARES)}).")
+    pa = _pyarrow()
+    import pyarrow.ipc  # noqa: F401 (carrega pa.ipc)
+
+    particionaveis = [n for n, t in colecoes.items() if dict(t.ESQUEMA).get(particionar) == CATEGORIA]
+    if particionar and not particionaveis:
+        raise ErroOperacao(f"Nenhuma coleção tem a categoria '{particionar}' para particionar.")
+
+    os.makedirs(destino, exist_ok=True)
+    gravados = {}
+    for nome, tabela in colecoes.items():
+        arrow = tabela_arrow(tabela)
+        caminho = os.path.join(destino, nome + EXTENSOES[formato])
+        if nome in particionaveis:
+            _gravar_particionado(arrow, caminho, formato, particionar)
+        else:
+            _gravar_arquivo(pa, arrow, caminho, formato)
+        gravados[nome] = (caminho, arrow.num_rows)
+    return gravados
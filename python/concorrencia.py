@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+"""
+FarmTech - Controle de concorrência
+Descrição: Trava de leitura/escrita para proteger as tabelas em memória
+quando várias threads (ex.: o serviço HTTP) acessam os dados ao mesmo tempo,
+e trava de arquivo para vários processos que usam a mesma pasta de dados.
+"""
+
+import threading
+from contextlib import contextmanager
+
+import metricas
+
+# ===========================
+# TRAVA DE LEITURA/ESCRITA
+# ===========================
+
+class TravaLeituraEscrita:
+    """
+    Permite vários leitores simultâneos ou um único escritor.
+
+    Escritores têm preferência: quando um escritor está esperando, novos
+    leitores aguardam, evitando que consultas frequentes bloqueiem as gravações.
+    """
+
+    def __init__(self):
+        self._condicao = threading.Condition(threading.Lock())
+        self._leitores = 0
+        self._escrevendo = False
+        self._escritores_esperando = 0
+
+    @contextmanager
+    def leitura(self):
+        with self._condicao:
+            while self._escrevendo or self._escritores_esperando:
+                self._condicao.wait()
+            self._leitores += 1
+        try:
+            yield
+        finally:
+            with self._condicao:
+                self._leitores -= 1
+                if self._leitores == 0:
+                    self._condicao.notify_all()
+
+    @contextmanager
+    def escrita(self):
+        with self._condicao:
+            self._escritores_esperando += 1
+            while self._escrevendo or self._leitores:
+                self._condicao.wait()
+            self._escritores_esperando -= 1
+            self._escrevendo = True
+        try:
+            yield
+        finally:
+            with self._condicao:
+                self._escrevendo = False
+                self._condicao.notify_all()
+
+# ===========================
+# TRAVA DE ARQUIVO (ENTRE PROCESSOS)
+# ===========================
+
+try:
+    import fcntl
+
+    def _travar(arquivo):
+        fcntl.flock(arquivo.fileno(), fcntl.LOCK_EX)
+
+    def _destravar(arquivo):
+        fcntl.flock(arquivo.fileno(), fcntl.LOCK_UN)
+
+except ImportError:  # Windows
+    import msvcrt
+
+    def _travar(arquivo):
+        arquivo.seek(0)
+        msvcrt.locking(arquivo.fileno(), msvcrt.LK_LOCK, 1)
+
+    def _destravar(arquivo):
+        arquivo.seek(0)
+        msvcrt.locking(arquivo.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+class TravaArquivo:
+    """
+    Trava exclusiva e consultiva (advisory) sobre um arquivo, para que vários
+    processos apontando para a mesma pasta de dados não gravem ao mesmo tempo.
+    É reentrante dentro do mesmo processo: só a chamada mais externa trava o arquivo.
+    """
+
+    def __init__(self, caminho):
+        self.caminho = caminho
+        self.profundidade = 0
+        self._rlock = threading.RLock()
+        self._arquivo = None
+
+    @contextmanager
+    def exclusiva(self):
+        with self._rlock:
+            if self.profundidade == 0:
+                self._arquivo = open(self.caminho, "a+b")
+                with metricas.medir("espera_trava"):
+                    _travar(self._arquivo)
+            self.profundidade += 1
+            try:
+                yield
+            finally:
+                self.profundidade -= 1
+                if self.profundidade == 0:
+                    _destravar(self._arquivo)
+                    self._arquivo.close()
+                    self._arquivo = None
@@ -0,0 +1,221 @@
+# -*- coding: utf-8 -*-
+"""
+FarmTech - Consultas por faixa, prefixo e ordenação
+Descrição: Filtra culturas e insumos por valor ou faixa de valores (formato,
+área, faixas, área por faixa, dose, estoque) e pelo início do nome, ordena e
+limita o resultado (ex.: as 20 maiores culturas), usando os índices ordenados
+das tabelas (armazem.IndiceOrdenado): cada filtro é localizado em O(log n) e
+só os registros do intervalo mais estreito são percorridos.
+
+Exemplos:
+    consultar(culturas, {"formato": "circular", "area": (500000, None)})
+    consultar(culturas, ordenar="area", decrescente=True, limite=20)
+    consultar(insumos, prefixo="herb", ordenar="estoque")
+    consultar(culturas, **ler_consulta(culturas, {"area": "1000..5000", "ordenar": "-faixas"}))
+"""
+
+import heapq
+from itertools import islice
+
+from armazem import CATEGORIA, FIM_PREFIXO, normalizar_nome
+from operacoes import ErroOperacao
+
+# ===========================
+# PLANO DA CONSULTA
+# ===========================
+
+def _condicoes(registros, filtros, prefixo):
+    """(coluna, chave mínima, chave máxima) de cada filtro, nas chaves dos índices."""
+    condicoes = []
+    for coluna, valor in (filtros or {}).items():
+        if coluna not in registros.INDICES_ORDENADOS:
+            raise ErroOperacao(
+                f"Não é possível filtrar por '{coluna}'. Use: {', '.join(registros.INDICES_ORDENADOS)}."
+            )
+        minimo, maximo = valor if isinstance(valor, (tuple, list)) else (valor, valor)
+        condicoes.append((
+            coluna,
+            None if minimo is None else registros.chave_indice(coluna, minimo),
+            None if maximo is None else registros.chave_indice(coluna, maximo),
+        ))
+    if prefixo:
+        chave = normalizar_nome(prefixo)
+        condicoes.append(("nome", chave, chave + FIM_PREFIXO))
+    return condicoes
+
+
+def _ordem_dos_codigos(registros, coluna):
+    """
+    Para colunas de categoria, {código: posição do valor em ordem alfabética};
+    None para as demais. Os códigos seguem a ordem em que os valores
+    apareceram na tabela, então ordenar pelo código não é ordenar pelo valor.
+    """
+    if dict(registros.ESQUEMA).get(coluna) != CATEGORIA:
+        return None
+    valores = registros.valores_categoria(coluna)
+    return {codigo: posicao for posicao, codigo in enumerate(sorted(range(len(valores)), key=valores.__getitem__))}
+
+
+def chave_ordenacao(registros, coluna, id):
+    """
+    Chave de ordenação do registro que vale entre tabelas diferentes (ex.:
+    as de várias fazendas): a do índice (nome normalizado ou número) ou, nas
+    categorias, o próprio valor.
+    """
+    chave = registros.chave_de(coluna, id)
+    if dict(registros.ESQUEMA).get(coluna) == CATEGORIA:
+        return registros.valores_categoria(coluna)[chave]
+    return chave
+
+
+def _percorrer(indice, inicio, fim, decrescente, ordem):
+    """IDs das posições [inicio, fim) do índice; nas categorias, código a código, na ordem dos valores."""
+    if ordem is None:
+        return indice.ids(inicio, fim, decrescente)
+
+    def por_valor():
+        for codigo in sorted(ordem, key=ordem.get, reverse=decrescente):
+            primeiro, ultimo = indice.intervalo(codigo, codigo)
+            primeiro, ultimo = max(primeiro, inicio), min(ultimo, fim)
+            if primeiro < ultimo:
+                yield from indice.ids(primeiro, ultimo, decrescente)
+
+    return por_valor()
+
+
+def _atende(registros, id, condicoes):
+    for coluna, minimo, maximo in condicoes:
+        chave = registros.chave_de(coluna, id)
+        if (minimo is not None and chave < minimo) or (maximo is not None and chave > maximo):
+            return False
+    return True
+
+
+def consultar(registros, filtros=None, prefixo=None, ordenar=None, decrescente=False, limite=None):
+    """
+    Registros (culturas ou insumos) que atendem a todos os filtros.
+
+    filtros: {coluna: valor} para igualdade ou {coluna: (mínimo, máximo)} para
+    faixa, com None para um lado aberto (ex.: {"area": (500000, None)}).
+    prefixo: início do nome, sem diferenciar caixa.
+    ordenar: coluna da ordenação (padrão: ID); limite: quantos devolver (top-N).
+
+    Cada filtro vira um intervalo do índice da sua coluna; percorre-se o
+    intervalo mais estreito conferindo os demais filtros. Com ordenação e
+    limite, pode sair mais barato percorrer o índice da ordenação e parar no
+    N-ésimo registro aceito: escolhe-se o caminho com menos registros a visitar.
+    Categorias (ex.: formato) são ordenadas pelo valor, não pelo código interno.
+    """
+    if ordenar == "id":
+        ordenar = None
+    if ordenar is not None and ordenar not in registros.INDICES_ORDENADOS:
+        raise ErroOperacao(
+            f"Não é possível ordenar por '{ordenar}'. Use: id, {', '.join(registros.INDICES_ORDENADOS)}."
+        )
+    if limite is not None and limite <= 0:
+        return []
+    ordem = None if ordenar is None else _ordem_dos_codigos(registros, ordenar)
+
+    condicoes = _condicoes(registros, filtros, prefixo)
+    intervalos = []  # (tamanho, condição, índice, início, fim)
+    for condicao in condicoes:
+        indice = registros.indice(condicao[0])
+        inicio, fim = indice.intervalo(condicao[1], condicao[2])
+        if inicio == fim:
+            return []
+        intervalos.append((fim - inicio, condicao, indice, inicio, fim))
+    intervalos.sort(key=lambda intervalo: intervalo[0])
+    total = len(registros)
+
+    # Percorrer pela ordenação: no intervalo da própria coluna (se filtrada) ou no índice todo
+    if ordenar is not None:
+        da_ordem = [i for i in intervalos if i[1][0] == ordenar]
+        _, condicao, indice, inicio, fim = da_ordem[0] if da_ordem else (
+            total, None, registros.indice(ordenar), 0, total
+        )
+        outras = [i for i in intervalos if i[1] is not condicao]
+        # Registros a visitar até achar limite aceitos, supondo filtros independentes
+        visitas = fim - inicio
+        if limite is not None and outras:
+            visitas = min(visitas, limite * total // max(1, outras[0][0]))
+        elif limite is not None:
+            visitas = min(visitas, limite)
+        if not intervalos or visitas <= intervalos[0][0]:
+            resto = [c for _, c, _, _, _ in outras]
+            ids = (id for id in _percorrer(indice, inicio, fim, decrescente, ordem) if _atende(registros, id, resto))
+            return [registros.por_id(id) for id in islice(ids, limite)]
+
+    # Percorrer pelo filtro mais estreito e ordenar só os aceitos
+    if intervalos:
+        _, condicao, indice, inicio, fim = intervalos[0]
+        resto = [c for _, c, _, _, _ in intervalos[1:]]
+        ids = (id for id in indice.ids(inicio, fim) if _atende(registros, id, resto))
+    else:
+        ids = iter(registros.coluna("id"))
+
+    if ordenar is None:
+        chave = None
+        if not intervalos and not decrescente:  # os IDs são dados em ordem crescente
+            return [registros.por_id(id) for id in islice(ids, limite)]
+    elif ordem is not None:
+        def chave(id):
+            return ordem[registros.chave_de(ordenar, id)], id
+    else:
+        def chave(id):
+            return registros.chave_de(ordenar, id), id
+    if limite is None:
+        ids = sorted(ids, key=chave, reverse=decrescente)
+    elif decrescente:
+        ids = heapq.nlargest(limite, ids, key=chave)
+    else:
+        ids = heapq.nsmallest(limite, ids, key=chave)
+    return [registros.por_id(id) for id in ids]
+
+# ===========================
+# CONSULTA EM TEXTO (MENU, LINHA DE COMANDO, HTTP)
+# ===========================
+
+def _faixa(coluna, texto):
+    """'10..20', '10..', '..20' ou '15' (igual a 15) -> (mínimo, máximo)."""
+    texto = str(texto).strip()
+    minimo, separador, maximo = texto.partition("..")
+    if not separador:
+        maximo = minimo
+    try:
+        return tuple(float(v) if v.strip() else None for v in (minimo, maximo))
+    except ValueError:
+        raise ErroOperacao(
+            f"Faixa inválida para '{coluna}': {texto!r} (use mínimo..máximo, mínimo.., ..máximo ou um valor)."
+        ) from None
+
+
+def ler_consulta(registros, parametros):
+    """
+    Converte parâmetros em texto nos argumentos de consultar:
+    {"formato": "circular", "area": "500000..", "prefixo": "soja",
+     "ordenar": "-area", "limite": "20"}
+    Colunas numéricas aceitam faixas (ver _faixa); "-" antes da coluna de
+    ordenação pede ordem decrescente. Parâmetros vazios são ignorados.
+    """
+    consulta = {"filtros": {}}
+    for campo, valor in parametros.items():
+        if valor is None or str(valor).strip() == "":
+            continue
+        valor = str(valor).strip()
+        if campo == "prefixo":
+            consulta["prefixo"] = valor
+        elif campo == "ordenar":
+            consulta["decrescente"] = valor.startswith("-")
+            consulta["ordenar"] = valor.lstrip("-+")
+        elif campo == "limite":
+            if not valor.isdigit():
+                raise ErroOperacao(f"Limite inválido: {valor!r}.")
+            consulta["limite"] = int(valor)
+        elif campo in registros.INDICES_ORDENADOS and campo != "nome":
+            if dict(registros.ESQUEMA)[campo] == CATEGORIA:
+                consulta["filtros"][campo] = valor  # categorias (ex.: formato) só por igualdade
+            else:
+                consulta["filtros"][campo] = _faixa(campo, valor)
+        else:
+            raise ErroOperacao(f"Parâmetro de consulta desconhecido: {campo!r}.")
+    return consulta
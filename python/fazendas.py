@@ -0,0 +1,259 @@
+# -*- coding: utf-8 -*-
+"""
+FarmTech - Várias fazendas (shards)
+Descrição: Cada fazenda tem sua própria pasta de dados (diário e CSVs ou banco
+SQLite), com culturas, insumos e aplicações independentes: a fazenda
+"principal" é a própria pasta dados/ (a lida pelo R) e as demais ficam em
+dados/fazendas/<nome>/. Uma fazenda só é carregada no primeiro acesso, e
+várias podem ser carregadas em paralelo por um pool de threads.
+
+Consultas, cálculos de aplicação e estatísticas de várias fazendas são
+distribuídos entre elas (fan-out) e os resultados, combinados: as N maiores
+culturas da cooperativa vêm das N maiores de cada fazenda.
+
+Exemplos:
+    fazendas = Fazendas("../dados")
+    fazendas.fazenda("sitio-norte").culturas
+    fazendas.carregar()                                   # todas, em paralelo
+    consultar(fazendas, "culturas", {"formato": "circular", "ordenar": "-area", "limite": "20"})
+"""
+
+import os
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from heapq import merge
+from itertools import islice
+
+import consulta
+import operacoes
+from armazem import TabelaAplicacoes, TabelaCulturas, TabelaInsumos, juntar_estatisticas
+from operacoes import ErroOperacao, RegistroNaoEncontrado
+from persistencia import abrir_armazenamento
+
+# ===========================
+# CONFIGURAÇÃO
+# ===========================
+
+# A fazenda principal é a própria pasta de dados; as demais ficam em PASTA_FAZENDAS
+PRINCIPAL = "principal"
+PASTA_FAZENDAS = "fazendas"
+
+# Fazenda usada pelo menu, pela linha de comando e pelo serviço (--fazenda também a escolhe)
+FAZENDA = os.environ.get("FARMTECH_FAZENDA", PRINCIPAL)
+
+# Threads que carregam e consultam fazendas em paralelo. A carga é dominada por
+# leitura de disco (fotografias .bin abertas com mmap), e os dados precisam
+# ficar neste processo para serem alterados: por isso threads, não processos.
+TRABALHADORES = int(os.environ.get("FARMTECH_TRABALHADORES_FAZENDAS", str(min(8, os.cpu_count() or 1))))
+
+# Nomes de fazenda viram nomes de pasta
+_NOME_VALIDO = re.compile(r"[a-z0-9][a-z0-9_-]{0,63}")
+
+# ===========================
+# FAZENDA (SHARD)
+# ===========================
+
+def validar_nome(nome):
+    """Nome da fazenda em minúsculas; só letras, números, - e _ (vira nome de pasta)."""
+    nome = str(nome or "").strip().lower()
+    if not _NOME_VALIDO.fullmatch(nome):
+        raise ErroOperacao(
+            f"Nome de fazenda inválido: {nome!r} (use letras sem acento, números, - e _; ex.: sitio-norte)."
+        )
+    return nome
+
+
+class Fazenda:
+    """
+    Uma fazenda: pasta de dados, tabelas e armazenamento próprios. As tabelas
+    começam vazias; carregar() as preenche uma única vez (com segurança entre
+    threads) e as chamadas seguintes não fazem nada.
+    """
+
+    def __init__(self, nome, dados_dir):
+        self.nome = nome
+        self.dados_dir = dados_dir
+        self.culturas = TabelaCulturas()
+        self.insumos = TabelaInsumos()
+        self.aplicacoes = TabelaAplicacoes()
+        self.diario = abrir_armazenamento(
+            dados_dir, {"culturas": self.culturas, "insumos": self.insumos, "aplicacoes": self.aplicacoes}
+        )
+        self._trava = threading.Lock()
+        self.carregada = False
+
+    def carregar(self):
+        """Carrega a fazenda se ainda não foi carregada e a devolve."""
+        if not self.carregada:
+            with self._trava:
+                if not self.carregada:
+                    os.makedirs(self.dados_dir, exist_ok=True)
+                    self.diario.carregar()
+                    self.carregada = True
+        return self
+
+
+class Fazendas:
+    """
+    Registro das fazendas de uma pasta de dados. fazenda(nome) devolve a
+    fazenda já carregada (no primeiro acesso); carregar() e para_cada()
+    distribuem o trabalho entre as fazendas em um pool de threads.
+    """
+
+    def __init__(self, raiz, trabalhadores=None):
+        self.raiz = raiz
+        self.trabalhadores = trabalhadores or TRABALHADORES
+        self._fazendas = {}
+        self._trava = threading.Lock()
+
+    def pasta(self, nome):
+        nome = validar_nome(nome)
+        return self.raiz if nome == PRINCIPAL else os.path.join(self.raiz, PASTA_FAZENDAS, nome)
+
+    def nomes(self):
+        """Nomes das fazendas existentes: a principal e as pastas de dados/fazendas, em ordem."""
+        pasta = os.path.join(self.raiz, PASTA_FAZENDAS)
+        try:
+            outras = sorted(
+                n for n in os.listdir(pasta) if _NOME_VALIDO.fullmatch(n) and os.path.isdir(os.path.join(pasta, n))
+            )
+        except FileNotFoundError:
+            outras = []
+        return [PRINCIPAL] + [n for n in outras if n != PRINCIPAL]
+
+    def existe(self, nome):
+        nome = validar_nome(nome)
+        return nome == PRINCIPAL or os.path.isdir(self.pasta(nome))
+
+    def criar(self, nome):
+        """Cria a pasta de uma nova fazenda e a devolve (vazia)."""
+        nome = validar_nome(nome)
+        if self.existe(nome):
+            raise ErroOperacao(f"A fazenda '{nome}' já existe.")
+        os.makedirs(self.pasta(nome))
+        return self.fazenda(nome)
+
+    def fazenda(self, nome, carregar=True):
+        """A fazenda nome, carregada no primeiro acesso (carregar=False só a registra)."""
+        nome = validar_nome(nome)
+        with self._trava:
+            fazenda = self._fazendas.get(nome)
+            if fazenda is None:
+                if not self.existe(nome):
+                    raise RegistroNaoEncontrado(
+                        f"Fazenda '{nome}' não encontrada (crie com: gestao_agricola.py fazendas criar {nome})."
+                    )
+                fazenda = self._fazendas[nome] = Fazenda(nome, self.pasta(nome))
+        return fazenda.carregar() if carregar else fazenda
+
+    def carregadas(self):
+        """Fazendas já carregadas neste processo."""
+        with self._trava:
+            return [f for f in self._fazendas.values() if f.carregada]
+
+    def para_cada(self, funcao, nomes=None):
+        """
+        Executa funcao(fazenda) em cada fazenda (todas, se nomes for None) no
+        pool de threads, carregando as que ainda não foram carregadas.
+        Devolve [(nome, resultado), ...] na ordem dos nomes.
+        """
+        nomes = self.nomes() if nomes is None else [validar_nome(n) for n in nomes]
+
+        def executar(nome):
+            return funcao(self.fazenda(nome))
+
+        if self.trabalhadores <= 1 or len(nomes) <= 1:
+            return [(nome, executar(nome)) for nome in nomes]
+        with ThreadPoolExecutor(max_workers=self.trabalhadores, thread_name_prefix="farmtech-fazendas") as pool:
+            return list(zip(nomes, pool.map(executar, nomes)))
+
+    def carregar(self, nomes=None):
+        """Carrega as fazendas (todas, se nomes for None) em paralelo e as devolve."""
+        return [fazenda for _, fazenda in self.para_cada(lambda fazenda: fazenda, nomes)]
+
+    def compactar(self):
+        """Compacta o diário (e regrava os CSVs alterados) de cada fazenda carregada."""
+        for fazenda in self.carregadas():
+            fazenda.diario.compactar()
+
+    def fechar(self):
+        for fazenda in self.carregadas():
+            fazenda.diario.fechar()
+
+# ===========================
+# CONSULTAS ENTRE FAZENDAS (FAN-OUT)
+# ===========================
+
+def consultar(fazendas, colecao, parametros, nomes=None):
+    """
+    consulta.consultar em cada fazenda, com os parâmetros em texto de
+    consulta.ler_consulta. Devolve [(fazenda, registro), ...]: com "ordenar",
+    na ordem da coluna entre todas as fazendas; senão, por fazenda e ID.
+    Com "limite", cada fazenda devolve só os seus N primeiros, e a junção
+    das listas já ordenadas fica com os N primeiros de todas.
+    """
+    if colecao not in ("culturas", "insumos"):
+        raise ErroOperacao(f"Coleção inválida para consulta: {colecao!r} (use culturas ou insumos).")
+
+    ordenar = str(parametros.get("ordenar") or "").strip().lstrip("-+")
+    decrescente = str(parametros.get("ordenar") or "").strip().startswith("-")
+    limite = parametros.get("limite")
+    limite = int(limite) if str(limite or "").strip().isdigit() else None
+
+    def consultar_fazenda(fazenda):
+        registros = getattr(fazenda, colecao)
+        resultado = consulta.consultar(registros, **consulta.ler_consulta(registros, parametros))
+        if ordenar in ("", "id"):
+            return [(fazenda.nome, dict(registro)) for registro in resultado]
+        # Chave comparável entre fazendas (nas categorias, o valor, e não o código de cada tabela)
+        return [
+            (consulta.chave_ordenacao(registros, ordenar, registro.id), fazenda.nome, dict(registro))
+            for registro in resultado
+        ]
+
+    parciais = [parcial for _, parcial in fazendas.para_cada(consultar_fazenda, nomes)]
+    if ordenar in ("", "id"):
+        return list(islice((item for parcial in parciais for item in parcial), limite))
+    juntos = merge(*parciais, key=lambda item: item[0], reverse=decrescente)
+    return [(nome, registro) for _, nome, registro in islice(juntos, limite)]
+
+
+def aplicar(fazendas, chave_cultura=None, chave_insumo=None, nomes=None):
+    """
+    operacoes.aplicar em cada fazenda. Fazendas que não têm a cultura ou o
+    insumo informado são puladas. Devolve [(fazenda, nome da cultura,
+    nome do insumo, total, por_faixa), ...].
+    """
+    def aplicar_fazenda(fazenda):
+        try:
+            matriz = operacoes.aplicar(fazenda.culturas, fazenda.insumos, chave_cultura, chave_insumo)
+        except RegistroNaoEncontrado:
+            return []
+        nomes_culturas = dict(zip(fazenda.culturas.coluna("id"), fazenda.culturas.coluna("nome")))
+        nomes_insumos = dict(zip(fazenda.insumos.coluna("id"), fazenda.insumos.coluna("nome")))
+        return [
+            (fazenda.nome, nomes_culturas[c], nomes_insumos[i], total, por_faixa)
+            for c, i, total, por_faixa in matriz.linhas()
+        ]
+
+    return [linha for _, linhas in fazendas.para_cada(aplicar_fazenda, nomes) for linha in linhas]
+
+
+def estatisticas(fazendas, nomes=None):
+    """
+    operacoes.estatisticas de cada fazenda, juntadas em uma só (ver
+    armazem.juntar_estatisticas): {"culturas": {"area": {...}, ...}, "insumos": {...}}.
+    """
+    parciais = [
+        resumo for _, resumo in fazendas.para_cada(
+            lambda fazenda: operacoes.estatisticas(fazenda.culturas, fazenda.insumos), nomes
+        )
+    ]
+    return {
+        colecao: {
+            coluna: juntar_estatisticas([parcial[colecao][coluna] for parcial in parciais])
+            for coluna in colunas
+        }
+        for colecao, colunas in parciais[0].items()
+    }
@@ -0,0 +1,325 @@
+# -*- coding: utf-8 -*-
+"""
+FarmTech - Geometria dos terrenos
+Descrição: Cálculo da área dos formatos de terreno suportados: retângulo,
+círculo e polígonos quaisquer (vértices em metros ou em longitude/latitude),
+inclusive para lotes com milhares de polígonos de uma vez, e a divisão dos
+terrenos em faixas paralelas com a área exata de cada faixa.
+"""
+
+import json
+import math
+from itertools import chain
+
+# Raio médio da Terra (m), usado na projeção de longitude/latitude
+RAIO_TERRA = 6371008.8
+
+# ===========================
+# ÁREAS
+# ===========================
+
+def area_retangulo(largura, comprimento):
+    """Área (m²) de um terreno retangular."""
+    return largura * comprimento
+
+
+def area_circulo(raio):
+    """Área (m²) de um terreno circular."""
+    return math.pi * (raio ** 2)
+
+
+def area_poligono(vertices):
+    """Área (m²) de um polígono simples dado pela lista de vértices (x, y) em metros (fórmula do laço)."""
+    return areas_aneis([vertices])[0]
+
+# ===========================
+# POLÍGONOS EM LOTE
+# ===========================
+
+def areas_aneis(aneis):
+    """
+    Áreas (m²) de vários anéis de uma vez, pela fórmula do laço (shoelace).
+
+    Sem NumPy, um laço enxuto por anel (desempacotando as tuplas, sem índices)
+    é o mais rápido no CPython: mais que montar vetores achatados com map.
+    """
+    areas = []
+    for anel in aneis:
+        soma = 0.0
+        x0, y0 = anel[-1]
+        for x1, y1 in anel:
+            soma += x0 * y1 - x1 * y0
+            x0, y0 = x1, y1
+        areas.append(abs(soma) / 2)
+    return areas
+
+
+def areas_geometrias(geometrias):
+    """
+    Áreas (m²) de uma lista de geometrias em metros (ver ler_geometria), em lote.
+    Em cada polígono, o primeiro anel é o contorno e os demais são furos.
+    """
+    aneis, sinais, donos = [], [], []
+    for indice, poligonos in enumerate(geometrias):
+        for poligono in poligonos:
+            for posicao, anel in enumerate(poligono):
+                aneis.append(anel)
+                sinais.append(1 if posicao == 0 else -1)
+                donos.append(indice)
+
+    areas = [0.0] * len(geometrias)
+    for area, sinal, dono in zip(areas_aneis(aneis), sinais, donos):
+        areas[dono] += sinal * area
+    return areas
+
+# ===========================
+# LONGITUDE/LATITUDE
+# ===========================
+
+def projetar_lonlat(pontos, centro=None):
+    """
+    Projeta pontos (longitude, latitude) em graus para metros com a projeção
+    azimutal equivalente de Lambert centrada em centro (padrão: média dos pontos).
+    Por preservar áreas, a fórmula do laço sobre os pontos projetados dá a área
+    geodésica (esférica) do terreno.
+    """
+    pontos = list(pontos)
+    if centro is None:
+        centro = (
+            math.fsum(p[0] for p in pontos) / len(pontos),
+            math.fsum(p[1] for p in pontos) / len(pontos),
+        )
+    lon0, lat0 = math.radians(centro[0]), math.radians(centro[1])
+    sen_lat0, cos_lat0 = math.sin(lat0), math.cos(lat0)
+
+    projetados = []
+    for lon, lat in pontos:
+        lon, lat = math.radians(lon) - lon0, math.radians(lat)
+        sen_lat, cos_lat, cos_lon = math.sin(lat), math.cos(lat), math.cos(lon)
+        k = math.sqrt(2 / (1 + sen_lat0 * sen_lat + cos_lat0 * cos_lat * cos_lon))
+        projetados.append((
+            RAIO_TERRA * k * cos_lat * math.sin(lon),
+            RAIO_TERRA * k * (cos_lat0 * sen_lat - sen_lat0 * cos_lat * cos_lon),
+        ))
+    return projetados
+
+# ===========================
+# GEOMETRIA ARMAZENADA
+# ===========================
+
+def _anel(pontos):
+    """Lista de vértices (x, y) sem o vértice de fechamento repetido."""
+    anel = [(float(x), float(y)) for x, y, *_ in pontos]
+    if len(anel) > 1 and anel[0] == anel[-1]:
+        anel.pop()
+    if len(anel) < 3:
+        raise ValueError("Um polígono precisa de pelo menos 3 vértices.")
+    return anel
+
+
+def geometria_de_vertices(vertices):
+    """Geometria (lista de polígonos) de um único contorno com vértices em metros."""
+    return [[_anel(vertices)]]
+
+
+def geometria_retangulo(largura, comprimento):
+    """Contorno de um terreno retangular: largura no eixo x (leste) e comprimento no eixo y (norte)."""
+    return [[[(0.0, 0.0), (largura, 0.0), (largura, comprimento), (0.0, comprimento)]]]
+
+
+def geometria_de_lonlat(vertices):
+    """Geometria em metros de um único contorno com vértices (longitude, latitude)."""
+    return [[projetar_lonlat(_anel(vertices))]]
+
+
+def geometria_de_geojson(objeto):
+    """
+    Converte uma geometria GeoJSON (Polygon ou MultiPolygon, em longitude/latitude)
+    para polígonos em metros, todos projetados a partir do mesmo centro.
+    """
+    tipo = objeto.get("type")
+    if tipo == "Polygon":
+        poligonos = [objeto["coordinates"]]
+    elif tipo == "MultiPolygon":
+        poligonos = objeto["coordinates"]
+    else:
+        raise ValueError(f"Geometria GeoJSON não suportada: {tipo!r} (use Polygon ou MultiPolygon).")
+
+    poligonos = [[_anel(anel) for anel in poligono] for poligono in poligonos]
+    contornos = [p[0] for p in poligonos]
+    quantidade = sum(map(len, contornos))
+    centro = (
+        math.fsum(x for x, _ in chain.from_iterable(contornos)) / quantidade,
+        math.fsum(y for _, y in chain.from_iterable(contornos)) / quantidade,
+    )
+    return [[projetar_lonlat(anel, centro) for anel in poligono] for poligono in poligonos]
+
+
+def gravar_geometria(poligonos):
+    """Texto compacto (JSON, coordenadas em milímetros) guardado na coluna "geometria"."""
+    arredondados = [[[[round(x, 3), round(y, 3)] for x, y in anel] for anel in poligono] for poligono in poligonos]
+    return json.dumps(arredondados, separators=(",", ":"))
+
+
+def ler_geometria(texto):
+    """Polígonos em metros guardados na coluna "geometria" (lista vazia se não houver)."""
+    if not texto:
+        return []
+    return [[[tuple(p) for p in anel] for anel in poligono] for poligono in json.loads(texto)]
+
+# ===========================
+# DIVISÃO EM FAIXAS
+# ===========================
+
+def _limites(inicio, fim, quantidade=None, largura=None):
+    """Posições das divisas entre faixas, por quantidade de faixas ou largura (a última pode ser menor)."""
+    if largura is not None:
+        if largura <= 0:
+            raise ValueError("A largura da faixa deve ser maior que zero.")
+        quantidade = max(1, math.ceil((fim - inicio) / largura - 1e-9))
+        return [inicio + k * largura for k in range(quantidade)] + [fim]
+    if quantidade is None or quantidade < 1:
+        raise ValueError("Informe a quantidade de faixas (pelo menos 1) ou a largura da faixa.")
+    return [inicio + (fim - inicio) * k / quantidade for k in range(quantidade + 1)]
+
+
+def faixas_circulo(raio, quantidade=None, largura=None):
+    """
+    Áreas (m²) das faixas paralelas de um terreno circular (ex.: pivô central),
+    exatas, pela área dos segmentos circulares entre as divisas. A direção das
+    faixas não muda o resultado no círculo.
+    """
+    limites = _limites(-raio, raio, quantidade, largura)
+    if raio <= 0:
+        return [0.0] * (len(limites) - 1)
+    quadrado = raio * raio
+
+    def acumulada(c):
+        # Área do círculo à esquerda da reta x = c
+        c = max(-raio, min(raio, c))
+        return quadrado * math.acos(-c / raio) + c * math.sqrt(quadrado - c * c)
+
+    valores = list(map(acumulada, limites))
+    return [depois - antes for antes, depois in zip(valores, valores[1:])]
+
+
+def faixas_poligono(poligonos, quantidade=None, largura=None, rumo=0.0):
+    """
+    Áreas (m²) das faixas paralelas de um terreno poligonal (com furos).
+
+    rumo é a direção das faixas em graus a partir do norte (eixo y), no sentido
+    horário; as faixas são numeradas da esquerda para a direita de quem segue o rumo.
+
+    As coordenadas são giradas para que as divisas fiquem verticais; a área à
+    esquerda de cada divisa é a soma dos trapézios sob as arestas recortadas
+    nela. As divisas são percorridas em ordem, olhando só as arestas que
+    cruzam a divisa atual (as já ultrapassadas entram com o valor inteiro).
+    """
+    angulo = math.radians(rumo)
+    cosseno, seno = math.cos(angulo), math.sin(angulo)
+
+    arestas = []  # (início, fim, x0, y0, x1, y1, peso) no sistema girado
+    for poligono in poligonos:
+        for posicao, anel in enumerate(poligono):
+            pontos = [(x * cosseno - y * seno, x * seno + y * cosseno) for x, y in anel]
+            segmentos = list(zip(pontos, pontos[1:] + pontos[:1]))
+            dobro = sum((x1 - x0) * (y0 + y1) for (x0, y0), (x1, y1) in segmentos)
+            if dobro == 0:
+                continue
+            # Contorno soma e furo subtrai, qualquer que seja o sentido dos vértices
+            peso = (0.5 if dobro > 0 else -0.5) * (1 if posicao == 0 else -1)
+            arestas.extend(
+                (min(x0, x1), max(x0, x1), x0, y0, x1, y1, peso)
+                for (x0, y0), (x1, y1) in segmentos if x0 != x1
+            )
+    if not arestas:
+        return [0.0] * (len(_limites(0.0, 0.0, quantidade, largura or 1.0)) - 1)
+
+    arestas.sort()
+    limites = _limites(arestas[0][0], max(a[1] for a in arestas), quantidade, largura)
+
+    acumuladas = []
+    completas, ativas, proxima = 0.0, [], 0
+    for c in limites:
+        while proxima < len(arestas) and arestas[proxima][0] < c:
+            ativas.append(arestas[proxima])
+            proxima += 1
+        parcial, restantes = 0.0, []
+        for aresta in ativas:
+            _, fim, x0, y0, x1, y1, peso = aresta
+            if fim <= c:
+                completas += peso * (x1 - x0) * (y0 + y1)
+                continue
+            yc = y0 + (y1 - y0) * (c - x0) / (x1 - x0)
+            if x0 < x1:
+                parcial += peso * (c - x0) * (y0 + yc)
+            else:
+                parcial += peso * (x1 - c) * (yc + y1)
+            restantes.append(aresta)
+        ativas = restantes
+        acumuladas.append(completas + parcial)
+
+    return [depois - antes for antes, depois in zip(acumuladas, acumuladas[1:])]
+
+# ===========================
+# EIXOS DAS FAIXAS (PERCURSO)
+# ===========================
+
+def _desgirar(pontos, cosseno, seno):
+    # Inverso do giro usado em faixas_poligono: volta ao sistema do terreno
+    return [(px * cosseno + py * seno, -px * seno + py * cosseno) for px, py in pontos]
+
+
+def eixos_faixas_circulo(raio, quantidade=None, largura=None, rumo=0.0):
+    """
+    Eixo (linha central) de cada faixa de um terreno circular com centro em
+    (0, 0): lista de ((x0, y0), (x1, y1)) em metros, na ordem de faixas_circulo.
+    """
+    angulo = math.radians(rumo)
+    cosseno, seno = math.cos(angulo), math.sin(angulo)
+    limites = _limites(-raio, raio, quantidade, largura)
+    eixos = []
+    for antes, depois in zip(limites, limites[1:]):
+        c = (antes + depois) / 2
+        meia_corda = math.sqrt(max(0.0, raio * raio - c * c))
+        eixos.append(tuple(_desgirar([(c, -meia_corda), (c, meia_corda)], cosseno, seno)))
+    return eixos
+
+
+def eixos_faixas_poligono(poligonos, quantidade=None, largura=None, rumo=0.0):
+    """
+    Eixo de cada faixa de um terreno poligonal, na ordem de faixas_poligono:
+    o trecho da linha central da faixa entre o primeiro e o último ponto em
+    que ela cruza o contorno (em terrenos côncavos, atravessa os recortes).
+    Faixas cujo eixo não cruza o terreno ficam com None.
+    """
+    angulo = math.radians(rumo)
+    cosseno, seno = math.cos(angulo), math.sin(angulo)
+
+    arestas = []  # (início, fim, x0, y0, x1, y1) no sistema girado, como em faixas_poligono
+    for poligono in poligonos:
+        for anel in poligono:
+            pontos = [(x * cosseno - y * seno, x * seno + y * cosseno) for x, y in anel]
+            arestas.extend(
+                (min(x0, x1), max(x0, x1), x0, y0, x1, y1)
+                for (x0, y0), (x1, y1) in zip(pontos, pontos[1:] + pontos[:1]) if x0 != x1
+            )
+    if not arestas:
+        return [None] * (len(_limites(0.0, 0.0, quantidade, largura or 1.0)) - 1)
+
+    arestas.sort()
+    limites = _limites(arestas[0][0], max(a[1] for a in arestas), quantidade, largura)
+
+    eixos, ativas, proxima = [], [], 0
+    for antes, depois in zip(limites, limites[1:]):
+        c = (antes + depois) / 2
+        while proxima < len(arestas) and arestas[proxima][0] <= c:
+            ativas.append(arestas[proxima])
+            proxima += 1
+        ativas = [a for a in ativas if a[1] > c]
+        cortes = [y0 + (y1 - y0) * (c - x0) / (x1 - x0) for _, _, x0, y0, x1, y1 in ativas]
+        if len(cortes) < 2:
+            eixos.append(None)
+            continue
+        eixos.append(tuple(_desgirar([(c, min(cortes)), (c, max(cortes))], cosseno, seno)))
+    return eixos
@@ -5,15 +5,37 @@ Autor: Amanda Damasceno Martins
 Descrição: Sistema em Python para gerenciar culturas e insumos agrícolas.
 """
 
-import csv
+import argparse
+import atexit
 import os
+import sys
+from datetime import date
+from itertools import islice
+
+import clima
+import consulta
+import linha_comando
+import metricas
+import operacoes
+from aplicacao import cache
+from armazem import FORMATOS, NomeDuplicadoError, normalizar_nome
+from fazendas import FAZENDA, PRINCIPAL, Fazendas, validar_nome
+from geometria import (
+    area_circulo,
+    area_retangulo,
+    areas_geometrias,
+    geometria_de_vertices,
+    geometria_retangulo,
+    gravar_geometria,
+)
+from persistencia import ConflitoError
 
 # ===========================
 # VARIÁVEIS GLOBAIS
 # ===========================
 
-culturas = []
-insumos = []
+# Registros por página nas listagens do menu
+TAMANHO_PAGINA = int(os.environ.get("FARMTECH_TAMANHO_PAGINA", "20"))
 
 # ===========================
 # FUNÇÕES PARA PERSISTÊNCIA
@@ -22,60 +44,43 @@ insumos = []
 # Descobre o caminho absoluto da pasta onde está o arquivo gestao_agricola.py
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 
-# Cria (se não existir) a pasta "dados" no nível acima
-DADOS_DIR = os.path.join(BASE_DIR, "..", "dados")
-os.makedirs(DADOS_DIR, exist_ok=True)
+# Cria (se não existir) a pasta "dados" no nível acima: nela fica a fazenda
+# principal, e as demais em dados/fazendas/<nome> (ver fazendas.py)
+RAIZ_DADOS = os.path.join(BASE_DIR, "..", "dados")
+os.makedirs(RAIZ_DADOS, exist_ok=True)
+fazendas = Fazendas(RAIZ_DADOS)
+# Ao sair por qualquer caminho, grava o que estiver pendente em cada fazenda
+# carregada (ex.: fsync adiado por FARMTECH_JANELA_GRAVACAO)
+atexit.register(fazendas.fechar)
+
+def usar_fazenda(nome):
+    """
+    Passa a usar a fazenda nome: culturas, insumos, aplicacoes e diario
+    passam a ser os dela. Cada fazenda tem seu armazenamento, configurado em
+    FARMTECH_ARMAZENAMENTO: diário de alterações (diario.jsonl + CSVs, o
+    padrão) ou banco SQLite (farmtech.db).
+    """
+    global fazenda, culturas, insumos, aplicacoes, diario, DADOS_DIR
+    fazenda = fazendas.fazenda(nome, carregar=False)
+    # Coleções armazenadas por colunas (ver armazem.py), com acesso cultura["area"],
+    # e o histórico de aplicações, com totais por cultura, insumo e safra
+    culturas, insumos, aplicacoes = fazenda.culturas, fazenda.insumos, fazenda.aplicacoes
+    diario = fazenda.diario
+    DADOS_DIR = fazenda.dados_dir
+
+usar_fazenda(PRINCIPAL)
 
 def salvar_dados():
-    """Salva culturas e insumos em arquivos CSV"""
-
-    # Salvar culturas
-    caminho_culturas = os.path.join(DADOS_DIR, "culturas.csv")
-    with open(caminho_culturas, "w", newline="", encoding="utf-8") as f:
-        writer = csv.writer(f)
-        writer.writerow(["nome", "formato", "area", "faixas", "area_faixa"])  # cabeçalho
-        for cultura in culturas:
-            writer.writerow([
-                cultura["nome"], 
-                cultura["formato"], 
-                cultura["area"], 
-                cultura["faixas"],
-                cultura["area_faixa"]
-            ])
-
-    # Salvar insumos
-    caminho_insumos = os.path.join(DADOS_DIR, "insumos.csv")
-    with open(caminho_insumos, "w", newline="", encoding="utf-8") as f:
-        writer = csv.writer(f)
-        writer.writerow(["nome", "dose_m2"])  # cabeçalho
-        for insumo in insumos:
-            writer.writerow([insumo["nome"], insumo["dose_m2"]])
+    """Compacta o diário (ou o banco) de cada fazenda usada, regravando nos CSVs só as coleções alteradas"""
+    fazendas.compactar()
 
 def carregar_dados():
-    """Carrega culturas e insumos de arquivos CSV, se existirem"""
-    caminho_culturas = os.path.join(DADOS_DIR, "culturas.csv")
-    caminho_insumos = os.path.join(DADOS_DIR, "insumos.csv")
-
-    if os.path.exists(caminho_culturas):
-        with open(caminho_culturas, "r", encoding="utf-8") as f:
-            reader = csv.DictReader(f)
-            for row in reader:
-                culturas.append({
-                    "nome": row["nome"],
-                    "formato": row["formato"],
-                    "area": float(row["area"]),
-                    "faixas": int(row["faixas"]),
-                    "area_faixa": float(row["area_faixa"])
-                })
-
-    if os.path.exists(caminho_insumos):
-        with open(caminho_insumos, "r", encoding="utf-8") as f:
-            reader = csv.DictReader(f)
-            for row in reader:
-                insumos.append({
-                    "nome": row["nome"],
-                    "dose_m2": float(row["dose_m2"])
-                })
+    """Carrega culturas e insumos dos arquivos CSV e reaplica o diário (ou lê o banco SQLite)"""
+    fazenda.carregar()
+
+def atualizar_dados():
+    """Incorpora o que outros processos (outros operadores, cron) gravaram na pasta de dados"""
+    diario.atualizar()
 
 # ===========================
 # FUNÇÕES DE UTILIDADE
@@ -104,6 +109,197 @@ def voltar(resposta: str):
         return True
     return False
 
+def selecionar(registros, descricao, colunas):
+    """
+    Pede o nome ou o ID de um registro e o localiza pelos índices da tabela.
+    Digitar ? lista as opções, página a página. Retorna None se o usuário voltar.
+    """
+    while True:
+        print("")
+        resposta = input(f"\nDigite o nome ou o ID {descricao} (? para listar): ")
+        if voltar(resposta):
+            return None
+
+        if resposta.strip() == "?":
+            paginar(registros, colunas)
+            continue
+
+        registro = registros.localizar(resposta)
+        if registro is not None:
+            return registro
+        print("")
+        print("⚠️   Registro não encontrado! Tente novamente.\n")
+
+def selecionar_cultura(acao):
+    return selecionar(culturas, f"da cultura {acao}".strip(), COLUNAS_CULTURAS)
+
+def selecionar_insumo(acao):
+    return selecionar(insumos, f"do insumo {acao}".strip(), COLUNAS_INSUMOS)
+
+def ler_poligono():
+    """
+    Pede os vértices de um terreno irregular (x,y em metros, separados por ;).
+    Retorna (area, geometria) ou None se o usuário voltar.
+    """
+    while True:
+        print("")
+        resposta = input("Digite os vértices do terreno em metros (ex.: 0,0; 120,0; 100,80; 0,60): ")
+        if voltar(resposta):
+            return None
+        try:
+            vertices = [
+                tuple(float(v) for v in ponto.split(","))
+                for ponto in resposta.split(";") if ponto.strip()
+            ]
+            poligonos = geometria_de_vertices(vertices)
+            area = areas_geometrias([poligonos])[0]
+            if area > 0:
+                return area, gravar_geometria(poligonos)
+        except ValueError:
+            pass
+        print("")
+        print("⚠️   Vértices inválidos! Informe pelo menos 3 pontos no formato x,y separados por ;\n")
+
+def gravar_alteracoes(registro, colecao, lida, novos):
+    """
+    Aplica e registra as alterações feitas no menu, desde que o registro não
+    tenha sido alterado por outro processo depois de lido. Retorna True se gravou.
+    """
+    try:
+        with diario.transacao(esperado=[(colecao, registro.id, lida)]):
+            registro.update(novos)
+            diario.registrar("atualizar", colecao, registro.id, dados=registro)
+        return True
+    except ConflitoError as erro:
+        print("")
+        print(f"⚠️   {erro}\n")
+    except NomeDuplicadoError:
+        print("")
+        print("⚠️   Já existe um registro com esse nome!\n")
+    pausar()
+    return False
+
+# ===========================
+# LISTAGENS PAGINADAS
+# ===========================
+
+def _ids_filtrados(registros, filtro, ids=None):
+    """IDs dos registros (ou de ids) cujo nome contém o filtro, percorridos sob demanda (sem montar listas)."""
+    if ids is not None:
+        if not filtro:
+            return iter(ids)
+        chave = normalizar_nome(filtro)
+        return (id for id in ids if chave in registros.chave_de("nome", id))
+    ids = registros.coluna("id")
+    if not filtro:
+        return iter(ids)
+    chave = normalizar_nome(filtro)
+    return (id for id, nome in zip(ids, registros.coluna("nome")) if chave in normalizar_nome(nome))
+
+def _celula(valor, largura, alinhamento):
+    texto = str(valor)
+    if len(texto) > largura:
+        texto = texto[:largura - 1] + "…"
+    return f"{texto:{alinhamento}{largura}}"
+
+def _montar_pagina(pagina, colunas, detalhes):
+    """Texto de uma página: tabela compacta (uma linha por registro) ou fichas detalhadas."""
+    if detalhes is not None:
+        return "".join(f"\n{detalhes(registro)}\n" for registro in pagina)
+    linhas = [" ".join(_celula(titulo, largura, alinhamento) for titulo, largura, alinhamento, _ in colunas)]
+    linhas.append(" ".join("-" * largura for _, largura, _, _ in colunas))
+    for registro in pagina:
+        linhas.append(" ".join(
+            _celula(formatar(registro), largura, alinhamento) for _, largura, alinhamento, formatar in colunas
+        ))
+    return "\n".join(linhas) + "\n"
+
+def paginar(registros, colunas, detalhes=None, ids=None):
+    """
+    Mostra os registros em páginas de TAMANHO_PAGINA linhas. Cada página é
+    montada em um único texto e escrita de uma vez, e só os registros da
+    página são lidos da tabela, qualquer que seja o tamanho da coleção.
+
+    colunas: (título, largura, alinhamento "<" ou ">", função que formata o
+    registro) da tabela compacta. detalhes: função com o texto de um registro
+    no modo detalhado (alternado com d), se houver. ids: mostra só esses
+    registros, nessa ordem (ex.: o resultado de uma consulta).
+    """
+    pagina, filtro, detalhado = 0, "", False
+    total = len(registros) if ids is None else len(ids)
+    while True:
+        paginas = max(1, -(-total // TAMANHO_PAGINA))
+        pagina = min(pagina, paginas - 1)
+        inicio = pagina * TAMANHO_PAGINA
+        da_pagina = islice(_ids_filtrados(registros, filtro, ids), inicio, inicio + TAMANHO_PAGINA)
+        texto = _montar_pagina(
+            [registros.por_id(id) for id in da_pagina], colunas, detalhes if detalhado else None
+        )
+        rodape = f"Página {pagina + 1} de {paginas} ({total} registro(s)"
+        rodape += f" com {filtro!r} no nome)" if filtro else ")"
+        sys.stdout.write(f"\n{texto}\n{rodape}\n")
+        sys.stdout.flush()
+
+        opcoes = "[Enter] próxima  [-] anterior  [nº] ir para a página  [/texto] filtrar pelo nome"
+        if detalhes is not None:
+            opcoes += "  [d] tabela/detalhes"
+        resposta = input(f"{opcoes}  [#] voltar: ").strip()
+        if voltar(resposta):
+            return
+        if resposta == "":
+            if pagina + 1 >= paginas:
+                return
+            pagina += 1
+        elif resposta == "-":
+            pagina = max(0, pagina - 1)
+        elif resposta.isdigit():
+            pagina = max(0, int(resposta) - 1)
+        elif resposta.startswith("/"):
+            filtro, pagina = resposta[1:].strip(), 0
+            if filtro:
+                total = sum(1 for _ in _ids_filtrados(registros, filtro, ids))
+            else:
+                total = len(registros) if ids is None else len(ids)
+        elif resposta.lower() == "d" and detalhes is not None:
+            detalhado = not detalhado
+        else:
+            print("")
+            print("⚠️   Opção inválida! Tente novamente.")
+
+# Colunas da tabela compacta de cada coleção
+COLUNAS_CULTURAS = (
+    ("ID", 7, ">", lambda c: c.id),
+    ("Nome", 24, "<", lambda c: c["nome"]),
+    ("Formato", 10, "<", lambda c: c["formato"]),
+    ("Área (m²)", 13, ">", lambda c: f"{c['area']:.2f}"),
+    ("Faixas", 6, ">", lambda c: c["faixas"]),
+    ("Área/faixa (m²)", 15, ">", lambda c: f"{c['area_faixa']:.2f}"),
+)
+COLUNAS_INSUMOS = (
+    ("ID", 7, ">", lambda i: i.id),
+    ("Nome", 24, "<", lambda i: i["nome"]),
+    ("Dose (L/m²)", 11, ">", lambda i: i["dose_m2"]),
+    ("Estoque (L)", 12, ">", lambda i: f"{i['estoque']:.2f}"),
+)
+
+def detalhes_cultura(cultura):
+    return (
+        f"Cultura {cultura.id}:\n"
+        f"🌾 Nome: {cultura['nome']}\n"
+        f"📐 Formato: {cultura['formato']}\n"
+        f"📏 Área total: {cultura['area']:.2f} m²\n"
+        f"🔢 Quantidade de faixas: {cultura['faixas']}\n"
+        f"📏 Área média de cada faixa: {cultura['area_faixa']:.2f} m²"
+    )
+
+def detalhes_insumo(insumo):
+    return (
+        f"Insumo {insumo.id}:\n"
+        f"🧪 Nome: {insumo['nome']}\n"
+        f"💧 Dose: {insumo['dose_m2']} L/m²\n"
+        f"📦 Estoque: {insumo['estoque']:.2f} litros"
+    )
+
 
 # ===========================
 # MENUS (apenas exibição)
@@ -113,11 +309,15 @@ def menu_inicial():
     print("\n" + "="*50)
     print("🌱  Bem-vindo ao FarmTech - Gestão Agrícola")
     print("="*50)
+    print(f"\n🏡 Fazenda: {fazenda.nome}")
     print("\nO que você gostaria de fazer hoje?\n")
     print("[1] 🌾 Gerenciar Culturas")
     print("[2] 🧪 Gerenciar Insumos")
     print("[3] 💧 Aplicar Insumo em Cultura")
-    print("[4] 🚪 Sair do Programa")
+    print("[4] 📒 Histórico de Aplicações")
+    print("[5] 📊 Estatísticas")
+    print("[6] 🏡 Trocar de fazenda")
+    print("[7] 🚪 Sair do Programa")
     print("-"*50)
 
 def menu_culturas():
@@ -129,7 +329,8 @@ def menu_culturas():
     print("[2] 📋 Listar culturas cadastradas")
     print("[3] ✏️  Atualizar dados de uma cultura")
     print("[4] 🗑️  Deletar dados de uma cultura")
-    print("[5] 🔙 Voltar ao Menu Principal")
+    print("[5] 🔎 Consultar culturas (filtros e ordenação)")
+    print("[6] 🔙 Voltar ao Menu Principal")
     print("-"*50)
 
 def menu_insumos():
@@ -141,7 +342,8 @@ def menu_insumos():
     print("[2] 📋 Listar insumos cadastrados")
     print("[3] ✏️  Atualizar dados de um insumo")
     print("[4] 🗑️  Deletar dados de um insumo")
-    print("[5] 🔙 Voltar ao Menu Principal")
+    print("[5] 📦 Lançar entrada no estoque")
+    print("[6] 🔙 Voltar ao Menu Principal")
     print("-"*50)
 
 # ==============================
@@ -157,9 +359,14 @@ def cadastrar_cultura():
     print("="*50)
     print("")
 
-    nome = input("\n👉 Digite o nome da cultura: ")
-    if voltar(nome):
-        return
+    while True:
+        nome = input("\n👉 Digite o nome da cultura: ")
+        if voltar(nome):
+            return
+        if culturas.por_nome(nome) is None:
+            break
+        print("")
+        print("⚠️   Já existe uma cultura com esse nome! Escolha outro.\n")
 
     while True:
         print("")
@@ -167,6 +374,7 @@ def cadastrar_cultura():
         print("")
         print("[1] Retângulo")
         print("[2] Círculo")
+        print("[3] Polígono (terreno irregular)")
         print("")
         opcao_formato = input("👉 Digite o número da opção desejada: ")
         if voltar(opcao_formato):
@@ -187,8 +395,9 @@ def cadastrar_cultura():
                         return
                     comprimento = float(comprimento)
 
-                    area = largura * comprimento
+                    area = area_retangulo(largura, comprimento)
                     formato = "retangular"
+                    geometria = gravar_geometria(geometria_retangulo(largura, comprimento))
                     print("")
                     print(f"✅ Esse terreno {formato} possui uma área total de {area:.2f} m²!")
                     break
@@ -206,8 +415,9 @@ def cadastrar_cultura():
                         return
                     raio = float(raio)
 
-                    area = 3.14159 * (raio ** 2)
+                    area = area_circulo(raio)
                     formato = "circular"
+                    geometria = ""
                     print("")
                     print(f"✅ Esse terreno {formato} possui uma área total de {area:.2f} m²!")
                     break
@@ -216,6 +426,16 @@ def cadastrar_cultura():
                     print("⚠️   Valor inválido! Digite apenas números.\n")
             break
 
+        elif opcao_formato == "3":
+            poligono = ler_poligono()
+            if poligono is None:
+                return
+            area, geometria = poligono
+            formato = "poligonal"
+            print("")
+            print(f"✅ Esse terreno {formato} possui uma área total de {area:.2f} m²!")
+            break
+
         else:
             print("")
             print("⚠️   Opção inválida! Tente novamente.\n")
@@ -242,10 +462,19 @@ def cadastrar_cultura():
         "formato": formato,
         "area": area,
         "faixas": faixas,
-        "area_faixa": area_faixa
+        "area_faixa": area_faixa,
+        "geometria": geometria
     }
-    culturas.append(cultura)
-    salvar_dados()
+    try:
+        with diario.transacao():
+            cultura = culturas.inserir(cultura)
+            diario.registrar("inserir", "culturas", cultura.id, dados=cultura)
+    except NomeDuplicadoError:
+        # Outro processo cadastrou o mesmo nome enquanto os dados eram digitados
+        print("")
+        print("⚠️   Já existe uma cultura com esse nome!\n")
+        pausar()
+        return
 
     pausar()
 
@@ -270,16 +499,7 @@ def listar_culturas():
         pausar()
         return
 
-    for i, cultura in enumerate(culturas, start=1):
-        print("")
-        print(f"\nCultura {i}:")
-        print(f"🌾 Nome: {cultura['nome']}")
-        print(f"📐 Formato: {cultura['formato']}")
-        print(f"📏 Área total: {cultura['area']:.2f} m²")
-        print(f"🔢 Quantidade de faixas: {cultura['faixas']}")
-        print(f"📏 Área média de cada faixa: {cultura['area_faixa']:.2f} m²")
-
-    pausar()
+    paginar(culturas, COLUNAS_CULTURAS, detalhes_cultura)
 
 def atualizar_cultura():
 
@@ -295,166 +515,180 @@ def atualizar_cultura():
         pausar()
         return
     
-    for i, cultura in enumerate(culturas, start=1):
-        print("")
-        print(f"{i}. {cultura['nome']}")
-
-    print("")
-    escolha = input("\nDigite o número da cultura que deseja atualizar: ")
-    if voltar(escolha):
+    cultura = selecionar_cultura("que deseja atualizar")
+    if cultura is None:
         return
-    escolha = int(escolha) - 1
+    # Alterações ficam em "novos" e só são gravadas no fim, se ninguém mexeu na cultura
+    lida = dict(cultura)
+    novos = {}
 
-    if 0 <= escolha < len(culturas):
-        cultura = culturas[escolha]
+    print("")
+    print(f"\nCultura selecionada: {cultura['nome']}")
+    print("")
+    print("Quais dados você deseja alterar?")
+    print("")
+    print("[1] Nome")
+    print("[2] Formato")
+    print("[3] Área Total")
+    print("[4] Quantidade de Faixas")
 
-        print("")
-        print(f"\nCultura selecionada: {cultura['nome']}")
-        print("")
-        print("Quais dados você deseja alterar?")
-        print("")
-        print("[1] Nome")
-        print("[2] Formato")
-        print("[3] Área Total")
-        print("[4] Quantidade de Faixas")
+    print("")
+    opcao = input("👉 Digite o número da opção desejada: ")
+    if voltar(opcao):
+        return
 
+    if opcao == "1":
         print("")
-        opcao = input("👉 Digite o número da opção desejada: ")
-        if voltar(opcao):
+        novo_nome = input("Novo nome: ")
+        if voltar(novo_nome):
             return
+        existente = culturas.por_nome(novo_nome)
+        if existente is not None and existente.id != cultura.id:
+            print("")
+            print("⚠️   Já existe uma cultura com esse nome!\n")
+            pausar()
+            return
+        novos["nome"] = novo_nome
 
-        if opcao == "1":
+    elif opcao == "2":
+        while True:
             print("")
-            cultura["nome"] = input("Novo nome: ")
-            if voltar(cultura["nome"]):
+            novo_formato = input("Novo formato: (retangular/circular/poligonal)").lower()
+            if voltar(novo_formato):
                 return
+            if novo_formato in ["retangular", "circular", "poligonal"]:
+                novos["formato"] = novo_formato
+                novos["geometria"] = ""
+                if novo_formato == "poligonal":
+                    poligono = ler_poligono()
+                    if poligono is None:
+                        return
+                    novos["area"], novos["geometria"] = poligono
+                elif novo_formato == "retangular":
+                    while True:
+                        try:
+                            print("")
+                            largura = input("Nova largura (em metros): ")
+                            if voltar(largura):
+                                return
+                            largura = float(largura)
+
+                            print("")
+                            comprimento = input("Novo comprimento (em metros): ")
+                            if voltar(comprimento):
+                                return
+                            comprimento = float(comprimento)
+
+                            novos["area"] = area_retangulo(largura, comprimento)
+                            novos["geometria"] = gravar_geometria(geometria_retangulo(largura, comprimento))
+                            break
+                        except ValueError:
+                            print("")
+                            print("⚠️   Valor inválido! Digite apenas números.\n")
+                else:  # circular
+                    while True:
+                        try:
+                            print("")
+                            raio = input("Novo raio (em metros): ")
+                            if voltar(raio):
+                                return
+                            raio = float(raio)
+
+                            novos["area"] = area_circulo(raio)
+                            break
+                        except ValueError:
+                            print("")
+                            print("⚠️   Valor inválido! Digite apenas números.\n")
 
-        elif opcao == "2":
-            while True:
                 print("")
-                novo_formato = input("Novo formato: (retangular/circular)").lower()
-                if voltar(novo_formato):
-                    return
-                if novo_formato in ["retangular", "circular"]:
-                    cultura["formato"] = novo_formato
-                    if novo_formato == "retangular":
-                        while True:
-                            try:
-                                print("")
-                                largura = input("Nova largura (em metros): ")
-                                if voltar(largura):
-                                    return
-                                largura = float(largura)
-
-                                print("")
-                                comprimento = input("Novo comprimento (em metros): ")
-                                if voltar(comprimento):
-                                    return
-                                comprimento = float(comprimento)
-
-                                cultura["area"] = largura * comprimento
-                                break
-                            except ValueError:
-                                print("")
-                                print("⚠️   Valor inválido! Digite apenas números.\n")
-                    else:  # circular
-                        while True:
-                            try:
-                                print("")
-                                raio = input("Novo raio (em metros): ")
-                                if voltar(raio):
-                                    return
-                                raio = float(raio)
-
-                                cultura["area"] = 3.14159 * (raio ** 2)
-                                break
-                            except ValueError:
-                                print("")
-                                print("⚠️   Valor inválido! Digite apenas números.\n")
+                print(f"✅ Nova área calculada: {novos['area']:.2f} m².")
+                break
+            else:
+                print("")
+                print("⚠️   Opção inválida! Precisa ser 'retangular', 'circular' ou 'poligonal'. Tente novamente.\n")
+
+    elif opcao == "3":
+        if lida["formato"] == "poligonal":
+            poligono = ler_poligono()
+            if poligono is None:
+                return
+            novos["area"], novos["geometria"] = poligono
+            print("")
+            print(f"✅ A nova área calculada corresponde a {novos['area']:.2f} m².")
+        elif lida["formato"] == "retangular":
+            while True:
+                try:
+                    print("")
+                    largura = input("Nova largura (em metros): ")
+                    if voltar(largura):
+                        return
+                    largura = float(largura)
+
+                    print("")
+                    comprimento = input("Novo comprimento (em metros): ")
+                    if voltar(comprimento):
+                        return
+                    comprimento = float(comprimento)
 
+                    novos["area"] = area_retangulo(largura, comprimento)
+                    novos["geometria"] = gravar_geometria(geometria_retangulo(largura, comprimento))
                     print("")
-                    print(f"✅ Nova área calculada: {cultura['area']:.2f} m².")
+                    print(f"✅ A nova área calculada corresponde a {novos['area']:.2f} m².")
                     break
-                else:
+                except ValueError:
                     print("")
-                    print("⚠️   Opção inválida! Precisa ser 'retangular' ou 'circular'. Tente novamente.\n")
-
-        elif opcao == "3":
-            if cultura["formato"] == "retangular":
-                while True:
-                    try:
-                        print("")
-                        largura = input("Nova largura (em metros): ")
-                        if voltar(largura):
-                            return
-                        largura = float(largura)
-
-                        print("")
-                        comprimento = input("Novo comprimento (em metros): ")
-                        if voltar(comprimento):
-                            return
-                        comprimento = float(comprimento)
-
-                        cultura["area"] = largura * comprimento
-                        print("")
-                        print(f"✅ A nova área calculada corresponde a {cultura['area']:.2f} m².")
-                        break
-                    except ValueError:
-                        print("")
-                        print("⚠️   Valor inválido! Digite apenas números.\n")
-            else:
-                while True:
-                    try:
-                        print("")
-                        raio = input("Novo raio (em metros): ")
-                        if voltar(raio):
-                            return
-                        raio = float(raio)
-
-                        cultura["area"] = 3.14159 * (raio ** 2)
-                        print("")
-                        print(f"✅ A nova área calculada corresponde a {cultura['area']:.2f} m².")
-                        break
-                    except ValueError:
-                        print("")
-                        print("⚠️   Valor inválido! Digite apenas números.\n")
-
-        elif opcao == "4":
+                    print("⚠️   Valor inválido! Digite apenas números.\n")
+        else:
             while True:
                 try:
                     print("")
-                    cultura["faixas"] = input("Novo número de faixas: ")
-                    if voltar(cultura["faixas"]):
+                    raio = input("Novo raio (em metros): ")
+                    if voltar(raio):
                         return
-                    cultura["faixas"] = int(cultura["faixas"])
+                    raio = float(raio)
+
+                    novos["area"] = area_circulo(raio)
+                    print("")
+                    print(f"✅ A nova área calculada corresponde a {novos['area']:.2f} m².")
                     break
                 except ValueError:
                     print("")
-                    print("⚠️   Valor inválido! Digite apenas números inteiros.\n")
-
-        else:
-            print("")
-            print("⚠️   Opção inválida! Tente novamente.\n")
-            pausar()
-            return
+                    print("⚠️   Valor inválido! Digite apenas números.\n")
 
-        # Só recalcula se alterou formato, área ou faixas
-        if opcao in ["2", "3", "4"]:
-            if cultura["faixas"] > 0:
-                cultura["area_faixa"] = cultura["area"] / cultura["faixas"]
+    elif opcao == "4":
+        while True:
+            try:
                 print("")
-                print(f"✅ Essa cultura agora possui {cultura['faixas']} faixas, cada uma com área média de {cultura['area_faixa']:.2f} m²")
-
-        salvar_dados()
-
-        print("")
-        print("\n✅ Cultura atualizada com sucesso!\n")
-        pausar()
+                novas_faixas = input("Novo número de faixas: ")
+                if voltar(novas_faixas):
+                    return
+                novos["faixas"] = int(novas_faixas)
+                break
+            except ValueError:
+                print("")
+                print("⚠️   Valor inválido! Digite apenas números inteiros.\n")
 
     else:
         print("")
         print("⚠️   Opção inválida! Tente novamente.\n")
         pausar()
+        return
+
+    # Só recalcula se alterou formato, área ou faixas
+    if opcao in ["2", "3", "4"]:
+        area = novos.get("area", lida["area"])
+        faixas = novos.get("faixas", lida["faixas"])
+        if faixas > 0:
+            novos["area_faixa"] = area / faixas
+            print("")
+            print(f"✅ Essa cultura agora possui {faixas} faixas, cada uma com área média de {novos['area_faixa']:.2f} m²")
+
+    if not gravar_alteracoes(cultura, "culturas", lida, novos):
+        return
+
+    print("")
+    print("\n✅ Cultura atualizada com sucesso!\n")
+    pausar()
 
 def deletar_cultura():
 
@@ -470,40 +704,76 @@ def deletar_cultura():
         pausar()
         return
 
-    for i, cultura in enumerate(culturas, start=1):
-        print("")
-        print(f"{i}. {cultura['nome']}")
+    cultura = selecionar_cultura("que deseja deletar")
+    if cultura is None:
+        return
 
     print("")
-    escolha = input("\nDigite o número da cultura que deseja deletar: ")
-    if voltar(escolha):
-        return
+    lida = dict(cultura)
+    confirmacao = input(f"Tem certeza que deseja deletar a cultura '{cultura['nome']}'? (sim/não): ").lower()
+    if confirmacao == "sim":
+        try:
+            with diario.transacao(esperado=[("culturas", cultura.id, lida)]):
+                operacoes.verificar_sem_aplicacoes(diario, cultura, "cultura")
+                removida = culturas.remover(cultura.id)
+                diario.registrar("remover", "culturas", cultura.id)
+            print("")
+            print(f"\n✅   Cultura '{removida['nome']}' deletada com sucesso!\n")
+        except (ConflitoError, operacoes.ErroOperacao) as erro:
+            print("")
+            print(f"⚠️   {erro}\n")
+    else:
+        print("")
+        print("\n❌   Operação cancelada.\n")
 
-    try:
-        escolha = int(escolha) - 1
-    except ValueError:
+    pausar()
+
+def consultar_culturas():
+
+    instrucao()
+
+    print("\n" + "="*50)
+    print("🔎 Consulta de Culturas")
+    print("="*50)
+
+    if not culturas:
         print("")
-        print("⚠️   Valor inválido! Digite apenas números.\n")
+        print("\n⚠️   Nenhuma cultura cadastrada.\n")
         pausar()
         return
 
-    if 0 <= escolha < len(culturas):
-        cultura = culturas[escolha]
-        print("")
-        confirmacao = input(f"Tem certeza que deseja deletar a cultura '{cultura['nome']}'? (sim/não): ").lower()
-        if confirmacao == "sim":
-            culturas.pop(escolha)
-            salvar_dados()
-            print("")
-            print(f"\n✅   Cultura '{cultura['nome']}' deletada com sucesso!\n")
-        else:
+    print("\nPressione ENTER para deixar um filtro em branco.")
+    print("Faixas: mínimo..máximo, mínimo.. ou ..máximo (ex.: 500000.. para mais de 50 ha).\n")
+    perguntas = (
+        ("formato", f"Formato ({', '.join(FORMATOS)}): "),
+        ("area", "Área total (m²): "),
+        ("faixas", "Quantidade de faixas: "),
+        ("area_faixa", "Área de cada faixa (m²): "),
+        ("prefixo", "Início do nome: "),
+        ("ordenar", "Ordenar por (id, nome, area, faixas, area_faixa; - na frente para decrescente): "),
+        ("limite", "Quantidade máxima de resultados: "),
+    )
+    while True:
+        parametros = {}
+        for campo, pergunta in perguntas:
+            resposta = input(pergunta)
+            if voltar(resposta):
+                return
+            parametros[campo] = resposta
+        try:
+            resultado = consulta.consultar(culturas, **consulta.ler_consulta(culturas, parametros))
+            break
+        except operacoes.ErroOperacao as erro:
             print("")
-            print("\n❌   Operação cancelada.\n")
-    else:
+            print(f"⚠️   {erro} Tente novamente.\n")
+
+    if not resultado:
         print("")
-        print("⚠️   Opção inválida! Tente novamente.\n")
+        print("\n⚠️   Nenhuma cultura atende aos filtros.\n")
+        pausar()
+        return
 
-    pausar()
+    paginar(culturas, COLUNAS_CULTURAS, detalhes_cultura, [cultura.id for cultura in resultado])
 
 # ==============================
 # FUNÇÕES DE AÇÃO - INSUMOS
@@ -518,9 +788,14 @@ def cadastrar_insumo():
     print("="*50)
 
     print("")
-    nome = input("👉 Digite o nome do insumo: ")
-    if voltar(nome):
-        return
+    while True:
+        nome = input("👉 Digite o nome do insumo: ")
+        if voltar(nome):
+            return
+        if insumos.por_nome(nome) is None:
+            break
+        print("")
+        print("⚠️   Já existe um insumo com esse nome! Escolha outro.\n")
 
     while True:
         try:
@@ -535,8 +810,16 @@ def cadastrar_insumo():
             print("⚠️   Valor inválido! Digite um número, por exemplo: 0.5\n")
 
     insumo = {"nome": nome, "dose_m2": dose}
-    insumos.append(insumo)
-    salvar_dados()
+    try:
+        with diario.transacao():
+            insumo = insumos.inserir(insumo)
+            diario.registrar("inserir", "insumos", insumo.id, dados=insumo)
+    except NomeDuplicadoError:
+        # Outro processo cadastrou o mesmo nome enquanto os dados eram digitados
+        print("")
+        print("⚠️   Já existe um insumo com esse nome!\n")
+        pausar()
+        return
 
     print("")
     print("\n✅   Insumo cadastrado com sucesso!")
@@ -556,13 +839,7 @@ def listar_insumos():
         pausar()
         return
 
-    for i, insumo in enumerate(insumos, start=1):
-        print("")
-        print(f"\nInsumo {i}:")
-        print(f"🧪 Nome: {insumo['nome']}")
-        print(f"💧 Dose: {insumo['dose_m2']} L/m²")
-
-    pausar()
+    paginar(insumos, COLUNAS_INSUMOS, detalhes_insumo)
 
 def atualizar_insumo():
 
@@ -578,72 +855,62 @@ def atualizar_insumo():
         pausar()
         return
 
-    for i, insumo in enumerate(insumos, start=1):
-        print("")
-        print(f"{i}. {insumo['nome']}")
+    insumo = selecionar_insumo("que deseja atualizar")
+    if insumo is None:
+        return
+    lida = dict(insumo)
+    novos = {}
 
     print("")
-    escolha = input("\nDigite o número do insumo que deseja atualizar: ")
-    if voltar(escolha):
-        return
+    print(f"\nInsumo selecionado: {insumo['nome']}")
+    print("")
+    print("Quais dados você deseja alterar?")
+    print("")
+    print("[1] Nome")
+    print("[2] Dose")
 
-    try:
-        escolha = int(escolha) - 1
-    except ValueError:
-        print("")
-        print("⚠️   Valor inválido! Digite apenas números.\n")
-        pausar()
+    print("")
+    opcao = input("👉 Digite o número da opção desejada: ")
+    if voltar(opcao):
         return
 
-    if 0 <= escolha < len(insumos):
-        insumo = insumos[escolha]
-        print("")
-        print(f"\nInsumo selecionado: {insumo['nome']}")
-        print("")
-        print("Quais dados você deseja alterar?")
-        print("")
-        print("[1] Nome")
-        print("[2] Dose")
-
+    if opcao == "1":
         print("")
-        opcao = input("👉 Digite o número da opção desejada: ")
-        if voltar(opcao):
+        novo_nome = input("Novo nome do insumo: ")
+        if voltar(novo_nome):
             return
-
-        if opcao == "1":
+        existente = insumos.por_nome(novo_nome)
+        if existente is not None and existente.id != insumo.id:
             print("")
-            insumo["nome"] = input("Novo nome do insumo: ")
-            if voltar(insumo["nome"]):
-                return
-
-        elif opcao == "2":
-            while True:
-                try:
-                    print("")
-                    insumo["dose_m2"] = input("Nova dose (em L/m²): ")
-                    if voltar(insumo["dose_m2"]):
-                        return
-                    insumo["dose_m2"] = float(insumo["dose_m2"])
-                    break
-                except ValueError:
-                    print("")
-                    print("⚠️ Valor inválido! Digite um número, por exemplo: 0.5\n")
-
-        else:
-            print("")
-            print("⚠️   Opção inválida! Tente novamente.\n")
+            print("⚠️   Já existe um insumo com esse nome!\n")
             pausar()
             return
-        
-        salvar_dados()
-        print("")
-        print("\n✅   Insumo atualizado com sucesso!\n")
-        pausar()
+        novos["nome"] = novo_nome
+
+    elif opcao == "2":
+        while True:
+            try:
+                print("")
+                nova_dose = input("Nova dose (em L/m²): ")
+                if voltar(nova_dose):
+                    return
+                novos["dose_m2"] = float(nova_dose)
+                break
+            except ValueError:
+                print("")
+                print("⚠️ Valor inválido! Digite um número, por exemplo: 0.5\n")
 
     else:
         print("")
         print("⚠️   Opção inválida! Tente novamente.\n")
         pausar()
+        return
+    
+    if not gravar_alteracoes(insumo, "insumos", lida, novos):
+        return
+    print("")
+    print("\n✅   Insumo atualizado com sucesso!\n")
+    pausar()
 
 def deletar_insumo():
 
@@ -659,38 +926,27 @@ def deletar_insumo():
         pausar()
         return
 
-    for i, insumo in enumerate(insumos, start=1):
-        print("")
-        print(f"{i}. {insumo['nome']}")
-
-    print("")
-    escolha = input("\nDigite o número do insumo que deseja deletar: ")
-    if voltar(escolha):
-        return
-
-    try:
-        escolha = int(escolha) - 1
-    except ValueError:
-        print("")
-        print("⚠️   Valor inválido! Digite apenas números.\n")
-        pausar()
+    insumo = selecionar_insumo("que deseja deletar")
+    if insumo is None:
         return
 
-    if 0 <= escolha < len(insumos):
-        insumo = insumos[escolha]
-        print("")
-        confirmacao = input(f"Tem certeza que deseja deletar o insumo '{insumo['nome']}'? (sim/não): ").lower()
-        if confirmacao == "sim":
-            insumos.pop(escolha)
-            salvar_dados()
+    print("")
+    lido = dict(insumo)
+    confirmacao = input(f"Tem certeza que deseja deletar o insumo '{insumo['nome']}'? (sim/não): ").lower()
+    if confirmacao == "sim":
+        try:
+            with diario.transacao(esperado=[("insumos", insumo.id, lido)]):
+                operacoes.verificar_sem_aplicacoes(diario, insumo, "insumo")
+                removido = insumos.remover(insumo.id)
+                diario.registrar("remover", "insumos", insumo.id)
             print("")
-            print(f"\n✅ Insumo '{insumo['nome']}' deletado com sucesso!\n")
-        else:
+            print(f"\n✅ Insumo '{removido['nome']}' deletado com sucesso!\n")
+        except (ConflitoError, operacoes.ErroOperacao) as erro:
             print("")
-            print("\n❌   Operação cancelada.\n")
+            print(f"⚠️   {erro}\n")
     else:
         print("")
-        print("⚠️   Opção inválida! Tente novamente.\n")
+        print("\n❌   Operação cancelada.\n")
 
     pausar()
 
@@ -717,79 +973,314 @@ def aplicar_insumo():
         pausar()
         return
 
+    cultura = selecionar_cultura("")
+    if cultura is None:
+        return
+
+    insumo = selecionar_insumo("")
+    if insumo is None:
+        return
+
+    # cálculos principais
+    total, por_faixa = cache.aplicacao(cultura, insumo)
+    area_faixa = cultura["area_faixa"]
+
     print("")
-    print("\nCulturas disponíveis:")
-    for i, cultura in enumerate(culturas, start=1):
+    print("\n✅ Cálculo realizado com sucesso!")
+    print("")
+    print(f"🌾 Cultura: {cultura['nome']}")
+    print(f"🧪 Insumo: {insumo['nome']}")
+    print(f"💧 Dose: {insumo['dose_m2']} L/m²")
+    print(f"📏 Área total: {cultura['area']:.2f} m²")
+    print(f"🔢 Quantidade de Faixas: {cultura['faixas']}")
+    print(f"📐 Área média de cada faixa: {area_faixa:.2f} m²")
+    print(f"🧴 Quantidade total de insumo necessário: {total:.2f} litros")
+    print(f"💦 Quantidade de insumo necessário para cada faixa: {por_faixa:.2f} litros\n")
+
+    # Clima do local da fazenda (do cache em dados/clima.json quando recente)
+    resultado_clima = clima.clima_da_aplicacao(DADOS_DIR)
+    if resultado_clima is not None:
+        print(clima.resumo(resultado_clima))
         print("")
-        print(f"{i}. {cultura['nome']} (Área: {cultura['area']:.2f} m², Faixas: {cultura['faixas']})")
-    
+
+    resposta = input("Deseja ver a quantidade real de cada faixa? (sim/não): ").lower()
+    if resposta == "sim":
+        mostrar_faixas(cultura, insumo)
+
     print("")
-    escolha_cultura = input("\nDigite o número da cultura: ")
-    if voltar(escolha_cultura):
+    resposta = input("Deseja planejar a missão do drone/pulverizador (ordem das faixas e reabastecimentos)? (sim/não): ")
+    if resposta.lower() == "sim":
+        mostrar_missao(cultura, insumo)
+
+    print("")
+    resposta = input("Deseja registrar esta aplicação no histórico (baixando o estoque)? (sim/não): ").lower()
+    if resposta == "sim":
+        registrar_aplicacao(cultura, insumo, total)
+    pausar()
+
+
+def registrar_aplicacao(cultura, insumo, total):
+    """Registra a aplicação com a data de hoje e mostra o estoque restante."""
+    while True:
+        try:
+            print("")
+            litros = input(f"Litros aplicados (Enter = {total:.2f}): ")
+            if voltar(litros):
+                return
+            litros = float(litros) if litros.strip() else total
+            break
+        except ValueError:
+            print("")
+            print("⚠️   Valor inválido! Digite apenas números.\n")
+
+    try:
+        aplicacao = operacoes.registrar_aplicacao(culturas, insumos, aplicacoes, diario, {
+            "cultura": str(cultura.id), "insumo": str(insumo.id), "litros": litros,
+        })
+    except (operacoes.ErroOperacao, KeyError) as erro:
+        # Ex.: a cultura ou o insumo foi removido por outro processo
+        print("")
+        print(f"⚠️   {erro}\n")
         return
 
+    insumo = insumos.por_id(aplicacao["insumo"])
+    print("")
+    print(f"✅ Aplicação registrada em {aplicacao['data']} (safra {aplicacao['safra']}).")
+    print(f"📦 Estoque de {insumo['nome']}: {insumo['estoque']:.2f} litros")
+    if insumo["estoque"] < 0:
+        print("⚠️   O estoque ficou negativo: lance a entrada do insumo no menu de insumos.")
+
+
+def mostrar_faixas(cultura, insumo):
+    """Divide o terreno em faixas paralelas (rumo escolhido) e mostra área e insumo de cada uma."""
+    while True:
+        try:
+            print("")
+            rumo = input("Direção das faixas em graus a partir do norte (Enter = 0): ")
+            if voltar(rumo):
+                return
+            rumo = float(rumo) if rumo.strip() else 0.0
+            break
+        except ValueError:
+            print("")
+            print("⚠️   Valor inválido! Digite apenas números.\n")
+
     try:
-        escolha_cultura = int(escolha_cultura) - 1
-    except ValueError:
+        faixas = cache.aplicacao_por_faixa(cultura, insumo, rumo=rumo)
+    except ValueError as erro:
         print("")
-        print("⚠️   Valor inválido! Digite apenas números.\n")
-        pausar()
+        print(f"⚠️   {erro}\n")
         return
+    # Com muitas faixas, mostra só as primeiras e as últimas
+    exibidas = list(enumerate(faixas, start=1))
+    if len(exibidas) > 20:
+        exibidas = exibidas[:10] + [None] + exibidas[-10:]
+
+    print("")
+    print(f"{'Faixa':>6}  {'Área (m²)':>12}  {'Insumo (L)':>12}")
+    for item in exibidas:
+        if item is None:
+            print(f"{'...':>6}")
+            continue
+        numero, (area, litros) = item
+        print(f"{numero:>6}  {area:>12.2f}  {litros:>12.2f}")
+    litros = [l for _, l in faixas]
+    print("")
+    print(f"🔽 Menor faixa: {min(litros):.2f} litros | 🔼 Maior faixa: {max(litros):.2f} litros\n")
+
+def mostrar_missao(cultura, insumo):
+    """Pergunta tanque e largura da barra e mostra a ordem das faixas com as paradas para reabastecer."""
+    perguntas = (
+        ("tanque", "Capacidade do tanque em litros: "),
+        ("largura", "Largura da barra (faixa) em metros (Enter = as faixas da cultura): "),
+        ("rumo", "Direção das faixas em graus a partir do norte (Enter = 0): "),
+        ("base", "Ponto de reabastecimento x,y em metros (Enter = canto sudoeste): "),
+    )
+    while True:
+        dados = {}
+        for campo, pergunta in perguntas:
+            print("")
+            resposta = input(pergunta)
+            if voltar(resposta):
+                return
+            dados[campo] = resposta
+        try:
+            plano = operacoes.planejar_missao(culturas, insumos, str(cultura.id), str(insumo.id), dados)
+            break
+        except operacoes.ErroOperacao as erro:
+            print("")
+            print(f"⚠️   {erro} Tente novamente.\n")
 
-    if not (0 <= escolha_cultura < len(culturas)):
+    # Faixas que não cabem em um tanque são feitas em partes (faixa.parte)
+    divididas = {faixa for _, faixa, parte, *_ in plano.etapas if parte and parte > 1}
+    # Com muitas etapas, mostra só as primeiras e as últimas
+    exibidas = list(enumerate(plano.etapas, start=1))
+    if len(exibidas) > 20:
+        exibidas = exibidas[:10] + [None] + exibidas[-10:]
+
+    print("")
+    print(f"{'Etapa':>6}  {'':<12} {'Faixa':>6}  {'Insumo (L)':>12}  {'Tanque (L)':>12}")
+    for item in exibidas:
+        if item is None:
+            print(f"{'...':>6}")
+            continue
+        numero, (tipo, faixa, parte, _, _, litros, tanque) = item
+        if tipo == "reabastecer":
+            print(f"{numero:>6}  ⛽ reabastecer {'':>6}  {'':>12}  {tanque:>12.2f}")
+            continue
+        rotulo = f"{faixa}.{parte}" if faixa in divididas else f"{faixa}"
+        print(f"{numero:>6}  {'🛩️  aplicar':<12} {rotulo:>6}  {litros:>12.2f}  {tanque:>12.2f}")
+    print("")
+    print(f"🧴 Total: {plano.litros:.2f} litros | ⛽ Reabastecimentos: {plano.reabastecimentos}")
+    print(f"🧭 Deslocamento sem aplicar: {plano.deslocamento:.0f} m "
+          f"(na ordem simples das faixas: {plano.deslocamento_simples:.0f} m) | "
+          f"aplicando: {plano.aplicando:.0f} m\n")
+
+def historico_aplicacoes():
+    print("\n" + "="*50)
+    print("📒 Histórico de Aplicações")
+    print("="*50)
+
+    if not aplicacoes:
         print("")
-        print("⚠️   Número inválido!\n")
+        print("⚠️   Nenhuma aplicação registrada.\n")
         pausar()
         return
-    cultura = culturas[escolha_cultura]
 
+    safra = operacoes.safra_da_data(date.today())
     print("")
-    print("\nInsumos disponíveis:")
-    for i, insumo in enumerate(insumos, start=1):
-        print("")
-        print(f"{i}. {insumo['nome']} (Dose: {insumo['dose_m2']} L/m²)")
+    print(f"🗓️  Safra atual: {safra}\n")
+    # Totais mantidos a cada registro: consulta direta, sem percorrer o histórico
+    for insumo in insumos:
+        litros, quantidade = aplicacoes.total(insumo=insumo.id, safra=safra)
+        print(f"🧪 {insumo['nome']}: {litros:.2f} litros em {quantidade} aplicação(ões) | "
+              f"📦 estoque {insumo['estoque']:.2f} litros")
+
     print("")
-    escolha_insumo = input("\nDigite o número do insumo: ")
-    if voltar(escolha_insumo):
-        return
+    print("Últimas aplicações:")
+    # As aplicações ficam na ordem de registro: as 10 últimas estão no fim da coluna de IDs
+    for aplicacao in map(aplicacoes.por_id, reversed(aplicacoes.coluna("id")[-10:])):
+        cultura = culturas.por_id(aplicacao["cultura"])
+        insumo = insumos.por_id(aplicacao["insumo"])
+        print(f"  {aplicacao['data']}  {cultura['nome'] if cultura else '(removida)'} ← "
+              f"{insumo['nome'] if insumo else '(removido)'}: {aplicacao['litros']:.2f} litros")
+    print("")
+    pausar()
 
-    try:
-        escolha_insumo = int(escolha_insumo) - 1
-    except ValueError:
+def estatisticas():
+    print("\n" + "="*50)
+    print("📊 Estatísticas")
+    print("="*50)
+
+    # Resumos mantidos a cada alteração: consulta direta, sem percorrer as coleções
+    resumo = operacoes.estatisticas(culturas, insumos)
+
+    def desvio(valor, casas=2):
+        return "-" if valor is None else f"{valor:.{casas}f}"
+
+    area, faixas = resumo["culturas"]["area"], resumo["culturas"]["faixas"]
+    print("")
+    print(f"🌾 Culturas: {area['quantidade']}")
+    if area["quantidade"]:
+        print(f"📏 Área total: {area['soma']:.2f} m² | média: {area['media']:.2f} m² | desvio: {desvio(area['desvio'])} m²")
+        print(f"📐 Menor área: {area['minimo']:.2f} m² | maior área: {area['maximo']:.2f} m²")
+        print(f"🔢 Faixas por cultura: média {faixas['media']:.2f} (de {faixas['minimo']} a {faixas['maximo']})")
+
+    dose, estoque = resumo["insumos"]["dose_m2"], resumo["insumos"]["estoque"]
+    print("")
+    print(f"🧪 Insumos: {dose['quantidade']}")
+    if dose["quantidade"]:
+        print(f"💧 Dose média: {dose['media']:.4f} L/m² | mínima: {dose['minimo']:.4f} | "
+              f"máxima: {dose['maximo']:.4f} | desvio: {desvio(dose['desvio'], 4)}")
+        print(f"📦 Estoque total: {estoque['soma']:.2f} litros")
+    print("")
+    pausar()
+
+def lancar_estoque():
+
+    instrucao()
+
+    print("\n" + "="*50)
+    print("📦 Entrada no Estoque")
+    print("="*50)
+
+    if not insumos:
         print("")
-        print("⚠️   Valor inválido! Digite apenas números.\n")
+        print("⚠️   Nenhum insumo cadastrado.\n")
         pausar()
         return
 
-    if not (0 <= escolha_insumo < len(insumos)):
+    insumo = selecionar_insumo("que recebeu a entrada")
+    if insumo is None:
+        return
+
+    while True:
+        try:
+            print("")
+            litros = input("Litros recebidos (negativo para saída ou ajuste): ")
+            if voltar(litros):
+                return
+            litros = float(litros)
+            break
+        except ValueError:
+            print("")
+            print("⚠️   Valor inválido! Digite apenas números.\n")
+
+    try:
+        insumo = operacoes.movimentar_estoque(insumos, diario, str(insumo.id), litros)
+    except operacoes.ErroOperacao as erro:
         print("")
-        print("⚠️   Número inválido!\n")
+        print(f"⚠️   {erro}\n")
         pausar()
         return
-    insumo = insumos[escolha_insumo]
 
-    # cálculos principais
-    total = cultura["area"] * insumo["dose_m2"]
-    por_faixa = total / cultura["faixas"] if cultura["faixas"] > 0 else 0
-    area_faixa = cultura["area_faixa"]
+    print("")
+    print(f"✅ Estoque de {insumo['nome']}: {insumo['estoque']:.2f} litros\n")
+    pausar()
+
+def trocar_fazenda():
+
+    instrucao()
+
+    print("\n" + "="*50)
+    print("🏡 Trocar de Fazenda")
+    print("="*50)
 
+    nomes = fazendas.nomes()
     print("")
-    print("\n✅ Cálculo realizado com sucesso!")
+    print(f"Fazenda atual: {fazenda.nome}")
+    print(f"Fazendas cadastradas ({len(nomes)}): {', '.join(nomes)}")
+
+    while True:
+        print("")
+        nome = input("Nome da fazenda (um nome novo cria a fazenda): ")
+        if voltar(nome):
+            return
+        try:
+            nome = validar_nome(nome)
+            if not fazendas.existe(nome):
+                print("")
+                resposta = input(f"A fazenda '{nome}' não existe. Deseja criá-la? (sim/não): ")
+                if resposta.lower() != "sim":
+                    continue
+                fazendas.criar(nome)
+            break
+        except operacoes.ErroOperacao as erro:
+            print("")
+            print(f"⚠️   {erro}\n")
+
+    # A fazenda anterior continua carregada (voltar a ela é imediato) e é gravada ao sair
+    usar_fazenda(nome)
+    carregar_dados()
     print("")
-    print(f"🌾 Cultura: {cultura['nome']}")
-    print(f"🧪 Insumo: {insumo['nome']}")
-    print(f"💧 Dose: {insumo['dose_m2']} L/m²")
-    print(f"📏 Área total: {cultura['area']:.2f} m²")
-    print(f"🔢 Quantidade de Faixas: {cultura['faixas']}")
-    print(f"📐 Área média de cada faixa: {area_faixa:.2f} m²")
-    print(f"🧴 Quantidade total de insumo necessário: {total:.2f} litros")
-    print(f"💦 Quantidade de insumo necessário para cada faixa: {por_faixa:.2f} litros\n")
+    print(f"✅ Usando a fazenda {fazenda.nome}: {len(culturas)} cultura(s) e {len(insumos)} insumo(s).\n")
     pausar()
 
 def sair_programa():
+    salvar_dados()
     print("")
     print("\n✅ Programa encerrado. Até logo, agricultor! 🌱\n")
-    exit()
+    sys.exit(0)
 
 # ==============================
 # LOOPS
@@ -801,6 +1292,7 @@ def loop_principal():
         print("")
         opcao = input("👉 Digite o número da opção desejada: ")
         if opcao in acoes_principal:
+            atualizar_dados()
             acoes_principal[opcao]()
         else:
             print("")
@@ -813,7 +1305,8 @@ def loop_culturas():
         print("")
         opcao = input("👉 Digite o número da opção desejada: ")
         if opcao in acoes_culturas:
-            if opcao == "5":
+            atualizar_dados()
+            if opcao == "6":
                 break
             acoes_culturas[opcao]()
         else:
@@ -827,7 +1320,8 @@ def loop_insumos():
         print("")
         opcao = input("👉 Digite o número da opção desejada: ")
         if opcao in acoes_insumos:
-            if opcao == "5":
+            atualizar_dados()
+            if opcao == "6":
                 break
             acoes_insumos[opcao]()
         else:
@@ -843,7 +1337,10 @@ acoes_principal = {
     "1": lambda: loop_culturas(),
     "2": lambda: loop_insumos(),
     "3": aplicar_insumo,
-    "4": sair_programa
+    "4": historico_aplicacoes,
+    "5": estatisticas,
+    "6": trocar_fazenda,
+    "7": sair_programa
 }
 
 acoes_culturas = {
@@ -851,7 +1348,8 @@ acoes_culturas = {
     "2": listar_culturas,
     "3": atualizar_cultura,
     "4": deletar_cultura,
-    "5": lambda: None
+    "5": consultar_culturas,
+    "6": lambda: None
 }
 
 acoes_insumos = {
@@ -859,7 +1357,8 @@ acoes_insumos = {
     "2": listar_insumos,
     "3": atualizar_insumo,
     "4": deletar_insumo,
-    "5": lambda: None
+    "5": lancar_estoque,
+    "6": lambda: None
 }
 
 # ==============================
@@ -867,5 +1366,19 @@ acoes_insumos = {
 # ==============================
 
 if __name__ == "__main__":
+    # Métricas e perfil (cProfile) opcionais, ver metricas.py
+    metricas.iniciar()
+    # --fazenda NOME (em qualquer posição) ou FARMTECH_FAZENDA escolhe a fazenda
+    previo = argparse.ArgumentParser(add_help=False, allow_abbrev=False)
+    previo.add_argument("--fazenda", default=FAZENDA)
+    opcoes, argumentos = previo.parse_known_args(sys.argv[1:])
+    try:
+        usar_fazenda(opcoes.fazenda)
+    except operacoes.ErroOperacao as erro:
+        print(f"⚠️  {erro}", file=sys.stderr)
+        sys.exit(1)
     carregar_dados()
+    if argumentos:
+        # Com argumentos, roda sem menus (ver linha_comando.py)
+        sys.exit(linha_comando.main(argumentos, culturas, insumos, diario, fazendas=fazendas))
     loop_principal()
\ No newline at end of file
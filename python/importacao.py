@@ -0,0 +1,232 @@
+# -*- coding: utf-8 -*-
+"""
+FarmTech - Importação em massa
+Descrição: Cadastra de uma só vez as culturas ou os insumos de arquivos
+grandes (CSV com cabeçalho, JSONL ou GeoJSON). O arquivo é lido em blocos,
+os blocos são validados em paralelo por um pool de processos, os nomes
+repetidos são descartados e tudo é gravado em um único passo.
+
+Cada linha (ou feição GeoJSON) tem os mesmos campos do cadastro pela linha de
+comando: nome, largura e comprimento, raio, área e formato, vértices, lonlat
+ou geojson, e faixas (culturas); nome, dose_m2 e estoque (insumos). Nas feições
+GeoJSON, os campos vêm das propriedades ("name" também vale como nome) e o
+contorno, da geometria.
+"""
+
+import csv
+import json
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+from armazem import NomeDuplicadoError, normalizar_nome
+from operacoes import ErroOperacao, validar_cultura, validar_insumo
+
+# Linhas validadas por tarefa do pool
+TAMANHO_BLOCO = 5000
+
+# Abaixo deste tamanho (bytes) o arquivo é validado no próprio processo
+LIMIAR_PARALELO = 4 * 2**20
+
+TIPOS_ARQUIVO = ("csv", "jsonl", "geojson")
+
+_VALIDADORES = {"culturas": validar_cultura, "insumos": validar_insumo}
+_COLUNAS = {
+    "culturas": ("nome", "formato", "area", "faixas", "area_faixa", "geometria"),
+    "insumos": ("nome", "dose_m2", "estoque"),
+}
+
+# ===========================
+# LEITURA EM BLOCOS
+# ===========================
+
+def tipo_do_arquivo(caminho):
+    """Deduz o tipo do arquivo pela extensão (.csv, .jsonl/.ndjson, .geojson/.json)."""
+    extensao = os.path.splitext(caminho)[1].lower()
+    tipo = {".csv": "csv", ".jsonl": "jsonl", ".ndjson": "jsonl", ".geojson": "geojson", ".json": "geojson"}.get(extensao)
+    if tipo is None:
+        raise ErroOperacao(f"Tipo de arquivo não reconhecido: {caminho!r} (use --tipo {'/'.join(TIPOS_ARQUIVO)}).")
+    return tipo
+
+
+def _ler_blocos(caminho, tipo, tamanho_bloco):
+    """
+    Produz (número do primeiro item, cabeçalho, itens crus) de cada bloco.
+    Os itens são listas de campos (CSV), linhas de texto (JSONL) ou feições
+    (GeoJSON); a conversão e a validação ficam para os processos do pool.
+    """
+    if tipo == "geojson":
+        with open(caminho, "r", encoding="utf-8") as f:
+            dados = json.load(f)
+        if dados.get("type") == "Feature":
+            feicoes = [dados]
+        elif dados.get("type") == "FeatureCollection":
+            feicoes = dados.get("features") or []
+        else:
+            raise ErroOperacao("O arquivo deve conter um Feature ou FeatureCollection GeoJSON.")
+        for inicio in range(0, len(feicoes), tamanho_bloco):
+            yield inicio + 1, None, feicoes[inicio:inicio + tamanho_bloco]
+        return
+
+    with open(caminho, "r", newline="", encoding="utf-8") as f:
+        if tipo == "csv":
+            leitor = csv.reader(f)
+            cabecalho = [c.strip() for c in next(leitor, [])]
+            numero = 2  # a linha 1 é o cabeçalho
+        else:
+            leitor, cabecalho, numero = f, None, 1
+        while True:
+            itens = list(islice(leitor, tamanho_bloco))
+            if not itens:
+                return
+            yield numero, cabecalho, itens
+            numero += len(itens)
+
+
+def _dados_do_item(tipo, cabecalho, item):
+    """Dicionário de campos de um item cru, ou None para linhas em branco."""
+    if tipo == "csv":
+        if not item:
+            return None
+        return {c: v for c, v in zip(cabecalho, item) if v != ""}
+    if tipo == "jsonl":
+        if not item.strip():
+            return None
+        dados = json.loads(item)
+        if not isinstance(dados, dict):
+            raise ErroOperacao("A linha deve ser um objeto JSON.")
+        return dados
+    if not isinstance(item, dict):
+        raise ErroOperacao("A feição deve ser um objeto GeoJSON.")
+    dados = dict(item.get("properties") or {})
+    if "nome" not in dados and "name" in dados:
+        dados["nome"] = dados["name"]
+    if item.get("geometry"):
+        dados["geojson"] = item["geometry"]
+    return dados
+
+# ===========================
+# VALIDAÇÃO (NOS PROCESSOS DO POOL)
+# ===========================
+
+def _validar_bloco(colecao, tipo, padroes, inicio, cabecalho, itens):
+    """
+    Valida um bloco e devolve (lote {coluna: valores}, números dos itens
+    válidos, erros [(número, mensagem)]). Roda nos processos do pool.
+    """
+    validar = _VALIDADORES[colecao]
+    colunas = _COLUNAS[colecao]
+    lote = {c: [] for c in colunas}
+    numeros, erros = [], []
+    for numero, item in enumerate(itens, start=inicio):
+        try:
+            dados = _dados_do_item(tipo, cabecalho, item)
+            if dados is None:
+                continue
+            for campo, valor in padroes.items():
+                dados.setdefault(campo, valor)
+            registro = validar(dados)
+        except (ValueError, TypeError, KeyError) as erro:
+            erros.append((numero, str(erro)))
+            continue
+        for c in colunas:
+            lote[c].append(registro[c])
+        numeros.append(numero)
+    return lote, numeros, erros
+
+
+def _validar_em_paralelo(colecao, tipo, padroes, blocos, trabalhadores):
+    """Resultados de _validar_bloco na ordem do arquivo, com poucos blocos em trânsito."""
+    if trabalhadores <= 1:
+        for bloco in blocos:
+            yield _validar_bloco(colecao, tipo, padroes, *bloco)
+        return
+    with ProcessPoolExecutor(max_workers=trabalhadores) as pool:
+        em_transito = deque()
+        for bloco in blocos:
+            em_transito.append(pool.submit(_validar_bloco, colecao, tipo, padroes, *bloco))
+            if len(em_transito) >= 2 * trabalhadores:
+                yield em_transito.popleft().result()
+        while em_transito:
+            yield em_transito.popleft().result()
+
+
+def ler_arquivo(caminho, colecao, tipo=None, padroes=None, trabalhadores=None, tamanho_bloco=TAMANHO_BLOCO):
+    """
+    Lê e valida todos os registros do arquivo. Devolve (lote, números, erros):
+    o lote {coluna: valores} dos registros válidos, o número da linha (ou
+    feição) de cada um e a lista de (número, mensagem) dos inválidos.
+
+    padroes completa campos ausentes (ex.: {"faixas": 10}). Sem trabalhadores,
+    arquivos pequenos são validados no próprio processo e os grandes em
+    tantos processos quanto CPUs.
+    """
+    tipo = tipo or tipo_do_arquivo(caminho)
+    if trabalhadores is None:
+        trabalhadores = 1 if os.path.getsize(caminho) < LIMIAR_PARALELO else (os.cpu_count() or 1)
+    padroes = {c: v for c, v in (padroes or {}).items() if v is not None}
+
+    lote = {c: [] for c in _COLUNAS[colecao]}
+    numeros, erros = [], []
+    blocos = _ler_blocos(caminho, tipo, tamanho_bloco)
+    for parcial, numeros_bloco, erros_bloco in _validar_em_paralelo(colecao, tipo, padroes, blocos, trabalhadores):
+        for c in lote:
+            lote[c] += parcial[c]
+        numeros += numeros_bloco
+        erros += erros_bloco
+    return lote, numeros, erros
+
+# ===========================
+# IMPORTAÇÃO
+# ===========================
+
+def _deduplicar(tabela, lote):
+    """
+    Remove do lote os nomes já cadastrados e as repetições dentro do próprio
+    arquivo (fica a primeira ocorrência). Devolve (lote, posições descartadas).
+    """
+    vistos = set()
+    manter, descartados = [], []
+    for posicao, nome in enumerate(lote["nome"]):
+        chave = normalizar_nome(nome)
+        if chave in vistos or tabela.por_nome(nome) is not None:
+            descartados.append(posicao)
+        else:
+            vistos.add(chave)
+            manter.append(posicao)
+    if not descartados:
+        return lote, descartados
+    return {c: [valores[p] for p in manter] for c, valores in lote.items()}, descartados
+
+
+def importar(tabela, diario, caminho, colecao, tipo=None, padroes=None, trabalhadores=None,
+             ignorar_invalidos=False, duplicados="ignorar", tamanho_bloco=TAMANHO_BLOCO):
+    """
+    Importa culturas ou insumos de um arquivo CSV, JSONL ou GeoJSON.
+
+    Com algum registro inválido nada é gravado, a menos que ignorar_invalidos.
+    Nomes repetidos (no arquivo ou já cadastrados) são descartados, ou cancelam
+    a importação com duplicados="erro". Devolve um resumo com os IDs
+    cadastrados, os números dos itens repetidos e os erros de validação.
+    """
+    lote, numeros, erros = ler_arquivo(caminho, colecao, tipo, padroes, trabalhadores, tamanho_bloco)
+    if erros and not ignorar_invalidos:
+        detalhes = "; ".join(f"{numero}: {mensagem}" for numero, mensagem in erros[:5])
+        mais = f" (e mais {len(erros) - 5})" if len(erros) > 5 else ""
+        raise ErroOperacao(f"Importação cancelada: {len(erros)} registro(s) inválido(s). {detalhes}{mais}")
+
+    with diario.transacao(), diario.em_lote():
+        lote, descartados = _deduplicar(tabela, lote)
+        repetidos = [numeros[p] for p in descartados]
+        if repetidos and duplicados == "erro":
+            raise NomeDuplicadoError(
+                f"Importação cancelada: {len(repetidos)} nome(s) repetido(s) ou já cadastrado(s) "
+                f"(itens {', '.join(map(str, repetidos[:5]))}{'...' if len(repetidos) > 5 else ''})."
+            )
+        inicio = tabela.proximo_id
+        lote["id"] = list(range(inicio, inicio + len(lote["nome"])))
+        tabela.estender(lote)
+        diario.registrar_insercoes(colecao, lote["id"])
+
+    return {"ids": lote["id"], "repetidos": repetidos, "erros": erros}
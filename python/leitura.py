@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+"""
+FarmTech - Leitura de CSV em lotes
+Descrição: Lê arquivos CSV grandes em blocos de linhas já convertidos para
+colunas tipadas, sem montar um dicionário por linha.
+"""
+
+import csv
+from array import array
+from itertools import islice
+
+# Quantidade padrão de linhas por lote
+TAMANHO_LOTE = 65536
+
+# Tipo Python da coluna -> código do array usado no lote
+_CODIGOS = {float: "d", int: "q"}
+
+# ===========================
+# LEITURA EM LOTES
+# ===========================
+
+def _converter(tipo, valores):
+    """Converte uma coluna inteira de texto para o tipo indicado."""
+    if tipo in _CODIGOS:
+        return array(_CODIGOS[tipo], map(tipo, valores))
+    return list(valores)
+
+
+def ler_em_lotes(caminho, tipos, tamanho_lote=TAMANHO_LOTE):
+    """
+    Lê o CSV e produz lotes no formato {coluna: valores}.
+
+    tipos indica as colunas desejadas e seus tipos (str, float ou int);
+    colunas ausentes no cabeçalho são simplesmente omitidas do lote.
+    As colunas numéricas vêm como array ("d" ou "q") e as de texto como lista.
+    """
+    with open(caminho, "r", newline="", encoding="utf-8") as f:
+        reader = csv.reader(f)
+        cabecalho = next(reader, None)
+        if cabecalho is None:
+            return
+        indices = {c: cabecalho.index(c) for c in tipos if c in cabecalho}
+
+        while True:
+            linhas = [linha for linha in islice(reader, tamanho_lote) if linha]
+            if not linhas:
+                break
+            colunas = list(zip(*linhas))
+            yield {c: _converter(tipos[c], colunas[i]) for c, i in indices.items()}
+
+# ===========================
+# AGREGAÇÃO SEM CARREGAR TUDO
+# ===========================
+
+def resumir_coluna(caminho, coluna, tamanho_lote=TAMANHO_LOTE):
+    """
+    Calcula quantidade, soma, mínimo, máximo e média de uma coluna numérica
+    lendo o arquivo em lotes (apenas a coluna pedida é convertida).
+    """
+    quantidade = 0
+    soma = 0.0
+    minimo = maximo = None
+    for lote in ler_em_lotes(caminho, {coluna: float}, tamanho_lote):
+        valores = lote[coluna]
+        if not valores:
+            continue
+        quantidade += len(valores)
+        soma += sum(valores)
+        menor, maior = min(valores), max(valores)
+        minimo = menor if minimo is None else min(minimo, menor)
+        maximo = maior if maximo is None else max(maximo, maior)
+
+    return {
+        "quantidade": quantidade,
+        "soma": soma,
+        "minimo": minimo,
+        "maximo": maximo,
+        "media": soma / quantidade if quantidade else None,
+    }
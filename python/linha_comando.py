@@ -0,0 +1,609 @@
+# -*- coding: utf-8 -*-
+"""
+FarmTech - Modo linha de comando (sem menus)
+Descrição: Executa cadastros, listagens, atualizações, exclusões e cálculos de
+aplicação por argumentos ou em lote (JSONL/CSV de um arquivo ou da entrada
+padrão), com uma única carga e uma única gravação por execução.
+
+Exemplos:
+    python gestao_agricola.py culturas cadastrar --nome Soja --largura 100 --comprimento 300 --faixas 20
+    python gestao_agricola.py culturas add --nome Cana --vertices "[[0,0],[250,0],[180,120]]" --faixas 8
+    python gestao_agricola.py culturas importar talhoes.geojson --faixas 10
+    python gestao_agricola.py culturas importar cooperativa.csv --trabalhadores 8
+    python gestao_agricola.py culturas consultar --formato circular --area 500000.. --ordenar area --decrescente --limite 20
+    python gestao_agricola.py insumos add --nome Herbicida --dose 0.05
+    python gestao_agricola.py aplicar --cultura Soja --insumo Herbicida
+    python gestao_agricola.py aplicar --cultura Pivo --insumo Herbicida --por-faixa --largura-faixa 36 --rumo 45
+    python gestao_agricola.py missao --cultura Pivo --insumo Herbicida --tanque 40 --largura-faixa 6 --base 0,-420
+    python gestao_agricola.py clima --saida json
+    python gestao_agricola.py estatisticas
+    python gestao_agricola.py --fazenda sitio-norte culturas listar
+    python gestao_agricola.py fazendas consultar culturas --formato circular --ordenar area --decrescente --limite 20
+    python gestao_agricola.py exportar --formato parquet --particionar formato
+    python gestao_agricola.py aplicacoes registrar --cultura Soja --insumo Herbicida --data 2025-10-02
+    python gestao_agricola.py aplicacoes consumo --insumo Herbicida --safra 2025/2026
+    python gestao_agricola.py lote operacoes.jsonl
+"""
+
+import argparse
+import csv
+import json
+import sys
+
+import clima
+import colunar
+import consulta
+import fazendas as modulo_fazendas
+import importacao
+import operacoes
+from armazem import FORMATOS, TabelaCulturas, TabelaInsumos
+from operacoes import ErroOperacao
+
+# ===========================
+# OPERAÇÕES DISPONÍVEIS
+# ===========================
+
+# Ações aceitas (em português e em inglês) -> nome canônico
+ACOES = {
+    "cadastrar": "cadastrar", "add": "cadastrar",
+    "listar": "listar", "list": "listar",
+    "consultar": "consultar", "query": "consultar",
+    "atualizar": "atualizar", "update": "atualizar",
+    "deletar": "deletar", "delete": "deletar",
+    "importar": "importar", "import": "importar",
+    "registrar": "cadastrar", "estornar": "deletar",
+    "estoque": "estoque", "consumo": "consumo",
+}
+
+CAMPOS_CULTURA = (
+    "nome", "formato", "largura", "comprimento", "raio", "area", "vertices", "lonlat", "geojson", "faixas",
+)
+CAMPOS_INSUMO = ("nome", "dose_m2", "estoque")
+CAMPOS_APLICACAO = ("cultura", "insumo", "litros", "data", "safra")
+
+
+def executar_operacao(culturas, insumos, diario, operacao):
+    """
+    Executa uma operação descrita por um dicionário, como as linhas do modo lote:
+    {"colecao": "culturas", "acao": "cadastrar", "nome": "Soja", ...}
+    {"colecao": "insumos", "acao": "atualizar", "chave": "Herbicida", "dose_m2": 0.1}
+    {"colecao": "insumos", "acao": "estoque", "chave": "Herbicida", "litros": 200}
+    {"colecao": "aplicacoes", "acao": "registrar", "cultura": "Soja", "insumo": "Herbicida", "data": "2025-10-02"}
+    {"acao": "aplicar", "cultura": "Soja", "insumo": "Herbicida"}
+    Devolve o registro afetado ou a matriz de aplicação.
+    """
+    acao = ACOES.get(operacao.get("acao"), operacao.get("acao"))
+    if acao in ("aplicar", "apply"):
+        return operacoes.aplicar(culturas, insumos, operacao.get("cultura"), operacao.get("insumo"))
+
+    colecao = operacao.get("colecao")
+    if colecao == "aplicacoes":
+        aplicacoes = diario.colecoes["aplicacoes"]
+        if acao == "cadastrar":
+            return operacoes.registrar_aplicacao(culturas, insumos, aplicacoes, diario, operacao)
+        if acao == "deletar":
+            return operacoes.estornar_aplicacao(insumos, aplicacoes, diario, operacao.get("chave"))
+        raise ErroOperacao(f"Ação inválida: {operacao.get('acao')!r}.")
+    if colecao == "insumos" and acao == "estoque":
+        return operacoes.movimentar_estoque(insumos, diario, operacao.get("chave"), operacao.get("litros"))
+    if colecao == "culturas":
+        registros, sufixo = culturas, "cultura"
+    elif colecao == "insumos":
+        registros, sufixo = insumos, "insumo"
+    else:
+        raise ErroOperacao(f"Coleção inválida: {colecao!r}.")
+
+    if acao == "cadastrar":
+        return getattr(operacoes, f"cadastrar_{sufixo}")(registros, diario, operacao)
+    if acao == "atualizar":
+        return getattr(operacoes, f"atualizar_{sufixo}")(registros, diario, operacao.get("chave"), operacao)
+    if acao == "deletar":
+        return getattr(operacoes, f"deletar_{sufixo}")(registros, diario, operacao.get("chave"))
+    raise ErroOperacao(f"Ação inválida: {operacao.get('acao')!r}.")
+
+# ===========================
+# SAÍDA
+# ===========================
+
+def _escrever_registros(registros, colunas, saida, arquivo):
+    if saida == "json":
+        for registro in registros:
+            arquivo.write(json.dumps(dict(registro), ensure_ascii=False) + "\n")
+        return
+    writer = csv.writer(arquivo, delimiter="," if saida == "csv" else "\t", lineterminator="\n")
+    writer.writerow(colunas)
+    writer.writerows([registro[c] for c in colunas] for registro in registros)
+
+
+def _escrever_tabela(colunas, linhas, saida, arquivo):
+    if saida == "json":
+        for linha in linhas:
+            arquivo.write(json.dumps(dict(zip(colunas, linha)), ensure_ascii=False) + "\n")
+        return
+    writer = csv.writer(arquivo, delimiter="," if saida == "csv" else "\t", lineterminator="\n")
+    writer.writerow(colunas)
+    writer.writerows(linhas)
+
+
+def _escrever_matriz(matriz, culturas, insumos, saida, arquivo):
+    colunas = ["cultura", "insumo", "total_litros", "litros_por_faixa"]
+    nomes_culturas = dict(zip(culturas.coluna("id"), culturas.coluna("nome")))
+    nomes_insumos = dict(zip(insumos.coluna("id"), insumos.coluna("nome")))
+    linhas = (
+        (nomes_culturas[c], nomes_insumos[i], round(total, 4), round(por_faixa, 4))
+        for c, i, total, por_faixa in matriz.linhas()
+    )
+    _escrever_tabela(colunas, linhas, saida, arquivo)
+
+
+def _escrever_faixas(cultura, insumo, faixas, saida, arquivo):
+    colunas = ["cultura", "insumo", "faixa", "area_m2", "litros"]
+    linhas = (
+        (cultura["nome"], insumo["nome"], numero, round(area, 4), round(litros, 4))
+        for numero, (area, litros) in enumerate(faixas, start=1)
+    )
+    _escrever_tabela(colunas, linhas, saida, arquivo)
+
+
+def _escrever_missao(missao, saida, arquivo):
+    colunas = ["ordem", "etapa", "faixa", "parte", "x_inicio", "y_inicio", "x_fim", "y_fim", "litros", "tanque"]
+    linhas = (
+        (ordem, tipo, faixa, parte, *(round(v, 2) for v in (x0, y0, x1, y1)), round(litros, 4), round(tanque, 4))
+        for ordem, tipo, faixa, parte, x0, y0, x1, y1, litros, tanque in missao.linhas()
+    )
+    _escrever_tabela(colunas, linhas, saida, arquivo)
+
+
+def _avisar_clima(diario):
+    """Mostra em stderr o clima do local e a janela de pulverização (se houver provedor de clima)."""
+    resultado = clima.clima_da_aplicacao(diario.dados_dir)
+    if resultado is not None:
+        sys.stderr.write(clima.resumo(resultado) + "\n")
+
+
+def _escrever_aplicacoes(culturas, insumos, aplicacoes, args, arquivo):
+    """Lista o histórico (com os nomes da cultura e do insumo), aplicando os filtros de args."""
+    filtros = {}
+    if args.cultura:
+        filtros["cultura"] = operacoes.localizar(culturas, args.cultura, "Cultura").id
+    if args.insumo:
+        filtros["insumo"] = operacoes.localizar(insumos, args.insumo, "Insumo").id
+    if args.safra:
+        filtros["safra"] = args.safra.strip()
+
+    nomes_culturas = dict(zip(culturas.coluna("id"), culturas.coluna("nome")))
+    nomes_insumos = dict(zip(insumos.coluna("id"), insumos.coluna("nome")))
+    colunas = ["id", "cultura", "insumo", "data", "safra", "litros"]
+    linhas = (
+        (
+            id,
+            nomes_culturas.get(cultura, f"#{cultura}"),
+            nomes_insumos.get(insumo, f"#{insumo}"),
+            data, safra, round(litros, 4),
+        )
+        for id, cultura, insumo, data, safra, litros in aplicacoes.linhas(["id", *colunas[1:]])
+        if all({"cultura": cultura, "insumo": insumo, "safra": safra}[c] == v for c, v in filtros.items())
+    )
+    _escrever_tabela(colunas, linhas, args.saida, arquivo)
+
+# ===========================
+# MODO LOTE
+# ===========================
+
+def _ler_operacoes(arquivo, tipo):
+    """Produz os dicionários de operação de um arquivo JSONL ou CSV."""
+    if tipo == "csv":
+        for linha in csv.DictReader(arquivo):
+            yield {c: v for c, v in linha.items() if v not in (None, "")}
+        return
+    for linha in arquivo:
+        if linha.strip():
+            yield json.loads(linha)
+
+
+def executar_lote(culturas, insumos, diario, arquivo, tipo, parar_no_erro=False, erros=sys.stderr):
+    """Executa todas as operações do arquivo; devolve (sucessos, falhas)."""
+    sucessos = falhas = 0
+    # A pasta de dados fica travada durante todo o lote (uma única trava e um único fsync)
+    with diario.transacao(), diario.em_lote():
+        for numero, operacao in enumerate(_ler_operacoes(arquivo, tipo), start=1):
+            try:
+                executar_operacao(culturas, insumos, diario, operacao)
+                sucessos += 1
+            except (ValueError, KeyError) as erro:
+                falhas += 1
+                erros.write(f"⚠️  Operação {numero}: {erro}\n")
+                if parar_no_erro:
+                    break
+    return sucessos, falhas
+
+# ===========================
+# ARGUMENTOS
+# ===========================
+
+def _criar_parser():
+    parser = argparse.ArgumentParser(
+        prog="gestao_agricola.py",
+        description="FarmTech - Gestão Agrícola (modo linha de comando). Sem argumentos, abre o menu interativo.",
+    )
+    parser.add_argument("--fazenda", help="fazenda usada (padrão: FARMTECH_FAZENDA ou a principal)")
+    sub = parser.add_subparsers(dest="comando", required=True)
+
+    def saida(p):
+        p.add_argument("--saida", choices=["texto", "csv", "json"], default="texto",
+                       help="formato da saída (padrão: texto)")
+
+    def consultar(acoes, descricao):
+        p = acoes.add_parser("consultar", aliases=["query"], help=f"filtrar, ordenar e limitar {descricao}")
+        p.add_argument("--prefixo", help="início do nome (sem diferenciar caixa)")
+        p.add_argument("--ordenar", help="coluna da ordenação (padrão: id)")
+        p.add_argument("--decrescente", action="store_true", help="do maior para o menor")
+        p.add_argument("--limite", help="quantidade máxima de registros (ex.: os 20 primeiros)")
+        saida(p)
+        return p
+
+    def importar(acoes, descricao):
+        p = acoes.add_parser("importar", aliases=["import"], help=f"cadastrar em massa {descricao} de um arquivo")
+        p.add_argument("arquivo", help="arquivo CSV (com cabeçalho), JSONL ou GeoJSON")
+        p.add_argument("--tipo", choices=importacao.TIPOS_ARQUIVO, help="formato do arquivo (padrão: pela extensão)")
+        p.add_argument("--trabalhadores", type=int,
+                       help="processos de validação (padrão: 1 para arquivos pequenos, senão um por CPU)")
+        p.add_argument("--ignorar-invalidos", action="store_true",
+                       help="importa os registros válidos mesmo que haja inválidos (padrão: cancela tudo)")
+        p.add_argument("--duplicados", choices=["ignorar", "erro"], default="ignorar",
+                       help="nomes repetidos ou já cadastrados: descartar (padrão) ou cancelar a importação")
+        return p
+
+    # ---------- culturas ----------
+    p_culturas = sub.add_parser("culturas", help="gerenciar culturas")
+    acoes = p_culturas.add_subparsers(dest="acao", required=True)
+
+    for nome, aliases in (("cadastrar", ["add"]), ("atualizar", ["update"])):
+        p = acoes.add_parser(nome, aliases=aliases)
+        if nome == "atualizar":
+            p.add_argument("chave", help="nome ou ID da cultura")
+        p.add_argument("--nome")
+        p.add_argument("--formato", choices=FORMATOS)
+        p.add_argument("--largura", type=float)
+        p.add_argument("--comprimento", type=float)
+        p.add_argument("--raio", type=float)
+        p.add_argument("--area", type=float, help="área total em m² (exige --formato)")
+        p.add_argument("--vertices", help='polígono em metros, JSON: "[[x,y],[x,y],...]"')
+        p.add_argument("--lonlat", help='polígono em longitude/latitude, JSON: "[[lon,lat],...]"')
+        p.add_argument("--faixas", type=int)
+    saida(acoes.add_parser("listar", aliases=["list"]))
+    p = consultar(acoes, "culturas")
+    p.add_argument("--formato", choices=FORMATOS)
+    for coluna, ajuda in (("area", "m²"), ("faixas", "quantidade"), ("area_faixa", "m² por faixa")):
+        p.add_argument(f"--{coluna.replace('_', '-')}", dest=coluna,
+                       help=f"valor ou faixa em {ajuda}: mínimo..máximo, mínimo.. ou ..máximo")
+    acoes.add_parser("deletar", aliases=["delete"]).add_argument("chave", help="nome ou ID da cultura")
+    importar(acoes, "culturas").add_argument("--faixas", type=int, help="faixas dos registros que não as informarem")
+
+    # ---------- insumos ----------
+    p_insumos = sub.add_parser("insumos", help="gerenciar insumos")
+    acoes = p_insumos.add_subparsers(dest="acao", required=True)
+
+    for nome, aliases in (("cadastrar", ["add"]), ("atualizar", ["update"])):
+        p = acoes.add_parser(nome, aliases=aliases)
+        if nome == "atualizar":
+            p.add_argument("chave", help="nome ou ID do insumo")
+        p.add_argument("--nome")
+        p.add_argument("--dose", dest="dose_m2", type=float, help="dose em L/m²")
+        if nome == "cadastrar":
+            p.add_argument("--estoque", type=float, help="estoque inicial em litros (padrão: 0)")
+    saida(acoes.add_parser("listar", aliases=["list"]))
+    p = consultar(acoes, "insumos")
+    p.add_argument("--dose", dest="dose_m2", help="valor ou faixa em L/m²: mínimo..máximo, mínimo.. ou ..máximo")
+    p.add_argument("--estoque", help="valor ou faixa em litros: mínimo..máximo, mínimo.. ou ..máximo")
+    acoes.add_parser("deletar", aliases=["delete"]).add_argument("chave", help="nome ou ID do insumo")
+    importar(acoes, "insumos")
+    p = acoes.add_parser("estoque", help="lançar entrada (ou saída, com valor negativo) no estoque")
+    p.add_argument("chave", help="nome ou ID do insumo")
+    p.add_argument("litros", type=float, help="litros a somar ao estoque")
+
+    # ---------- histórico de aplicações ----------
+    p_aplicacoes = sub.add_parser("aplicacoes", aliases=["historico"], help="histórico de aplicações e consumo")
+    acoes = p_aplicacoes.add_subparsers(dest="acao", required=True)
+    p = acoes.add_parser("registrar", aliases=["add"], help="registrar uma aplicação e baixar o estoque")
+    p.add_argument("--cultura", required=True, help="nome ou ID da cultura")
+    p.add_argument("--insumo", required=True, help="nome ou ID do insumo")
+    p.add_argument("--litros", type=float, help="litros aplicados (padrão: a quantidade calculada)")
+    p.add_argument("--data", help="AAAA-MM-DD (padrão: hoje)")
+    p.add_argument("--safra", help="ex.: 2025/2026 (padrão: a safra da data)")
+    for nome, aliases, ajuda in (
+        ("listar", ["list"], "listar as aplicações"),
+        ("consumo", [], "total aplicado (sem filtros, o total geral)"),
+    ):
+        p = acoes.add_parser(nome, aliases=aliases, help=ajuda)
+        p.add_argument("--cultura", help="nome ou ID da cultura")
+        p.add_argument("--insumo", help="nome ou ID do insumo")
+        p.add_argument("--safra", help="ex.: 2025/2026")
+        if nome == "listar":
+            saida(p)
+    p = acoes.add_parser("estornar", aliases=["deletar", "delete"], help="remover uma aplicação e devolver o estoque")
+    p.add_argument("chave", help="ID da aplicação")
+
+    # ---------- aplicação ----------
+    p = sub.add_parser("aplicar", aliases=["apply"],
+                       help="calcular a aplicação (sem --cultura/--insumo, todas as combinações)")
+    p.add_argument("--cultura", help="nome ou ID da cultura")
+    p.add_argument("--insumo", help="nome ou ID do insumo")
+    p.add_argument("--por-faixa", action="store_true",
+                   help="área e litros de cada faixa real do terreno (exige --cultura e --insumo)")
+    p.add_argument("--faixas", type=int, help="quantidade de faixas (padrão: a da cultura)")
+    p.add_argument("--largura-faixa", type=float, help="largura de cada faixa em metros (em vez de --faixas)")
+    p.add_argument("--rumo", type=float, default=0.0, help="direção das faixas em graus a partir do norte")
+    saida(p)
+
+    # ---------- missão (drone/pulverizador) ----------
+    p = sub.add_parser("missao", aliases=["mission"],
+                       help="ordem das faixas e reabastecimentos para um tanque de capacidade limitada")
+    p.add_argument("--cultura", required=True, help="nome ou ID da cultura")
+    p.add_argument("--insumo", required=True, help="nome ou ID do insumo")
+    p.add_argument("--tanque", type=float, required=True, help="capacidade do tanque em litros")
+    p.add_argument("--faixas", type=int, help="quantidade de faixas (padrão: a da cultura)")
+    p.add_argument("--largura-faixa", type=float, help="largura da barra (faixa) em metros (em vez de --faixas)")
+    p.add_argument("--rumo", type=float, default=0.0, help="direção das faixas em graus a partir do norte")
+    p.add_argument("--base", help="ponto de reabastecimento x,y em metros (padrão: canto sudoeste do terreno)")
+    saida(p)
+
+    # ---------- clima ----------
+    p = sub.add_parser("clima", aliases=["weather"],
+                       help="clima do local da fazenda e janela de pulverização (ver clima.py)")
+    p.add_argument("--local", help="latitude,longitude (padrão: FARMTECH_LOCAL)")
+    p.add_argument("--atualizar", action="store_true", help="consultar o provedor mesmo com leitura válida no cache")
+    p.add_argument("--saida", choices=["texto", "json"], default="texto", help="formato da saída (padrão: texto)")
+
+    # ---------- várias fazendas ----------
+    p_fazendas = sub.add_parser("fazendas", aliases=["farms"],
+                                help="criar e listar fazendas e consultar várias de uma vez (ver fazendas.py)")
+    acoes = p_fazendas.add_subparsers(dest="acao", required=True)
+
+    def escolher(p):
+        p.add_argument("--fazendas", help="nomes separados por vírgula (padrão: todas)")
+        p.add_argument("--trabalhadores", type=int, help="fazendas carregadas e consultadas em paralelo")
+        return p
+
+    saida(escolher(acoes.add_parser("listar", aliases=["list"], help="fazendas e quantidade de registros")))
+    acoes.add_parser("criar", aliases=["add"], help="criar uma fazenda (pasta dados/fazendas/<nome>)") \
+        .add_argument("nome", help="letras sem acento, números, - e _ (ex.: sitio-norte)")
+    p = escolher(consultar(acoes, "culturas ou insumos de várias fazendas"))
+    p.add_argument("colecao", choices=["culturas", "insumos"])
+    p.add_argument("--formato", choices=FORMATOS)
+    for coluna in ("area", "faixas", "area_faixa", "dose_m2", "estoque"):
+        p.add_argument(f"--{coluna.replace('_', '-').replace('-m2', '')}", dest=coluna,
+                       help="valor ou faixa: mínimo..máximo, mínimo.. ou ..máximo")
+    p = escolher(acoes.add_parser("aplicar", aliases=["apply"], help="calcular a aplicação em várias fazendas"))
+    p.add_argument("--cultura", help="nome da cultura (fazendas sem ela são puladas)")
+    p.add_argument("--insumo", help="nome do insumo (fazendas sem ele são puladas)")
+    saida(p)
+    p = escolher(acoes.add_parser("estatisticas", aliases=["stats"], help="estatísticas somadas de várias fazendas"))
+    p.add_argument("--saida", choices=["texto", "json"], default="texto", help="formato da saída (padrão: texto)")
+
+    # ---------- estatísticas ----------
+    p = sub.add_parser("estatisticas", aliases=["stats"],
+                       help="média, total, desvio, mínimo e máximo das culturas e insumos (como r/analise.r)")
+    p.add_argument("--saida", choices=["texto", "json"], default="texto", help="formato da saída (padrão: texto)")
+
+    # ---------- lote ----------
+    p = sub.add_parser("lote", aliases=["batch"], help="executar operações de um arquivo JSONL/CSV")
+    p.add_argument("arquivo", nargs="?", default="-", help="arquivo de operações (- = entrada padrão)")
+    p.add_argument("--tipo", choices=["jsonl", "csv"], help="formato do arquivo (padrão: pela extensão)")
+    p.add_argument("--parar-no-erro", action="store_true", help="interrompe na primeira operação inválida")
+
+    # ---------- exportação ----------
+    p = sub.add_parser("exportar", aliases=["export"],
+                       help="regravar os CSVs da pasta de dados (lidos pelo R) ou exportar em Arrow/Parquet")
+    p.add_argument("--formato", choices=["csv", *colunar.FORMATOS_COLUNARES], default="csv",
+                   help="csv (padrão), arrow (Arrow IPC, lido sem cópia pelo R) ou parquet (requer pyarrow)")
+    p.add_argument("--particionar", metavar="CATEGORIA",
+                   help="dividir em subpastas por uma categoria (ex.: formato das culturas, safra das aplicações)")
+    p.add_argument("--destino", help="pasta de destino do Arrow/Parquet (padrão: a pasta de dados)")
+
+    # ---------- serviço ----------
+    p = sub.add_parser("servir", aliases=["serve"], help="iniciar o serviço HTTP/JSON (ver servico.py)")
+    p.add_argument("--host", default="127.0.0.1")
+    p.add_argument("--porta", type=int, default=8080)
+    p.add_argument("--trabalhadores", type=int, default=16, help="threads de atendimento")
+
+    return parser
+
+
+def _executar_fazendas(fazendas, args, saida):
+    """Subcomandos de "fazendas": criar, listar e as consultas distribuídas entre as fazendas."""
+    acao = {"list": "listar", "add": "criar", "query": "consultar", "apply": "aplicar", "stats": "estatisticas"}.get(
+        args.acao, args.acao
+    )
+    if acao == "criar":
+        fazenda = fazendas.criar(args.nome)
+        sys.stderr.write(f"✅ Fazenda {fazenda.nome} criada em {fazenda.dados_dir}\n")
+        return 0
+
+    if args.trabalhadores:
+        fazendas.trabalhadores = args.trabalhadores
+    nomes = None if not args.fazendas else [n for n in args.fazendas.split(",") if n.strip()]
+
+    if acao == "listar":
+        carregadas = fazendas.carregar(nomes)
+        linhas = [(f.nome, len(f.culturas), len(f.insumos), len(f.aplicacoes), f.dados_dir) for f in carregadas]
+        _escrever_tabela(["fazenda", "culturas", "insumos", "aplicacoes", "pasta"], linhas, args.saida, saida)
+        return 0
+    if acao == "consultar":
+        campos = ("prefixo", "ordenar", "limite", "formato", "area", "faixas", "area_faixa", "dose_m2", "estoque")
+        parametros = {c: getattr(args, c) for c in campos}
+        if args.decrescente:
+            parametros["ordenar"] = "-" + (args.ordenar or "id")
+        resultado = modulo_fazendas.consultar(fazendas, args.colecao, parametros, nomes)
+        tabela = TabelaCulturas if args.colecao == "culturas" else TabelaInsumos
+        colunas = ["fazenda", "id", *(c for c, _ in tabela.ESQUEMA)]
+        linhas = ((nome, *(registro[c] for c in colunas[1:])) for nome, registro in resultado)
+        _escrever_tabela(colunas, linhas, args.saida, saida)
+        return 0
+    if acao == "aplicar":
+        linhas = [
+            (fazenda, cultura, insumo, round(total, 4), round(por_faixa, 4))
+            for fazenda, cultura, insumo, total, por_faixa
+            in modulo_fazendas.aplicar(fazendas, args.cultura, args.insumo, nomes)
+        ]
+        _escrever_tabela(["fazenda", "cultura", "insumo", "total_litros", "litros_por_faixa"], linhas, args.saida, saida)
+        sys.stderr.write(f"✅ {sum(linha[3] for linha in linhas):.2f} litros em {len(linhas)} combinação(ões).\n")
+        return 0
+
+    resultado = modulo_fazendas.estatisticas(fazendas, nomes)
+    if args.saida == "json":
+        saida.write(json.dumps(resultado, ensure_ascii=False) + "\n")
+        return 0
+    linhas = [
+        [colecao, coluna, *resumo.values()] for colecao, colunas in resultado.items() for coluna, resumo in colunas.items()
+    ]
+    _escrever_tabela(["colecao", "coluna", "quantidade", "soma", "media", "desvio", "minimo", "maximo"],
+                     linhas, "texto", saida)
+    return 0
+
+
+def main(argv, culturas, insumos, diario, saida=sys.stdout, fazendas=None):
+    """
+    Executa o modo linha de comando sobre as coleções já carregadas. Retorna o código de saída.
+    fazendas (ver fazendas.py) é usado pelos subcomandos "fazendas"; sem ele, vale a pasta de dados do diario.
+    """
+    args = _criar_parser().parse_args(argv)
+    comando = {
+        "apply": "aplicar", "batch": "lote", "serve": "servir", "historico": "aplicacoes", "export": "exportar",
+        "mission": "missao", "weather": "clima", "stats": "estatisticas", "farms": "fazendas",
+    }.get(args.comando, args.comando)
+
+    try:
+        if comando == "fazendas":
+            fazendas = fazendas or modulo_fazendas.Fazendas(diario.dados_dir)
+            return _executar_fazendas(fazendas, args, saida)
+
+        if comando == "aplicar" and args.por_faixa:
+            cultura, insumo, faixas = operacoes.aplicar_por_faixa(
+                culturas, insumos, args.cultura, args.insumo,
+                {"faixas": args.faixas, "largura": args.largura_faixa, "rumo": args.rumo},
+            )
+            _escrever_faixas(cultura, insumo, faixas, args.saida, saida)
+            _avisar_clima(diario)
+            return 0
+        if comando == "aplicar":
+            matriz = operacoes.aplicar(culturas, insumos, args.cultura, args.insumo)
+            _escrever_matriz(matriz, culturas, insumos, args.saida, saida)
+            _avisar_clima(diario)
+            return 0
+
+        if comando == "missao":
+            plano = operacoes.planejar_missao(culturas, insumos, args.cultura, args.insumo, {
+                "tanque": args.tanque, "faixas": args.faixas, "largura": args.largura_faixa,
+                "rumo": args.rumo, "base": args.base,
+            })
+            _escrever_missao(plano, args.saida, saida)
+            sys.stderr.write(
+                f"✅ {plano.litros:.2f} litros, {plano.reabastecimentos} reabastecimento(s), "
+                f"{plano.deslocamento:.0f} m sem aplicar (ordem simples: {plano.deslocamento_simples:.0f} m) "
+                f"e {plano.aplicando:.0f} m aplicando.\n"
+            )
+            _avisar_clima(diario)
+            return 0
+
+        if comando == "clima":
+            resultado = clima.clima_da_aplicacao(diario.dados_dir, args.local, args.atualizar)
+            if resultado is None:
+                raise ErroOperacao(
+                    "Nenhum provedor de clima configurado: defina FARMTECH_OPENWEATHER_CHAVE "
+                    f"ou crie {clima.ARQUIVO_OFFLINE} na pasta de dados (ver clima.py)."
+                )
+            if args.saida == "json":
+                saida.write(json.dumps(resultado, ensure_ascii=False) + "\n")
+            else:
+                saida.write(clima.resumo(resultado) + "\n")
+            return 1 if "erro" in resultado else 0
+
+        if comando == "estatisticas":
+            resultado = operacoes.estatisticas(culturas, insumos)
+            if args.saida == "json":
+                saida.write(json.dumps(resultado, ensure_ascii=False) + "\n")
+                return 0
+            writer = csv.writer(saida, delimiter="\t", lineterminator="\n")
+            writer.writerow(["colecao", "coluna", "quantidade", "soma", "media", "desvio", "minimo", "maximo"])
+            for colecao, colunas in resultado.items():
+                for coluna, resumo in colunas.items():
+                    writer.writerow([colecao, coluna, *resumo.values()])
+            return 0
+
+        if comando == "exportar" and args.formato != "csv":
+            gravados = colunar.exportar_colunar(
+                diario.colecoes, args.destino or diario.dados_dir, args.formato, args.particionar,
+            )
+            for caminho, registros in gravados.values():
+                sys.stderr.write(f"✅ {registros} registro(s) em {caminho}\n")
+            return 0
+        if comando == "exportar":
+            diario.compactar()
+            sys.stderr.write("✅ CSVs regravados.\n")
+            return 0
+
+        if comando == "servir":
+            import servico  # só carrega o módulo HTTP quando necessário
+            servico.servir(culturas, insumos, diario, args.host, args.porta, args.trabalhadores)
+            return 0
+
+        if comando == "lote":
+            tipo = args.tipo or ("csv" if args.arquivo.endswith(".csv") else "jsonl")
+            if args.arquivo == "-":
+                sucessos, falhas = executar_lote(culturas, insumos, diario, sys.stdin, tipo, args.parar_no_erro)
+            else:
+                with open(args.arquivo, "r", newline="", encoding="utf-8") as arquivo:
+                    sucessos, falhas = executar_lote(culturas, insumos, diario, arquivo, tipo, args.parar_no_erro)
+            sys.stderr.write(f"✅ {sucessos} operação(ões) concluída(s), {falhas} com erro.\n")
+            return 1 if falhas else 0
+
+        acao = ACOES[args.acao]
+        if comando == "aplicacoes" and acao in ("listar", "consumo"):
+            aplicacoes = diario.colecoes["aplicacoes"]
+            if acao == "consumo":
+                resultado = operacoes.consumo(culturas, insumos, aplicacoes, args.cultura, args.insumo, args.safra)
+                saida.write(json.dumps(resultado, ensure_ascii=False) + "\n")
+            else:
+                _escrever_aplicacoes(culturas, insumos, aplicacoes, args, saida)
+            return 0
+        registros = {"culturas": culturas, "insumos": insumos}.get(comando)
+        if acao == "importar":
+            resumo = importacao.importar(
+                registros, diario, args.arquivo, comando, args.tipo,
+                {"faixas": getattr(args, "faixas", None)}, args.trabalhadores,
+                args.ignorar_invalidos, args.duplicados,
+            )
+            for numero, mensagem in resumo["erros"][:20]:
+                sys.stderr.write(f"⚠️  Item {numero}: {mensagem}\n")
+            sys.stderr.write(
+                f"✅ {len(resumo['ids'])} registro(s) importado(s), {len(resumo['repetidos'])} repetido(s) "
+                f"descartado(s), {len(resumo['erros'])} inválido(s).\n"
+            )
+            return 0
+        if acao == "listar":
+            colunas = ["id", *registros.colunas]
+            _escrever_registros(registros, colunas, args.saida, saida)
+            return 0
+        if acao == "consultar":
+            campos = ("prefixo", "ordenar", "limite", *(c for c in registros.INDICES_ORDENADOS if c != "nome"))
+            parametros = {c: getattr(args, c) for c in campos}
+            if args.decrescente:
+                parametros["ordenar"] = "-" + (args.ordenar or "id")
+            resultado = consulta.consultar(registros, **consulta.ler_consulta(registros, parametros))
+            _escrever_registros(resultado, ["id", *registros.colunas], args.saida, saida)
+            return 0
+
+        campos = {"culturas": CAMPOS_CULTURA, "insumos": CAMPOS_INSUMO, "aplicacoes": CAMPOS_APLICACAO}[comando]
+        operacao = {"colecao": comando, "acao": acao, "chave": getattr(args, "chave", None)}
+        if acao == "estoque":
+            operacao["litros"] = args.litros
+        operacao.update({c: getattr(args, c, None) for c in campos})
+        with diario.em_lote():
+            resultado = executar_operacao(culturas, insumos, diario, operacao)
+        saida.write(json.dumps(dict(resultado), ensure_ascii=False) + "\n")
+        return 0
+
+    except (ValueError, KeyError, OSError) as erro:
+        sys.stderr.write(f"⚠️  {erro}\n")
+        return 1
@@ -0,0 +1,227 @@
+# -*- coding: utf-8 -*-
+"""
+FarmTech - Métricas de desempenho
+Descrição: Contadores e histogramas de latência das operações principais
+(carregar, salvar, fsync, buscas, cálculo de aplicação), exportáveis em JSON
+ou no formato texto do Prometheus, e captura opcional com cProfile.
+
+Variáveis de ambiente:
+    FARMTECH_METRICAS=1                 liga a coleta (desligada não custa nada)
+    FARMTECH_METRICAS_ARQUIVO=m.prom    grava as métricas ao sair (.json ou .prom;
+                                        sem arquivo, vão para a saída de erro)
+    FARMTECH_PERFIL=perfil.prof         grava um perfil cProfile da execução
+                                        (ver com: python -m pstats perfil.prof)
+"""
+
+import atexit
+import cProfile
+import functools
+import json
+import os
+import sys
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager, nullcontext
+
+# ===========================
+# CONFIGURAÇÃO
+# ===========================
+
+ATIVO = os.environ.get("FARMTECH_METRICAS", "0") not in ("", "0")
+ARQUIVO = os.environ.get("FARMTECH_METRICAS_ARQUIVO")
+PERFIL = os.environ.get("FARMTECH_PERFIL")
+
+# Limites superiores (em segundos) dos baldes dos histogramas
+LIMITES = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0)
+
+_trava = threading.Lock()
+_contadores = {}   # (nome, rótulos) -> valor
+_histogramas = {}  # (nome, rótulos) -> Histograma
+_perfil = None
+_iniciado = False
+
+# ===========================
+# COLETA
+# ===========================
+
+class Histograma:
+    """Distribuição de durações em baldes fixos (LIMITES), com soma e quantidade."""
+
+    __slots__ = ("baldes", "soma", "quantidade")
+
+    def __init__(self):
+        self.baldes = [0] * (len(LIMITES) + 1)  # o último é "acima do maior limite"
+        self.soma = 0.0
+        self.quantidade = 0
+
+    def observar(self, valor):
+        self.baldes[bisect_left(LIMITES, valor)] += 1
+        self.soma += valor
+        self.quantidade += 1
+
+
+def _chave(nome, rotulos):
+    return nome, tuple(sorted(rotulos.items()))
+
+
+def contar(nome, valor=1, **rotulos):
+    """Soma valor ao contador nome (ex.: contar("bytes_gravados", 1024, arquivo="csv"))."""
+    if not ATIVO:
+        return
+    chave = _chave(nome, rotulos)
+    with _trava:
+        _contadores[chave] = _contadores.get(chave, 0) + valor
+
+
+def observar(nome, segundos, **rotulos):
+    """Registra uma duração no histograma nome."""
+    if not ATIVO:
+        return
+    chave = _chave(nome, rotulos)
+    with _trava:
+        histograma = _histogramas.get(chave)
+        if histograma is None:
+            histograma = _histogramas[chave] = Histograma()
+        histograma.observar(segundos)
+
+
+@contextmanager
+def _medir(nome, rotulos):
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        observar(nome, time.perf_counter() - inicio, **rotulos)
+
+
+def medir(nome, **rotulos):
+    """Bloco with que registra sua duração no histograma nome."""
+    if not ATIVO:
+        return nullcontext()
+    return _medir(nome, rotulos)
+
+
+def cronometrado(nome):
+    """
+    Decorador que registra a duração de cada chamada no histograma nome.
+    Com as métricas desligadas devolve a própria função (sem custo algum).
+    """
+    def decorador(funcao):
+        if not ATIVO:
+            return funcao
+
+        @functools.wraps(funcao)
+        def medida(*args, **kwargs):
+            inicio = time.perf_counter()
+            try:
+                return funcao(*args, **kwargs)
+            finally:
+                observar(nome, time.perf_counter() - inicio)
+
+        return medida
+    return decorador
+
+
+def zerar():
+    with _trava:
+        _contadores.clear()
+        _histogramas.clear()
+
+# ===========================
+# EXPORTAÇÃO
+# ===========================
+
+def instantaneo():
+    """Cópia das métricas atuais em estruturas simples (listas e dicionários)."""
+    with _trava:
+        contadores = [
+            {"nome": nome, "rotulos": dict(rotulos), "valor": valor}
+            for (nome, rotulos), valor in sorted(_contadores.items())
+        ]
+        histogramas = [
+            {
+                "nome": nome,
+                "rotulos": dict(rotulos),
+                "limites": list(LIMITES),
+                "baldes": list(h.baldes),
+                "soma": h.soma,
+                "quantidade": h.quantidade,
+            }
+            for (nome, rotulos), h in sorted(_histogramas.items())
+        ]
+    return {"contadores": contadores, "histogramas": histogramas}
+
+
+def como_json():
+    return json.dumps(instantaneo(), ensure_ascii=False, indent=2)
+
+
+def _rotulos_prometheus(rotulos, extra=()):
+    pares = [*rotulos.items(), *extra]
+    if not pares:
+        return ""
+    return "{" + ",".join(f'{c}="{v}"' for c, v in pares) + "}"
+
+
+def como_prometheus():
+    """Métricas no formato texto do Prometheus (contadores *_total e histogramas *_segundos)."""
+    dados = instantaneo()
+    linhas, tipos = [], set()
+
+    for c in dados["contadores"]:
+        nome = f"farmtech_{c['nome']}_total"
+        if nome not in tipos:
+            tipos.add(nome)
+            linhas.append(f"# TYPE {nome} counter")
+        linhas.append(f"{nome}{_rotulos_prometheus(c['rotulos'])} {c['valor']}")
+
+    for h in dados["histogramas"]:
+        nome = f"farmtech_{h['nome']}_segundos"
+        if nome not in tipos:
+            tipos.add(nome)
+            linhas.append(f"# TYPE {nome} histogram")
+        acumulado = 0
+        for limite, quantidade in zip([*h["limites"], "+Inf"], h["baldes"]):
+            acumulado += quantidade
+            linhas.append(f"{nome}_bucket{_rotulos_prometheus(h['rotulos'], [('le', limite)])} {acumulado}")
+        linhas.append(f"{nome}_sum{_rotulos_prometheus(h['rotulos'])} {h['soma']}")
+        linhas.append(f"{nome}_count{_rotulos_prometheus(h['rotulos'])} {h['quantidade']}")
+
+    return "\n".join(linhas) + "\n"
+
+
+def despejar(caminho=None):
+    """Grava as métricas em caminho (.json ou texto Prometheus) ou na saída de erro."""
+    if caminho is None:
+        sys.stderr.write(como_prometheus())
+        return
+    conteudo = como_json() if caminho.endswith(".json") else como_prometheus()
+    with open(caminho, "w", encoding="utf-8") as f:
+        f.write(conteudo)
+
+# ===========================
+# INÍCIO E FIM DA EXECUÇÃO
+# ===========================
+
+def iniciar():
+    """Liga o cProfile (se FARMTECH_PERFIL) e agenda a gravação das métricas ao sair."""
+    global _perfil, _iniciado
+    if _iniciado:
+        return
+    _iniciado = True
+    if PERFIL:
+        _perfil = cProfile.Profile()
+        _perfil.enable()
+    if ATIVO or PERFIL:
+        atexit.register(encerrar)
+
+
+def encerrar():
+    global _perfil
+    if _perfil is not None:
+        _perfil.disable()
+        _perfil.dump_stats(PERFIL)
+        _perfil = None
+    if ATIVO:
+        despejar(ARQUIVO)
@@ -0,0 +1,356 @@
+# -*- coding: utf-8 -*-
+"""
+FarmTech - Planejamento de missões de aplicação
+Descrição: Ordena as faixas de uma cultura para um drone ou pulverizador com
+tanque e largura de barra limitados: em que ordem e em que sentido percorrer
+cada faixa e quando voltar ao ponto de reabastecimento (base), com o menor
+deslocamento sem aplicar (idas e voltas à base e manobras entre faixas).
+
+Faixas que gastam mais que um tanque são divididas em trechos. A ordem é
+montada pelo vizinho mais próximo e melhorada com 2-opt sobre listas de
+vizinhos; depois os reabastecimentos são posicionados de forma ótima para
+essa ordem, por programação dinâmica. Milhares de faixas levam frações de
+segundo.
+"""
+
+import math
+from bisect import bisect_left
+from collections import deque
+
+import metricas
+from aplicacao import cache
+from geometria import eixos_faixas_circulo, eixos_faixas_poligono, geometria_retangulo, ler_geometria
+
+# Trechos vizinhos (pela posição das faixas) examinados pelo 2-opt para cada trecho
+VIZINHOS_2OPT = 8
+
+# Limite de passadas do 2-opt (cada passada só aceita trocas que encurtam o percurso)
+PASSADAS_2OPT = 25
+
+# ===========================
+# TRECHOS A PERCORRER
+# ===========================
+
+def _eixos(cultura, quantidade, largura, rumo):
+    """Eixos das faixas da cultura e a base padrão (canto sudoeste do terreno)."""
+    if cultura["formato"] == "circular":
+        raio = math.sqrt(cultura["area"] / math.pi)
+        return eixos_faixas_circulo(raio, quantidade, largura, rumo), (-raio, -raio)
+    poligonos = ler_geometria(cultura["geometria"])
+    if not poligonos:
+        # Sem contorno, como em areas_das_faixas: um quadrado de mesma área
+        lado = math.sqrt(cultura["area"])
+        poligonos = geometria_retangulo(lado, lado)
+    pontos = [p for poligono in poligonos for p in poligono[0]]
+    base = (min(x for x, _ in pontos), min(y for _, y in pontos))
+    return eixos_faixas_poligono(poligonos, quantidade, largura, rumo), base
+
+
+def _dividir(eixos, areas, dose, capacidade):
+    """
+    Trechos (faixa, parte, início, fim, litros): cada faixa vira tantas partes
+    iguais quantas forem precisas para que nenhuma passe de um tanque.
+    """
+    trechos = []
+    for numero, (eixo, area) in enumerate(zip(eixos, areas), start=1):
+        if eixo is None or area <= 0:
+            continue
+        litros = area * dose
+        partes = max(1, math.ceil(litros / capacidade - 1e-9))
+        (x0, y0), (x1, y1) = eixo
+        for parte in range(partes):
+            t0, t1 = parte / partes, (parte + 1) / partes
+            trechos.append((
+                numero, parte + 1,
+                (x0 + (x1 - x0) * t0, y0 + (y1 - y0) * t0),
+                (x0 + (x1 - x0) * t1, y0 + (y1 - y0) * t1),
+                litros / partes,
+            ))
+    return trechos
+
+# ===========================
+# ORDEM DOS TRECHOS
+# ===========================
+
+def _raiz(pais, i):
+    """Primeira posição livre a partir de i (conjuntos disjuntos com compressão de caminho)."""
+    raiz = i
+    while pais[raiz] != raiz:
+        raiz = pais[raiz]
+    while pais[i] != raiz:
+        pais[i], i = raiz, pais[i]
+    return raiz
+
+
+def _vizinho_mais_proximo(inicios, fins, posicoes, base, deslocamento):
+    """
+    Ordem inicial: a partir da base, sempre o trecho (e o sentido) mais
+    próximo do ponto atual. Todos os trechos são paralelos, então a distância
+    entre as posições das faixas (deslocamento) é um limite inferior da
+    distância real: a busca anda para os dois lados, em ordem de posição, e
+    para assim que esse limite passa da melhor distância achada.
+    Devolve [(trecho, invertido)].
+    """
+    n = len(inicios)
+    ordem = sorted(range(n), key=posicoes.__getitem__)
+    valores = [posicoes[k] for k in ordem]
+    lugar = {k: i for i, k in enumerate(ordem)}
+    direita = list(range(n + 1))  # posição n: sentinela
+    esquerda = list(range(n + 1))  # índice i + 1 representa a posição i; 0: sentinela
+
+    percurso, atual, referencia = [], base, deslocamento(base)
+    for _ in range(n):
+        meio = bisect_left(valores, referencia)
+        d = _raiz(direita, meio)
+        e = _raiz(esquerda, meio) - 1
+        melhor, escolhido = math.inf, None
+        while True:
+            folga_d = valores[d] - referencia if d < n else math.inf
+            folga_e = referencia - valores[e] if e >= 0 else math.inf
+            if min(folga_d, folga_e) >= melhor:
+                break
+            if folga_d <= folga_e:
+                i, d = d, _raiz(direita, d + 1)
+            else:
+                i, e = e, _raiz(esquerda, e) - 1
+            k = ordem[i]
+            for invertido, ponto in ((False, inicios[k]), (True, fins[k])):
+                distancia = math.dist(atual, ponto)
+                if distancia < melhor:
+                    melhor, escolhido = distancia, (k, invertido)
+        k, invertido = escolhido
+        i = lugar[k]
+        direita[i] = i + 1
+        esquerda[i + 1] = i
+        percurso.append(escolhido)
+        atual, referencia = (inicios[k] if invertido else fins[k]), posicoes[k]
+    return percurso
+
+
+def _vizinhos(inicios, fins, posicoes, base):
+    """
+    Para cada trecho (e para a base, no índice n), os trechos mais próximos,
+    pela distância entre os pontos médios, entre os vizinhos em posição.
+    """
+    n = len(inicios)
+    ordem = sorted(range(n), key=posicoes.__getitem__)
+    meios = [((x0 + x1) / 2, (y0 + y1) / 2) for (x0, y0), (x1, y1) in zip(inicios, fins)]
+    janela = VIZINHOS_2OPT
+    vizinhos = [None] * n
+    for i, k in enumerate(ordem):
+        meio = meios[k]
+        candidatos = ordem[max(0, i - janela):i] + ordem[i + 1:i + 1 + janela]
+        candidatos.sort(key=lambda c: math.dist(meio, meios[c]))
+        vizinhos[k] = candidatos[:VIZINHOS_2OPT]
+    perto_da_base = sorted(range(n), key=lambda c: min(math.dist(base, inicios[c]), math.dist(base, fins[c])))
+    return vizinhos + [perto_da_base[:VIZINHOS_2OPT]]
+
+
+def _dois_opt(percurso, inicios, fins, posicoes, base):
+    """
+    Melhora a ordem com 2-opt: troca dois deslocamentos a→b e c→d por a→c e
+    b→d invertendo (ordem e sentido) os trechos entre b e c, só quando isso
+    encurta o percurso. Cada trecho só é testado com seus vizinhos próximos.
+    A ordem começa e termina na base (índices n e n + 1).
+    """
+    n = len(inicios)
+    invertido = [False] * n
+    for k, sentido in percurso:
+        invertido[k] = sentido
+    # Ponto de entrada e de saída de cada trecho no sentido atual (por índice do trecho)
+    entrada = [fins[k] if invertido[k] else inicios[k] for k in range(n)] + [base, base]
+    saida = [inicios[k] if invertido[k] else fins[k] for k in range(n)] + [base, base]
+    rota = [n] + [k for k, _ in percurso] + [n + 1]
+
+    vizinhos = _vizinhos(inicios, fins, posicoes, base)
+    lugar = [0] * (n + 2)
+    for i, k in enumerate(rota):
+        lugar[k] = i
+
+    for _ in range(PASSADAS_2OPT):
+        melhorou = False
+        for p in range(len(rota) - 1):
+            for c in vizinhos[rota[p]]:
+                q = lugar[c]
+                i, j = (p, q) if p < q else (q, p)
+                if j <= i or j >= len(rota) - 1:
+                    continue
+                a, b, c_, d = rota[i], rota[i + 1], rota[j], rota[j + 1]
+                ganho = (math.dist(saida[a], entrada[b]) + math.dist(saida[c_], entrada[d])
+                         - math.dist(saida[a], saida[c_]) - math.dist(entrada[b], entrada[d]))
+                if ganho <= 1e-9:
+                    continue
+                rota[i + 1:j + 1] = rota[j:i:-1]
+                for posicao in range(i + 1, j + 1):
+                    k = rota[posicao]
+                    lugar[k] = posicao
+                    entrada[k], saida[k] = saida[k], entrada[k]
+                    invertido[k] = not invertido[k]
+                melhorou = True
+                break
+        if not melhorou:
+            break
+    return [(k, invertido[k]) for k in rota[1:-1]]
+
+
+def _reabastecimentos(percurso, inicios, fins, litros, base, capacidade):
+    """
+    Antes de quais posições do percurso voltar à base, com o menor desvio
+    total e sem que o tanque falte entre duas paradas (programação dinâmica
+    sobre as posições, com janela deslizante: O(n)).
+    """
+    m = len(percurso)
+    entrada = [fins[k] if inv else inicios[k] for k, inv in percurso]
+    saida = [inicios[k] if inv else fins[k] for k, inv in percurso]
+    gasto = [litros[k] for k, _ in percurso]
+
+    # custo[j]: menor desvio até a posição j, reabastecendo logo antes dela (j = 0: saída da base)
+    custo, anterior = [0.0] + [math.inf] * m, [None] * (m + 1)
+    janela = deque([0])  # candidatos a última parada, com custo crescente
+    inicio_janela, acumulado = 0, 0.0  # litros de inicio_janela até j - 1
+    for j in range(1, m + 1):
+        acumulado += gasto[j - 1]
+        while acumulado > capacidade * (1 + 1e-9):
+            acumulado -= gasto[inicio_janela]
+            inicio_janela += 1
+            while janela and janela[0] < inicio_janela:
+                janela.popleft()
+        if j == m:
+            break
+        desvio = (math.dist(saida[j - 1], base) + math.dist(base, entrada[j])
+                  - math.dist(saida[j - 1], entrada[j]))
+        custo[j], anterior[j] = custo[janela[0]] + desvio, janela[0]
+        while janela and custo[janela[-1]] >= custo[j]:
+            janela.pop()
+        janela.append(j)
+
+    paradas, j = [], janela[0]
+    while j:
+        paradas.append(j)
+        j = anterior[j]
+    return set(paradas)
+
+# ===========================
+# MISSÃO
+# ===========================
+
+class Missao:
+    """
+    Plano de aplicação: etapas em ordem, de e para a base.
+
+    Cada etapa é (tipo, faixa, parte, início, fim, litros, tanque): tipo
+    "aplicar" percorre o trecho da faixa de início a fim gastando litros;
+    "reabastecer" vai do fim do trecho anterior à base e enche o tanque.
+    tanque é o que sobra depois da etapa. Distâncias em metros.
+    """
+
+    def __init__(self, cultura, insumo, capacidade, base, etapas, deslocamento_simples):
+        self.cultura = cultura
+        self.insumo = insumo
+        self.capacidade = capacidade
+        self.base = base
+        self.etapas = etapas
+        aplicacoes = [e for e in etapas if e[0] == "aplicar"]
+        self.litros = sum(e[5] for e in aplicacoes)
+        self.reabastecimentos = len(etapas) - len(aplicacoes)
+        self.aplicando = sum(math.dist(e[3], e[4]) for e in aplicacoes)
+        # Deslocamento sem aplicar: entre trechos e até a base (paradas incluídas)
+        self.deslocamento = self._deslocamento(base, etapas)
+        # O mesmo para a ordem simples (faixa 1, 2, 3... em vaivém), para comparação
+        self.deslocamento_simples = deslocamento_simples
+        self.percurso_total = self.deslocamento + self.aplicando
+
+    @staticmethod
+    def _deslocamento(base, etapas):
+        total, atual = 0.0, base
+        for tipo, _, _, inicio, fim, _, _ in etapas:
+            if tipo == "reabastecer":
+                total += math.dist(atual, base)
+                atual = base
+            else:
+                total += math.dist(atual, inicio)
+                atual = fim
+        return total + math.dist(atual, base)
+
+    def linhas(self):
+        """Itera (ordem, tipo, faixa, parte, x0, y0, x1, y1, litros, tanque) para tabelas e CSVs."""
+        for ordem, (tipo, faixa, parte, inicio, fim, litros, tanque) in enumerate(self.etapas, start=1):
+            yield (ordem, tipo, faixa, parte, *inicio, *fim, litros, tanque)
+
+
+def _etapas(percurso, trechos, paradas, base, capacidade):
+    etapas, tanque = [], capacidade
+    for posicao, (k, invertido) in enumerate(percurso):
+        faixa, parte, inicio, fim, litros = trechos[k]
+        if posicao in paradas:
+            tanque = capacidade
+            etapas.append(("reabastecer", None, None, base, base, 0.0, tanque))
+        if invertido:
+            inicio, fim = fim, inicio
+        tanque -= litros
+        etapas.append(("aplicar", faixa, parte, inicio, fim, litros, max(0.0, tanque)))
+    return etapas
+
+
+def _percurso_simples(trechos, capacidade):
+    """Faixas em ordem, em vaivém, voltando à base só quando o próximo trecho não cabe no tanque."""
+    por_faixa = {}
+    for k, trecho in enumerate(trechos):
+        por_faixa.setdefault(trecho[0], []).append(k)
+    percurso = []
+    for numero, ks in enumerate(por_faixa.values()):
+        invertido = numero % 2 == 1
+        percurso.extend((k, invertido) for k in (reversed(ks) if invertido else ks))
+    paradas, tanque = set(), capacidade
+    for posicao, (k, _) in enumerate(percurso):
+        if trechos[k][4] > tanque * (1 + 1e-9):
+            paradas.add(posicao)
+            tanque = capacidade
+        tanque -= trechos[k][4]
+    return percurso, paradas
+
+
+@metricas.cronometrado("planejar_missao")
+def planejar_missao(cultura, insumo, capacidade, quantidade=None, largura=None, rumo=0.0, base=None):
+    """
+    Planeja a aplicação do insumo na cultura com um tanque de capacidade
+    litros. As faixas são as de areas_das_faixas (quantidade ou largura da
+    barra em metros, e rumo em graus); base é o ponto de reabastecimento em
+    metros no sistema do contorno da cultura (padrão: o canto sudoeste; no
+    pivô, cujo centro é a origem, o canto do quadrado que o contém).
+    Devolve uma Missao.
+    """
+    if capacidade <= 0:
+        raise ValueError("A capacidade do tanque deve ser maior que zero.")
+    if quantidade is None and largura is None:
+        quantidade = cultura["faixas"]
+    eixos, base_padrao = _eixos(cultura, quantidade, largura, rumo)
+    base = tuple(base) if base is not None else base_padrao
+    areas = cache.areas_das_faixas(cultura, quantidade, largura, rumo)
+    trechos = _dividir(eixos, areas, insumo["dose_m2"], capacidade)
+
+    inicios = [t[2] for t in trechos]
+    fins = [t[3] for t in trechos]
+    litros = [t[4] for t in trechos]
+    angulo = math.radians(rumo)
+    cosseno, seno = math.cos(angulo), math.sin(angulo)
+
+    def deslocamento(ponto):
+        # Posição perpendicular às faixas (a mesma coordenada girada de faixas_poligono)
+        return ponto[0] * cosseno - ponto[1] * seno
+
+    posicoes = [deslocamento(p) for p in inicios]
+    simples, paradas_simples = _percurso_simples(trechos, capacidade)
+    if trechos:
+        percurso = _vizinho_mais_proximo(inicios, fins, posicoes, base, deslocamento)
+        percurso = _dois_opt(percurso, inicios, fins, posicoes, base)
+        paradas = _reabastecimentos(percurso, inicios, fins, litros, base, capacidade)
+    else:
+        percurso, paradas = [], set()
+
+    etapas = _etapas(percurso, trechos, paradas, base, capacidade)
+    etapas_simples = _etapas(simples, trechos, paradas_simples, base, capacidade)
+    referencia = Missao._deslocamento(base, etapas_simples)
+    if referencia < Missao._deslocamento(base, etapas):
+        etapas = etapas_simples  # terreno em que o vaivém já é o melhor percurso
+    return Missao(cultura, insumo, capacidade, base, etapas, referencia)
@@ -0,0 +1,473 @@
+# -*- coding: utf-8 -*-
+"""
+FarmTech - Operações sem interação
+Descrição: Cadastro, atualização, exclusão e aplicação de insumos a partir de
+dicionários de parâmetros, para uso pela linha de comando e por outros módulos
+(o menu interativo continua fazendo suas próprias perguntas).
+
+Cada alteração roda em diario.transacao(): a pasta de dados fica travada e o
+registro é localizado já com o que outros processos gravaram.
+"""
+
+import json
+import math
+import os
+from datetime import date
+
+import missao
+from aplicacao import cache, calcular_matriz
+from armazem import FORMATOS
+from geometria import (
+    area_circulo,
+    area_retangulo,
+    areas_geometrias,
+    geometria_de_geojson,
+    geometria_de_lonlat,
+    geometria_de_vertices,
+    geometria_retangulo,
+    gravar_geometria,
+)
+
+# Mês (1 a 12) em que começa a safra agrícola; com 1, a safra é o ano civil
+MES_INICIO_SAFRA = int(os.environ.get("FARMTECH_INICIO_SAFRA", "7"))
+
+# ===========================
+# ERROS E VALIDAÇÃO
+# ===========================
+
+class ErroOperacao(ValueError):
+    """Parâmetros inválidos em uma operação."""
+
+
+class RegistroNaoEncontrado(ErroOperacao):
+    """O nome ou ID informado não corresponde a nenhum registro."""
+
+
+def _vazio(valor):
+    return valor is None or (isinstance(valor, str) and valor.strip() == "")
+
+
+def _numero(dados, campo, tipo=float, minimo=0):
+    """Lê um campo numérico opcional, validando tipo, valor finito e valor mínimo."""
+    valor = dados.get(campo)
+    if _vazio(valor):
+        return None
+    try:
+        valor = tipo(valor)
+    except (TypeError, ValueError, OverflowError):
+        raise ErroOperacao(f"Valor inválido para '{campo}': {valor!r}.") from None
+    # nan e inf passariam pela comparação com o mínimo (nan < 0 é falso)
+    if isinstance(valor, float) and not math.isfinite(valor):
+        raise ErroOperacao(f"Valor inválido para '{campo}': {valor!r} (informe um número finito).")
+    if valor < minimo:
+        raise ErroOperacao(f"'{campo}' deve ser maior ou igual a {minimo}.")
+    return valor
+
+
+def _nome(dados):
+    nome = dados.get("nome")
+    if _vazio(nome):
+        return None
+    return " ".join(str(nome).split())
+
+
+def _pontos(dados, campo):
+    """Lê uma lista de vértices [[x, y], ...] (lista ou texto JSON) opcional."""
+    valor = dados.get(campo)
+    if _vazio(valor):
+        return None
+    try:
+        return json.loads(valor) if isinstance(valor, str) else valor
+    except ValueError:
+        raise ErroOperacao(f"'{campo}' deve ser uma lista JSON de vértices, ex.: [[0, 0], [100, 0], [100, 50]].") from None
+
+
+def _geometria(dados):
+    """Retorna os polígonos (em metros) de vertices, lonlat ou geojson, ou None."""
+    try:
+        if not _vazio(dados.get("geojson")):
+            objeto = dados["geojson"]
+            return geometria_de_geojson(json.loads(objeto) if isinstance(objeto, str) else objeto)
+        vertices = _pontos(dados, "vertices")
+        if vertices is not None:
+            return geometria_de_vertices(vertices)
+        lonlat = _pontos(dados, "lonlat")
+        if lonlat is not None:
+            return geometria_de_lonlat(lonlat)
+    except (TypeError, ValueError, KeyError) as erro:
+        raise ErroOperacao(f"Geometria inválida: {erro}") from None
+    return None
+
+
+def _medidas(dados, formato_atual=None):
+    """
+    Retorna (formato, area, geometria) a partir de vértices (polígono),
+    largura/comprimento, raio ou área, ou None se nenhuma medida foi informada.
+    """
+    poligonos = _geometria(dados)
+    if poligonos is not None:
+        area = areas_geometrias([poligonos])[0]
+        if area <= 0:
+            raise ErroOperacao("O polígono informado não tem área.")
+        return "poligonal", area, gravar_geometria(poligonos)
+
+    largura = _numero(dados, "largura")
+    comprimento = _numero(dados, "comprimento")
+    raio = _numero(dados, "raio")
+    area = _numero(dados, "area")
+
+    if largura is not None or comprimento is not None:
+        if largura is None or comprimento is None:
+            raise ErroOperacao("Informe largura e comprimento do terreno retangular.")
+        contorno = gravar_geometria(geometria_retangulo(largura, comprimento))
+        return "retangular", area_retangulo(largura, comprimento), contorno
+    if raio is not None:
+        return "circular", area_circulo(raio), ""
+    if area is not None:
+        formato = dados.get("formato") or formato_atual
+        if formato not in FORMATOS:
+            raise ErroOperacao(f"Formato inválido: {formato!r}.")
+        return formato, area, ""  # só a área: o contorno guardado deixa de valer
+    if not _vazio(dados.get("formato")):
+        raise ErroOperacao("Ao informar o formato, informe também as medidas do terreno.")
+    return None
+
+
+def localizar(registros, chave, descricao):
+    """Localiza um registro pelo ID ou nome, ou lança RegistroNaoEncontrado."""
+    registro = registros.localizar(str(chave)) if not _vazio(chave) else None
+    if registro is None:
+        raise RegistroNaoEncontrado(f"{descricao} '{chave}' não encontrado(a).")
+    return registro
+
+
+def _verificar_nome_livre(registros, nome, id_atual=None):
+    existente = registros.por_nome(nome)
+    if existente is not None and existente.id != id_atual:
+        raise ErroOperacao(f"Já existe um registro chamado '{nome}'.")
+
+# ===========================
+# CULTURAS
+# ===========================
+
+def validar_cultura(dados):
+    """Valida nome, medidas e faixas de uma nova cultura e devolve o registro a cadastrar (sem ID)."""
+    nome = _nome(dados)
+    if nome is None:
+        raise ErroOperacao("Informe o nome da cultura.")
+    medidas = _medidas(dados)
+    if medidas is None:
+        raise ErroOperacao("Informe vértices, largura e comprimento, raio ou área da cultura.")
+    faixas = _numero(dados, "faixas", int, minimo=1)
+    if faixas is None:
+        raise ErroOperacao("Informe a quantidade de faixas.")
+
+    formato, area, geometria = medidas
+    return {
+        "nome": nome,
+        "formato": formato,
+        "area": area,
+        "faixas": faixas,
+        "area_faixa": area / faixas,
+        "geometria": geometria,
+    }
+
+
+def cadastrar_cultura(culturas, diario, dados):
+    """Cadastra uma cultura a partir de nome, medidas e faixas; devolve o registro."""
+    registro = validar_cultura(dados)
+    with diario.transacao():
+        _verificar_nome_livre(culturas, registro["nome"])
+        cultura = culturas.inserir(registro)
+        diario.registrar("inserir", "culturas", cultura.id, dados=cultura)
+        return cultura
+
+
+def atualizar_cultura(culturas, diario, chave, dados):
+    """Atualiza nome, medidas e/ou faixas de uma cultura; devolve o registro."""
+    with diario.transacao():
+        cultura = localizar(culturas, chave, "Cultura")
+        novos = {}
+
+        nome = _nome(dados)
+        if nome is not None:
+            _verificar_nome_livre(culturas, nome, cultura.id)
+            novos["nome"] = nome
+
+        medidas = _medidas(dados, cultura["formato"])
+        if medidas is not None:
+            novos["formato"], novos["area"], novos["geometria"] = medidas
+
+        faixas = _numero(dados, "faixas", int, minimo=1)
+        if faixas is not None:
+            novos["faixas"] = faixas
+
+        if not novos:
+            raise ErroOperacao("Nenhum dado para atualizar.")
+        if "area" in novos or "faixas" in novos:
+            novos["area_faixa"] = novos.get("area", cultura["area"]) / novos.get("faixas", cultura["faixas"])
+
+        cultura.update(novos)
+        diario.registrar("atualizar", "culturas", cultura.id, dados=cultura)
+        return cultura
+
+
+def verificar_sem_aplicacoes(diario, registro, campo):
+    """
+    Impede excluir uma cultura (campo "cultura") ou um insumo ("insumo") que
+    o histórico de aplicações ainda referencia: os totais apontariam para um
+    ID inexistente. Deve ser chamada dentro da transação, com o histórico em dia.
+    """
+    aplicacoes = diario.colecoes.get("aplicacoes")
+    quantidade = aplicacoes.total(**{campo: registro.id})[1] if aplicacoes is not None else 0
+    if quantidade:
+        descricao = "A cultura" if campo == "cultura" else "O insumo"
+        raise ErroOperacao(
+            f"{descricao} '{registro['nome']}' tem {quantidade} aplicação(ões) no histórico; "
+            f"estorne-as antes de excluir."
+        )
+
+
+def deletar_cultura(culturas, diario, chave):
+    """Remove uma cultura sem aplicações no histórico e devolve seus dados."""
+    with diario.transacao():
+        cultura = localizar(culturas, chave, "Cultura")
+        verificar_sem_aplicacoes(diario, cultura, "cultura")
+        removida = culturas.remover(cultura.id)
+        diario.registrar("remover", "culturas", cultura.id)
+        return removida
+
+# ===========================
+# INSUMOS
+# ===========================
+
+def validar_insumo(dados):
+    """Valida nome, dose (L/m²) e estoque inicial (L) de um novo insumo e devolve o registro a cadastrar (sem ID)."""
+    nome = _nome(dados)
+    if nome is None:
+        raise ErroOperacao("Informe o nome do insumo.")
+    dose = _numero(dados, "dose_m2")
+    if dose is None:
+        raise ErroOperacao("Informe a dose do insumo (dose_m2).")
+    estoque = _numero(dados, "estoque")
+    return {"nome": nome, "dose_m2": dose, "estoque": estoque or 0.0}
+
+
+def cadastrar_insumo(insumos, diario, dados):
+    """Cadastra um insumo a partir de nome e dose (L/m²); devolve o registro."""
+    registro = validar_insumo(dados)
+    with diario.transacao():
+        _verificar_nome_livre(insumos, registro["nome"])
+        insumo = insumos.inserir(registro)
+        diario.registrar("inserir", "insumos", insumo.id, dados=insumo)
+        return insumo
+
+
+def atualizar_insumo(insumos, diario, chave, dados):
+    """Atualiza nome e/ou dose de um insumo; devolve o registro."""
+    with diario.transacao():
+        insumo = localizar(insumos, chave, "Insumo")
+        novos = {}
+
+        nome = _nome(dados)
+        if nome is not None:
+            _verificar_nome_livre(insumos, nome, insumo.id)
+            novos["nome"] = nome
+
+        dose = _numero(dados, "dose_m2")
+        if dose is not None:
+            novos["dose_m2"] = dose
+
+        if not novos:
+            raise ErroOperacao("Nenhum dado para atualizar.")
+
+        insumo.update(novos)
+        diario.registrar("atualizar", "insumos", insumo.id, dados=insumo)
+        return insumo
+
+
+def deletar_insumo(insumos, diario, chave):
+    """Remove um insumo sem aplicações no histórico e devolve seus dados."""
+    with diario.transacao():
+        insumo = localizar(insumos, chave, "Insumo")
+        verificar_sem_aplicacoes(diario, insumo, "insumo")
+        removido = insumos.remover(insumo.id)
+        diario.registrar("remover", "insumos", insumo.id)
+        return removido
+
+# ===========================
+# APLICAÇÃO
+# ===========================
+
+def aplicar(culturas, insumos, chave_cultura=None, chave_insumo=None):
+    """
+    Calcula a aplicação para uma cultura e/ou um insumo (ou todos, se omitidos).
+    Devolve a MatrizAplicacao correspondente.
+    """
+    ids_culturas = None if _vazio(chave_cultura) else [localizar(culturas, chave_cultura, "Cultura").id]
+    ids_insumos = None if _vazio(chave_insumo) else [localizar(insumos, chave_insumo, "Insumo").id]
+    return calcular_matriz(culturas, insumos, ids_culturas, ids_insumos)
+
+
+def _divisao_em_faixas(dados):
+    """(quantidade, largura, rumo) opcionais da divisão em faixas, validados."""
+    quantidade = _numero(dados, "faixas", int, minimo=1)
+    largura = _numero(dados, "largura")
+    rumo = _numero(dados, "rumo", minimo=-360) or 0.0
+    if quantidade is not None and largura is not None:
+        raise ErroOperacao("Informe a quantidade de faixas ou a largura da faixa, não as duas.")
+    if largura is not None and largura <= 0:
+        raise ErroOperacao("A largura da faixa deve ser maior que zero.")
+    return quantidade, largura, rumo
+
+
+def aplicar_por_faixa(culturas, insumos, chave_cultura, chave_insumo, dados=None):
+    """
+    Calcula a área e os litros de cada faixa real de uma cultura para um insumo.
+    Em dados, opcionais: "faixas" (quantidade), "largura" (da faixa, m) e "rumo" (graus).
+    Devolve (cultura, insumo, [(área, litros), ...]).
+    """
+    if _vazio(chave_cultura) or _vazio(chave_insumo):
+        raise ErroOperacao("Informe a cultura e o insumo para o cálculo por faixa.")
+    dados = dados or {}
+    cultura = localizar(culturas, chave_cultura, "Cultura")
+    insumo = localizar(insumos, chave_insumo, "Insumo")
+    quantidade, largura, rumo = _divisao_em_faixas(dados)
+    return cultura, insumo, cache.aplicacao_por_faixa(cultura, insumo, quantidade, largura, rumo)
+
+
+def planejar_missao(culturas, insumos, chave_cultura, chave_insumo, dados):
+    """
+    Planeja a ordem das faixas e os reabastecimentos de um drone ou
+    pulverizador (ver missao.py). Em dados: "tanque" (litros, obrigatório) e,
+    opcionais, "faixas" ou "largura" (da barra, m), "rumo" (graus) e "base"
+    (ponto de reabastecimento "x,y" em metros). Devolve a Missao.
+    """
+    if _vazio(chave_cultura) or _vazio(chave_insumo):
+        raise ErroOperacao("Informe a cultura e o insumo da missão.")
+    tanque = _numero(dados, "tanque")
+    if not tanque:
+        raise ErroOperacao("Informe a capacidade do tanque em litros (maior que zero).")
+    base = dados.get("base")
+    if _vazio(base):
+        base = None
+    else:
+        try:
+            base = tuple(float(v) for v in (base.split(",") if isinstance(base, str) else base))
+        except (TypeError, ValueError):
+            base = ()
+        if len(base) != 2:
+            raise ErroOperacao("A base deve ser informada como x,y em metros (ex.: 0,-20).")
+    cultura = localizar(culturas, chave_cultura, "Cultura")
+    insumo = localizar(insumos, chave_insumo, "Insumo")
+    quantidade, largura, rumo = _divisao_em_faixas(dados)
+    return missao.planejar_missao(cultura, insumo, tanque, quantidade, largura, rumo, base)
+
+# ===========================
+# ESTATÍSTICAS
+# ===========================
+
+def estatisticas(culturas, insumos):
+    """
+    Resumos mantidos pelas tabelas (ver Tabela.estatisticas), os mesmos de
+    r/analise.r: {"culturas": {"area": {...}, "faixas": {...}, ...}, "insumos": {...}},
+    cada um com quantidade, soma, media, desvio, minimo e maximo.
+    """
+    return {
+        nome: {coluna: registros.estatisticas(coluna) for coluna in registros.ESTATISTICAS}
+        for nome, registros in (("culturas", culturas), ("insumos", insumos))
+    }
+
+# ===========================
+# HISTÓRICO E ESTOQUE
+# ===========================
+
+def safra_da_data(data):
+    """Safra agrícola de uma data: "2025/2026" de julho de 2025 a junho de 2026 (ver MES_INICIO_SAFRA)."""
+    if MES_INICIO_SAFRA == 1:
+        return str(data.year)
+    ano = data.year if data.month >= MES_INICIO_SAFRA else data.year - 1
+    return f"{ano}/{ano + 1}"
+
+
+def _data(dados):
+    valor = dados.get("data")
+    if _vazio(valor):
+        return date.today()
+    if isinstance(valor, date):
+        return valor
+    try:
+        return date.fromisoformat(str(valor).strip())
+    except ValueError:
+        raise ErroOperacao(f"Data inválida: {valor!r} (use AAAA-MM-DD).") from None
+
+
+def registrar_aplicacao(culturas, insumos, aplicacoes, diario, dados):
+    """
+    Registra no histórico uma aplicação de insumo em uma cultura e baixa o
+    estoque do insumo. Campos: cultura, insumo, litros (padrão: a quantidade
+    total calculada), data (AAAA-MM-DD, padrão: hoje) e safra (padrão: a da data).
+    O estoque pode ficar negativo (aplicação de insumo não lançado no estoque).
+    Devolve o registro da aplicação.
+    """
+    if _vazio(dados.get("cultura")) or _vazio(dados.get("insumo")):
+        raise ErroOperacao("Informe a cultura e o insumo da aplicação.")
+    data = _data(dados)
+    litros = _numero(dados, "litros")
+    safra = None if _vazio(dados.get("safra")) else str(dados["safra"]).strip()
+
+    with diario.transacao(), diario.em_lote():
+        cultura = localizar(culturas, str(dados["cultura"]), "Cultura")
+        insumo = localizar(insumos, str(dados["insumo"]), "Insumo")
+        if litros is None:
+            litros = cache.aplicacao(cultura, insumo)[0]
+        aplicacao = aplicacoes.inserir({
+            "cultura": cultura.id,
+            "insumo": insumo.id,
+            "data": data.isoformat(),
+            "safra": safra or safra_da_data(data),
+            "litros": litros,
+        })
+        diario.registrar("inserir", "aplicacoes", aplicacao.id, dados=aplicacao)
+        insumo["estoque"] = insumo["estoque"] - litros
+        diario.registrar("atualizar", "insumos", insumo.id, dados=insumo)
+        return aplicacao
+
+
+def estornar_aplicacao(insumos, aplicacoes, diario, id):
+    """Remove uma aplicação do histórico (ex.: lançada por engano) e devolve os litros ao estoque."""
+    with diario.transacao(), diario.em_lote():
+        aplicacao = aplicacoes.por_id(_numero({"id": id}, "id", int))
+        if aplicacao is None:
+            raise RegistroNaoEncontrado(f"Aplicação '{id}' não encontrada.")
+        removida = aplicacoes.remover(aplicacao.id)
+        diario.registrar("remover", "aplicacoes", removida["id"])
+        insumo = insumos.por_id(removida["insumo"])
+        if insumo is not None:
+            insumo["estoque"] = insumo["estoque"] + removida["litros"]
+            diario.registrar("atualizar", "insumos", insumo.id, dados=insumo)
+        return removida
+
+
+def movimentar_estoque(insumos, diario, chave, litros):
+    """Soma litros ao estoque do insumo (entrada; negativo para saída ou ajuste) e devolve o registro."""
+    litros = _numero({"litros": litros}, "litros", minimo=float("-inf"))
+    if litros is None:
+        raise ErroOperacao("Informe a quantidade de litros.")
+    with diario.transacao():
+        insumo = localizar(insumos, chave, "Insumo")
+        insumo["estoque"] = insumo["estoque"] + litros
+        diario.registrar("atualizar", "insumos", insumo.id, dados=insumo)
+        return insumo
+
+
+def consumo(culturas, insumos, aplicacoes, cultura=None, insumo=None, safra=None):
+    """
+    Total aplicado (litros e quantidade de aplicações) filtrando por cultura,
+    insumo (nome ou ID) e/ou safra; sem filtros, o total geral. Não percorre
+    o histórico: os totais são mantidos pela tabela a cada registro.
+    """
+    id_cultura = None if _vazio(cultura) else localizar(culturas, str(cultura), "Cultura").id
+    id_insumo = None if _vazio(insumo) else localizar(insumos, str(insumo), "Insumo").id
+    litros, quantidade = aplicacoes.total(id_cultura, id_insumo, None if _vazio(safra) else str(safra).strip())
+    return {"litros": litros, "aplicacoes": quantidade}
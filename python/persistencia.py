@@ -0,0 +1,488 @@
+# -*- coding: utf-8 -*-
+"""
+FarmTech - Persistência com diário (journal)
+Descrição: Cada alteração é anexada em dados/diario.jsonl; os arquivos CSV
+funcionam como fotografia (snapshot) e são regravados apenas na compactação.
+Vários processos podem usar a mesma pasta: as gravações são serializadas por
+uma trava de arquivo e cada processo incorpora o que os outros anexaram.
+"""
+
+import csv
+import io
+import json
+import os
+import threading
+from contextlib import contextmanager
+
+import metricas
+from armazem import NomeDuplicadoError
+from binario import abrir_binario, gravar_binario
+from concorrencia import TravaArquivo
+from leitura import ler_em_lotes
+
+# ===========================
+# CONFIGURAÇÃO
+# ===========================
+
+# Colunas de cada coleção, na ordem gravada nos CSVs (lidos também pelo R).
+# O "id" e as colunas novas ficam no fim para não mudar a posição das antigas.
+COLUNAS = {
+    "culturas": ["nome", "formato", "area", "faixas", "area_faixa", "id", "geometria"],
+    "insumos": ["nome", "dose_m2", "id", "estoque"],
+    "aplicacoes": ["cultura", "insumo", "data", "safra", "litros", "id"],
+}
+
+# Conversão de texto (CSV) para o tipo de cada coluna
+TIPOS = {
+    "culturas": {
+        "nome": str, "formato": str, "area": float, "faixas": int, "area_faixa": float, "id": int, "geometria": str,
+    },
+    "insumos": {"nome": str, "dose_m2": float, "id": int, "estoque": float},
+    "aplicacoes": {"cultura": int, "insumo": int, "data": str, "safra": str, "litros": float, "id": int},
+}
+
+ARQUIVO_DIARIO = "diario.jsonl"
+ARQUIVO_ESTADO = "estado.json"
+ARQUIVO_TRAVA = ".trava"
+
+# Mantém uma fotografia binária (.bin, aberta com mmap) ao lado de cada CSV
+USAR_BINARIO = os.environ.get("FARMTECH_BINARIO", "1") != "0"
+
+# Quantidade de registros no diário que dispara a compactação automática
+LIMITE_DIARIO = int(os.environ.get("FARMTECH_LIMITE_DIARIO", "1000"))
+
+# Janela (s) que junta alterações seguidas em um único fsync (0 = fsync a cada alteração)
+JANELA_GRAVACAO = float(os.environ.get("FARMTECH_JANELA_GRAVACAO", "0"))
+
+# Onde os dados ficam guardados: "csv" (fotografia CSV + diário) ou "sqlite" (ver banco.py)
+ARMAZENAMENTO = os.environ.get("FARMTECH_ARMAZENAMENTO", "csv")
+TIPOS_ARMAZENAMENTO = ("csv", "sqlite")
+
+# ===========================
+# ERROS
+# ===========================
+
+class ConflitoError(RuntimeError):
+    """O registro foi alterado ou removido por outro processo depois de lido."""
+
+# ===========================
+# FUNÇÕES AUXILIARES
+# ===========================
+
+def _gravar_atomico(caminho, conteudo: bytes):
+    """Grava o arquivo por inteiro em um temporário e o renomeia por cima do original."""
+    temporario = caminho + ".tmp"
+    with open(temporario, "wb") as f:
+        f.write(conteudo)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temporario, caminho)
+
+
+def _csv_em_bytes(colecao, registros):
+    """Gera o conteúdo CSV (com cabeçalho) de uma coleção."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    colunas = COLUNAS[colecao]
+    writer.writerow(colunas)
+    writer.writerows(registros.linhas(colunas))
+    return buffer.getvalue().encode("utf-8")
+
+
+def _aplicar(colecoes, entrada):
+    """Reaplica uma entrada do diário sobre as coleções em memória."""
+    registros = colecoes[entrada["colecao"]]
+    op = entrada["op"]
+    if op == "inserir":
+        registros.inserir(entrada["dados"], id=entrada["id"])
+    elif op == "atualizar":
+        registros.por_id(entrada["id"]).update(entrada["dados"])
+    elif op == "remover":
+        registros.remover(entrada["id"])
+    else:
+        raise ValueError(f"Operação desconhecida no diário: {op!r}")
+
+
+def _verificar(colecoes, esperado):
+    """Lança ConflitoError se algum registro não estiver mais como o chamador o leu."""
+    for colecao, id, dados in esperado:
+        atual = colecoes[colecao].por_id(id)
+        if atual is None:
+            raise ConflitoError(f"O registro {id} de {colecao} foi removido por outro usuário.")
+        if any(atual[c] != dados[c] for c in COLUNAS[colecao] if c in dados):
+            raise ConflitoError(
+                f"O registro {id} de {colecao} foi alterado por outro usuário; leia-o novamente."
+            )
+
+# ===========================
+# DIÁRIO
+# ===========================
+
+class Diario:
+    """
+    Diário de alterações (write-ahead log) das coleções de culturas, insumos
+    e do histórico de aplicações (todas devem ser informadas em colecoes).
+
+    Cada chamada de registrar() anexa uma linha JSON e faz fsync, em vez de
+    regravar os CSVs inteiros. carregar() lê os CSVs e reaplica o diário;
+    compactar() grava uma nova fotografia dos CSVs e esvazia o diário.
+
+    O número seq de cada linha é a geração dos dados, comum a todos os
+    processos: dentro de transacao() a pasta fica travada e as linhas que
+    outros processos anexaram (seq maior que o nosso) são aplicadas antes de
+    qualquer alteração, que então recebe o seq seguinte.
+
+    Cada coleção alterada desde a última fotografia é marcada; a compactação
+    só regrava o CSV e o .bin dessas. Com janela > 0, o fsync de alterações
+    fora de em_lote() é adiado por até janela segundos, juntando as que
+    chegarem nesse intervalo; fechar() grava o que estiver pendente.
+    """
+
+    def __init__(self, dados_dir, colecoes, janela=None):
+        self.dados_dir = dados_dir
+        self.colecoes = colecoes
+        self.caminho_diario = os.path.join(dados_dir, ARQUIVO_DIARIO)
+        self.caminho_estado = os.path.join(dados_dir, ARQUIVO_ESTADO)
+        self.seq = 0
+        self.pendentes = 0
+        self._arquivo = None
+        self._em_lote = False
+        self._trava = TravaArquivo(os.path.join(dados_dir, ARQUIVO_TRAVA))
+        # Geração da fotografia carregada e quanto do diário já foi lido
+        self._seq_fotografia = 0
+        self._posicao = 0
+        # Coleções alteradas desde a fotografia (só elas são regravadas)
+        self._alteradas = set()
+        self.janela = JANELA_GRAVACAO if janela is None else janela
+        self._agendada = None
+
+    def caminho_csv(self, colecao):
+        return os.path.join(self.dados_dir, f"{colecao}.csv")
+
+    def caminho_binario(self, colecao):
+        return os.path.join(self.dados_dir, f"{colecao}.bin")
+
+    # ---------- estado da última compactação ----------
+
+    def _ler_estado(self):
+        try:
+            with open(self.caminho_estado, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return {"seq": 0, "pendente": False, "proximo_id": {}}
+
+    def _gravar_estado(self, estado):
+        conteudo = json.dumps(estado)
+        _gravar_atomico(self.caminho_estado, conteudo.encode("utf-8"))
+
+    def _recuperar_compactacao(self, estado):
+        """Conclui (ou descarta) uma compactação interrompida por queda do programa."""
+        for colecao in COLUNAS:
+            temporario = self.caminho_csv(colecao) + ".tmp"
+            if os.path.exists(temporario):
+                if estado["pendente"]:
+                    os.replace(temporario, self.caminho_csv(colecao))
+                else:
+                    os.remove(temporario)
+        if estado["pendente"]:
+            estado["pendente"] = False
+            self._gravar_estado(estado)
+
+    # ---------- leitura ----------
+
+    def _ler_fotografia(self, colecao):
+        """Lê a fotografia binária se estiver em dia com o CSV; senão lê o CSV e a regenera."""
+        caminho_csv = self.caminho_csv(colecao)
+        if USAR_BINARIO and abrir_binario(self.caminho_binario(colecao), self.colecoes[colecao], caminho_csv):
+            metricas.contar("fotografias_lidas", colecao=colecao, origem="binario")
+            return
+        self._ler_csv(colecao)
+        metricas.contar("fotografias_lidas", colecao=colecao, origem="csv")
+        if USAR_BINARIO and os.path.exists(caminho_csv):
+            gravar_binario(self.caminho_binario(colecao), self.colecoes[colecao], caminho_csv)
+
+    def _ler_csv(self, colecao):
+        caminho = self.caminho_csv(colecao)
+        if not os.path.exists(caminho):
+            return
+        registros = self.colecoes[colecao]
+        # CSVs antigos não têm a coluna "id": os IDs são gerados na leitura
+        for lote in ler_em_lotes(caminho, TIPOS[colecao]):
+            try:
+                registros.estender(lote)
+            except NomeDuplicadoError:
+                self._inserir_renomeando(registros, lote)
+
+    def _inserir_renomeando(self, registros, lote):
+        """Insere um lote linha a linha; nomes repetidos (bases antigas) ganham o ID no nome."""
+        colunas = list(lote)
+        for valores in zip(*(lote[c] for c in colunas)):
+            registro = dict(zip(colunas, valores))
+            if registros.por_nome(registro["nome"]) is not None:
+                registro["nome"] = f"{registro['nome']} ({registro.get('id', registros.proximo_id)})"
+            registros.inserir(registro)
+
+    def _ler_novas_entradas(self):
+        """
+        Aplica as entradas do diário a partir da posição já lida, inclusive as
+        anexadas por outros processos (uma linha final incompleta é ignorada).
+        """
+        if not os.path.exists(self.caminho_diario):
+            return
+        with open(self.caminho_diario, "rb") as f:
+            f.seek(self._posicao)
+            for linha in f:
+                if not linha.endswith(b"\n"):
+                    break
+                try:
+                    entrada = json.loads(linha)
+                except ValueError:
+                    break
+                self._posicao += len(linha)
+                if entrada["seq"] <= self.seq:
+                    continue
+                _aplicar(self.colecoes, entrada)
+                self._alteradas.add(entrada["colecao"])
+                self.seq = entrada["seq"]
+                self.pendentes += 1
+
+    def carregar(self):
+        """Carrega a fotografia (CSVs) e reaplica as alterações registradas depois dela."""
+        with metricas.medir("carregar"), self._trava.exclusiva():
+            self._carregar()
+        for colecao, registros in self.colecoes.items():
+            metricas.contar("registros_carregados", len(registros), colecao=colecao)
+
+    def _carregar(self):
+        estado = self._ler_estado()
+        self._recuperar_compactacao(estado)
+
+        for colecao in COLUNAS:
+            self.colecoes[colecao].clear()
+            self._ler_fotografia(colecao)
+            # IDs de registros apagados não são reaproveitados
+            self.colecoes[colecao].reservar_ids(estado.get("proximo_id", {}).get(colecao, 1))
+
+        self.seq = self._seq_fotografia = estado["seq"]
+        self.pendentes = 0
+        self._posicao = 0
+        self._alteradas = set()
+        self._ler_novas_entradas()
+
+    def atualizar(self):
+        """Incorpora as alterações gravadas por outros processos desde a última leitura."""
+        with self._trava.exclusiva():
+            self._atualizar()
+
+    def _atualizar(self):
+        # Se outro processo compactou (nova fotografia), recarrega tudo;
+        # senão, lê só o fim do diário
+        estado = self._ler_estado()
+        try:
+            tamanho = os.path.getsize(self.caminho_diario)
+        except FileNotFoundError:
+            tamanho = 0
+        if estado["seq"] != self._seq_fotografia or tamanho < self._posicao:
+            self.fechar()
+            self._carregar()
+        elif tamanho > self._posicao:
+            self._ler_novas_entradas()
+
+    @contextmanager
+    def transacao(self, esperado=()):
+        """
+        Trava a pasta de dados para uma sequência de leituras e alterações.
+
+        Ao entrar, aplica o que outros processos gravaram e confere os registros
+        em esperado, uma sequência de (coleção, id, dados lidos antes): se algum
+        mudou nesse meio-tempo, lança ConflitoError em vez de sobrescrevê-lo.
+        Ao sair, as linhas anexadas já estão visíveis para os outros processos.
+        Pode ser aninhada; só a transação mais externa trava e atualiza.
+        """
+        with self._trava.exclusiva():
+            externa = self._trava.profundidade == 1
+            if externa:
+                self._atualizar()
+            _verificar(self.colecoes, esperado)
+            try:
+                yield self
+            finally:
+                if externa and self._arquivo is not None:
+                    self._arquivo.flush()
+                    self._posicao = os.fstat(self._arquivo.fileno()).st_size
+
+    # ---------- escrita ----------
+
+    def registrar(self, op, colecao, id, dados=None):
+        """
+        Anexa uma alteração ao diário, garantindo que ela chegou ao disco.
+        Use dentro de transacao(), que antes incorpora o que outros processos
+        gravaram, para que a alteração parta dos dados mais recentes.
+        """
+        with self.transacao():
+            self.seq += 1
+            entrada = {"seq": self.seq, "op": op, "colecao": colecao, "id": id}
+            if dados is not None:
+                entrada["dados"] = {c: dados[c] for c in COLUNAS[colecao] if c != "id"}
+
+            if self._arquivo is None:
+                self._arquivo = open(self.caminho_diario, "a", encoding="utf-8")
+            linha = json.dumps(entrada, ensure_ascii=False) + "\n"
+            self._arquivo.write(linha)
+            self.pendentes += 1
+            self._alteradas.add(colecao)
+            metricas.contar("alteracoes", colecao=colecao, op=op)
+            if metricas.ATIVO:
+                metricas.contar("bytes_gravados", len(linha.encode("utf-8")), arquivo="diario")
+            if self._em_lote:
+                return
+            if self.janela > 0 and self.pendentes < LIMITE_DIARIO:
+                self._agendar()
+            else:
+                self.sincronizar()
+
+    def registrar_insercoes(self, colecao, ids):
+        """
+        Registra de uma vez a inclusão de muitos registros já inseridos na tabela
+        (ex.: importação em massa). Lotes pequenos vão para o diário com um único
+        fsync; acima do limite do diário, grava direto uma nova fotografia, sem
+        uma linha de diário por registro. O seq avança nos dois casos, para que
+        outros processos percebam a mudança.
+        """
+        with self.transacao():
+            if len(ids) < LIMITE_DIARIO:
+                tabela = self.colecoes[colecao]
+                with self.em_lote():
+                    for id in ids:
+                        self.registrar("inserir", colecao, id, dados=tabela.por_id(id))
+                return
+            self.seq += 1
+            self._alteradas.add(colecao)
+            metricas.contar("alteracoes", len(ids), colecao=colecao, op="inserir")
+            self.compactar()
+
+    def _agendar(self):
+        """Agenda o fsync para daqui a janela segundos, juntando as alterações que chegarem até lá."""
+        with self._trava.exclusiva():
+            if self._agendada is None:
+                self._agendada = threading.Timer(self.janela, self._descarregar)
+                self._agendada.daemon = True
+                self._agendada.start()
+
+    def _descarregar(self):
+        """Faz o fsync das linhas já anexadas (também na thread do fsync adiado, sem compactar)."""
+        with self._trava.exclusiva():
+            if self._agendada is not None:
+                self._agendada.cancel()
+                self._agendada = None
+            if self._arquivo is not None:
+                with metricas.medir("fsync"):
+                    self._arquivo.flush()
+                    os.fsync(self._arquivo.fileno())
+
+    def sincronizar(self):
+        """Garante no disco as linhas já anexadas e compacta se o diário passou do limite."""
+        self._descarregar()
+        if self.pendentes >= LIMITE_DIARIO:
+            self.compactar()
+
+    @contextmanager
+    def em_lote(self):
+        """
+        Agrupa várias alterações: as linhas do diário são gravadas com um
+        único fsync ao final do bloco (e a compactação, se necessária, também).
+        """
+        anterior, self._em_lote = self._em_lote, True
+        try:
+            yield self
+        finally:
+            self._em_lote = anterior
+            if not anterior:
+                self.sincronizar()
+
+    def compactar(self, todas=False):
+        """
+        Grava uma nova fotografia das coleções alteradas (todas, com todas=True,
+        como na medição de desempenho) e descarta o diário já incorporado.
+        """
+        with metricas.medir("salvar"), self.transacao():
+            if todas:
+                self._alteradas = set(COLUNAS)
+            self._compactar()
+
+    def exportar(self, seq, colecoes=None):
+        """
+        Grava as coleções em memória, como estão, como a fotografia da geração
+        seq (CSVs e .bin) e esvazia o diário, sem antes incorporar o que está
+        na pasta. É assim que outro armazenamento mantém os CSVs em dia para o R.
+        colecoes limita a gravação às que mudaram (padrão: todas).
+        """
+        with self._trava.exclusiva():
+            self.seq = seq
+            self._alteradas = set(COLUNAS if colecoes is None else colecoes)
+            self._compactar()
+
+    def _compactar(self):
+        # Só as coleções alteradas (ou ainda sem CSV) são regravadas
+        gravar = [c for c in COLUNAS if c in self._alteradas or not os.path.exists(self.caminho_csv(c))]
+        if not gravar and self.seq == self._seq_fotografia:
+            return
+        for colecao in gravar:
+            temporario = self.caminho_csv(colecao) + ".tmp"
+            conteudo = _csv_em_bytes(colecao, self.colecoes[colecao])
+            with open(temporario, "wb") as f:
+                f.write(conteudo)
+                f.flush()
+                os.fsync(f.fileno())
+            metricas.contar("bytes_gravados", len(conteudo), arquivo="csv")
+            metricas.contar("fotografias_gravadas", colecao=colecao)
+
+        # A partir daqui a compactação pode ser concluída mesmo após uma queda
+        estado = {
+            "seq": self.seq,
+            "pendente": True,
+            "proximo_id": {c: self.colecoes[c].proximo_id for c in COLUNAS},
+        }
+        self._gravar_estado(estado)
+        for colecao in gravar:
+            os.replace(self.caminho_csv(colecao) + ".tmp", self.caminho_csv(colecao))
+            if USAR_BINARIO:
+                gravar_binario(self.caminho_binario(colecao), self.colecoes[colecao], self.caminho_csv(colecao))
+                if metricas.ATIVO:
+                    metricas.contar("bytes_gravados", os.path.getsize(self.caminho_binario(colecao)), arquivo="bin")
+        estado["pendente"] = False
+        self._gravar_estado(estado)
+
+        self.fechar()
+        open(self.caminho_diario, "w", encoding="utf-8").close()
+        self.pendentes = 0
+        self._seq_fotografia = self.seq
+        self._posicao = 0
+        self._alteradas = set()
+
+    def fechar(self):
+        """Grava no disco o que estiver pendente (inclusive um fsync adiado) e fecha o diário."""
+        if self._arquivo is not None:
+            self._descarregar()
+            self._arquivo.close()
+            self._arquivo = None
+
+# ===========================
+# ESCOLHA DO ARMAZENAMENTO
+# ===========================
+
+def abrir_armazenamento(dados_dir, colecoes, tipo=None):
+    """
+    Cria o armazenamento configurado (tipo ou FARMTECH_ARMAZENAMENTO) para as
+    coleções. Todos oferecem a mesma interface do Diario: carregar, atualizar,
+    transacao, registrar, registrar_insercoes, em_lote, sincronizar,
+    compactar (que também regrava os CSVs lidos pelo R) e fechar.
+    Todos os processos que usam a mesma pasta devem usar o mesmo tipo.
+    """
+    tipo = tipo or ARMAZENAMENTO
+    if tipo == "csv":
+        return Diario(dados_dir, colecoes)
+    if tipo == "sqlite":
+        from banco import BancoSQLite  # só carrega o sqlite3 quando necessário
+        return BancoSQLite(dados_dir, colecoes)
+    raise ValueError(f"Armazenamento desconhecido: {tipo!r} (use {' ou '.join(TIPOS_ARMAZENAMENTO)}).")
@@ -0,0 +1,382 @@
+# -*- coding: utf-8 -*-
+"""
+FarmTech - Serviço HTTP/JSON
+Descrição: Expõe culturas, insumos e o cálculo de aplicação em HTTP/JSON para
+vários clientes ao mesmo tempo (ex.: tablets em campo).
+
+Rotas:
+    GET    /saude
+    GET    /culturas                 GET /insumos
+    GET    /culturas/<nome ou id>    GET /insumos/<nome ou id>
+    GET    /culturas?formato=circular&area=500000..&ordenar=-area&limite=20   (ver consulta.py)
+    POST   /culturas                 POST /insumos              (corpo JSON)
+    PATCH  /culturas/<nome ou id>    PATCH /insumos/<nome ou id> (corpo JSON)
+    DELETE /culturas/<nome ou id>    DELETE /insumos/<nome ou id>
+    GET    /aplicar?cultura=<nome ou id>&insumo=<nome ou id>
+    GET    /aplicar/faixas?cultura=...&insumo=...[&faixas=N | &largura=m][&rumo=graus]
+    GET    /missao?cultura=...&insumo=...&tanque=L[&faixas=N | &largura=m][&rumo=graus][&base=x,y]
+    GET    /clima[?local=lat,lon][&atualizar=1]   (clima e janela de pulverização, ver clima.py)
+    GET    /aplicacoes               POST /aplicacoes           (registra e baixa o estoque)
+    DELETE /aplicacoes/<id>          (estorna)
+    GET    /consumo?cultura=...&insumo=...&safra=...   (filtros opcionais)
+    GET    /estatisticas             (média, total, desvio, mínimo e máximo, como r/analise.r)
+    GET    /metricas                 (texto Prometheus; ?formato=json para JSON)
+"""
+
+import json
+import os
+import signal
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from urllib.parse import parse_qs, unquote, urlsplit
+
+import clima
+import consulta
+import metricas
+import operacoes
+from concorrencia import TravaLeituraEscrita
+from operacoes import RegistroNaoEncontrado
+
+# ===========================
+# CONFIGURAÇÃO
+# ===========================
+
+# Segundos que uma conexão keep-alive ociosa pode ocupar uma thread do pool
+# antes de ser fechada (cada conexão, e não cada requisição, ocupa uma thread)
+TEMPO_OCIOSO = float(os.environ.get("FARMTECH_HTTP_OCIOSO", "5"))
+
+# ===========================
+# GRAVAÇÃO EM GRUPO
+# ===========================
+
+def _limpar_lapides(diario):
+    """
+    Descarta as lápides de todas as coleções. Só é chamada com a trava de
+    escrita: as leituras (Tabela.coluna, posicoes) nunca reorganizam a tabela,
+    e as remoções, inclusive as de outros processos trazidas do diário, são
+    limpas aqui, antes que a trava seja liberada para os leitores.
+    """
+    for registros in diario.colecoes.values():
+        registros.limpar_removidos()
+
+
+class GravacaoEmGrupo:
+    """
+    Agrupa as gravações no diário: as alterações são anexadas sem fsync e uma
+    thread faz um único fsync a cada intervalo para todas elas. Quem alterou
+    espera (confirmar) até que sua alteração esteja no disco antes de responder.
+    """
+
+    def __init__(self, diario, trava, intervalo=0.02):
+        self.diario = diario
+        self.trava = trava
+        self.intervalo = intervalo
+        self._sincronizado = diario.seq
+        self._condicao = threading.Condition()
+        self._parar = threading.Event()
+        self._thread = threading.Thread(target=self._laco, name="farmtech-gravacao", daemon=True)
+
+    def iniciar(self):
+        self._thread.start()
+
+    def _sincronizar(self):
+        with self.trava.escrita(), self.diario.transacao():
+            # A transação também traz o que outros processos gravaram na pasta
+            seq = self.diario.seq
+            if seq > self._sincronizado:
+                self.diario.sincronizar()
+            _limpar_lapides(self.diario)
+        with self._condicao:
+            self._sincronizado = max(self._sincronizado, seq)
+            self._condicao.notify_all()
+
+    def _laco(self):
+        while not self._parar.wait(self.intervalo):
+            self._sincronizar()
+
+    def confirmar(self, seq):
+        """Aguarda até a alteração de número seq estar gravada em disco."""
+        with self._condicao:
+            self._condicao.wait_for(lambda: self._sincronizado >= seq)
+
+    def parar(self):
+        self._parar.set()
+        self._thread.join()
+        self._sincronizar()
+
+# ===========================
+# SERVIDOR
+# ===========================
+
+class ServidorFarmTech(HTTPServer):
+    """Servidor HTTP que atende as requisições em um pool de threads."""
+
+    def __init__(self, endereco, contexto, trabalhadores):
+        super().__init__(endereco, Manipulador)
+        self.contexto = contexto
+        self.pool = ThreadPoolExecutor(max_workers=trabalhadores, thread_name_prefix="farmtech-http")
+
+    def process_request(self, request, client_address):
+        self.pool.submit(self._atender, request, client_address)
+
+    def _atender(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+    def server_close(self):
+        super().server_close()
+        self.pool.shutdown(wait=True)
+
+
+class Contexto:
+    """Dados compartilhados pelas requisições."""
+
+    def __init__(self, culturas, insumos, diario):
+        self.culturas = culturas
+        self.insumos = insumos
+        self.aplicacoes = diario.colecoes["aplicacoes"]
+        self.diario = diario
+        self.trava = TravaLeituraEscrita()
+        self.gravacao = GravacaoEmGrupo(diario, self.trava)
+
+
+class Manipulador(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server_version = "FarmTech/1.0"
+    timeout = TEMPO_OCIOSO
+
+    # ---------- utilidades ----------
+
+    def log_message(self, formato, *args):
+        pass  # sem log por requisição no terminal
+
+    def _responder(self, status, corpo):
+        if isinstance(corpo, str):  # texto puro (métricas no formato Prometheus)
+            conteudo, tipo = corpo.encode("utf-8"), "text/plain; version=0.0.4"
+        else:
+            conteudo, tipo = json.dumps(corpo, ensure_ascii=False).encode("utf-8"), "application/json"
+        self.send_response(status)
+        self.send_header("Content-Type", f"{tipo}; charset=utf-8")
+        self.send_header("Content-Length", str(len(conteudo)))
+        self.end_headers()
+        self.wfile.write(conteudo)
+
+    def _ler_corpo(self):
+        tamanho = int(self.headers.get("Content-Length") or 0)
+        if tamanho == 0:
+            return {}
+        dados = json.loads(self.rfile.read(tamanho))
+        if not isinstance(dados, dict):
+            raise operacoes.ErroOperacao("O corpo da requisição deve ser um objeto JSON.")
+        return dados
+
+    def _rota(self):
+        """Divide o caminho em (coleção, chave, parâmetros da consulta)."""
+        partes = urlsplit(self.path)
+        segmentos = [unquote(s) for s in partes.path.strip("/").split("/") if s]
+        parametros = {c: v[-1] for c, v in parse_qs(partes.query).items()}
+        colecao = segmentos[0] if segmentos else ""
+        chave = segmentos[1] if len(segmentos) > 1 else None
+        return colecao, chave, parametros
+
+    def _tratar(self, metodo):
+        contexto = self.server.contexto
+        with metricas.medir("requisicao", metodo=metodo):
+            try:
+                status, corpo = self._executar(contexto, metodo)
+            except RegistroNaoEncontrado as erro:
+                status, corpo = 404, {"erro": str(erro)}
+            except (ValueError, KeyError) as erro:
+                status, corpo = 400, {"erro": str(erro)}
+            metricas.contar("respostas", status=status)
+            self._responder(status, corpo)
+
+    # ---------- rotas ----------
+
+    def _executar(self, contexto, metodo):
+        colecao, chave, parametros = self._rota()
+
+        if metodo == "GET" and colecao == "saude":
+            with contexto.trava.leitura():
+                return 200, {"culturas": len(contexto.culturas), "insumos": len(contexto.insumos)}
+
+        if metodo == "GET" and colecao == "metricas":
+            if parametros.get("formato") == "json":
+                return 200, metricas.instantaneo()
+            return 200, metricas.como_prometheus()
+
+        if metodo == "GET" and colecao == "aplicar" and chave == "faixas":
+            with contexto.trava.leitura():
+                cultura, insumo, faixas = operacoes.aplicar_por_faixa(
+                    contexto.culturas, contexto.insumos, parametros.get("cultura"), parametros.get("insumo"),
+                    parametros,
+                )
+                resposta = {
+                    "cultura": cultura.id,
+                    "insumo": insumo.id,
+                    "faixas": [{"faixa": n, "area": area, "litros": litros}
+                               for n, (area, litros) in enumerate(faixas, start=1)],
+                }
+            # Fora da trava: a consulta ao provedor de clima pode demorar
+            resposta["clima"] = clima.clima_da_aplicacao(contexto.diario.dados_dir)
+            return 200, resposta
+
+        if metodo == "GET" and colecao == "clima":
+            resultado = clima.clima_da_aplicacao(
+                contexto.diario.dados_dir, parametros.get("local"), parametros.get("atualizar") in ("1", "sim"),
+            )
+            if resultado is None:
+                return 404, {"erro": "Nenhum provedor de clima configurado."}
+            return (503 if "erro" in resultado else 200), resultado
+
+        if metodo == "GET" and colecao == "missao":
+            with contexto.trava.leitura():
+                plano = operacoes.planejar_missao(
+                    contexto.culturas, contexto.insumos, parametros.get("cultura"), parametros.get("insumo"),
+                    parametros,
+                )
+            colunas = ("ordem", "etapa", "faixa", "parte", "x_inicio", "y_inicio", "x_fim", "y_fim", "litros", "tanque")
+            return 200, {
+                "cultura": plano.cultura.id,
+                "insumo": plano.insumo.id,
+                "litros": plano.litros,
+                "reabastecimentos": plano.reabastecimentos,
+                "deslocamento_m": plano.deslocamento,
+                "deslocamento_ordem_simples_m": plano.deslocamento_simples,
+                "aplicando_m": plano.aplicando,
+                "etapas": [dict(zip(colunas, linha)) for linha in plano.linhas()],
+                "clima": clima.clima_da_aplicacao(contexto.diario.dados_dir),
+            }
+
+        if metodo == "GET" and colecao == "aplicar":
+            with contexto.trava.leitura():
+                matriz = operacoes.aplicar(
+                    contexto.culturas, contexto.insumos, parametros.get("cultura"), parametros.get("insumo")
+                )
+                linhas = [
+                    {"cultura": c, "insumo": i, "total_litros": total, "litros_por_faixa": por_faixa}
+                    for c, i, total, por_faixa in matriz.linhas()
+                ]
+            return 200, linhas
+
+        if metodo == "GET" and colecao == "estatisticas":
+            with contexto.trava.leitura():
+                return 200, operacoes.estatisticas(contexto.culturas, contexto.insumos)
+
+        if metodo == "GET" and colecao == "consumo":
+            with contexto.trava.leitura():
+                return 200, operacoes.consumo(
+                    contexto.culturas, contexto.insumos, contexto.aplicacoes,
+                    parametros.get("cultura"), parametros.get("insumo"), parametros.get("safra"),
+                )
+
+        if colecao == "aplicacoes":
+            return self._executar_aplicacoes(contexto, metodo, chave)
+
+        if colecao not in ("culturas", "insumos"):
+            return 404, {"erro": "Rota inexistente."}
+        registros = getattr(contexto, colecao)
+        sufixo = "cultura" if colecao == "culturas" else "insumo"
+
+        if metodo == "GET":
+            with contexto.trava.leitura():
+                if chave is None and parametros:
+                    resultado = consulta.consultar(registros, **consulta.ler_consulta(registros, parametros))
+                    return 200, [dict(r) for r in resultado]
+                if chave is None:
+                    return 200, [dict(r) for r in registros]
+                return 200, dict(operacoes.localizar(registros, chave, sufixo.capitalize()))
+
+        dados = self._ler_corpo()
+        with contexto.trava.escrita():
+            if metodo == "POST" and chave is None:
+                status, resultado = 201, getattr(operacoes, f"cadastrar_{sufixo}")(registros, contexto.diario, dados)
+            elif metodo in ("PATCH", "PUT") and chave is not None:
+                status, resultado = 200, getattr(operacoes, f"atualizar_{sufixo}")(
+                    registros, contexto.diario, chave, dados
+                )
+            elif metodo == "DELETE" and chave is not None:
+                status, resultado = 200, getattr(operacoes, f"deletar_{sufixo}")(registros, contexto.diario, chave)
+            else:
+                return 405, {"erro": "Método não permitido para esta rota."}
+            # Lápides desta remoção ou de remoções de outros processos trazidas do diário
+            _limpar_lapides(contexto.diario)
+            resultado = dict(resultado)
+            seq = contexto.diario.seq
+
+        contexto.gravacao.confirmar(seq)
+        return status, resultado
+
+    def _executar_aplicacoes(self, contexto, metodo, chave):
+        if metodo == "GET" and chave is None:
+            with contexto.trava.leitura():
+                return 200, [dict(a) for a in contexto.aplicacoes]
+
+        dados = self._ler_corpo()
+        with contexto.trava.escrita():
+            if metodo == "POST" and chave is None:
+                status, resultado = 201, operacoes.registrar_aplicacao(
+                    contexto.culturas, contexto.insumos, contexto.aplicacoes, contexto.diario, dados
+                )
+            elif metodo == "DELETE" and chave is not None:
+                status, resultado = 200, operacoes.estornar_aplicacao(
+                    contexto.insumos, contexto.aplicacoes, contexto.diario, chave
+                )
+            else:
+                return 405, {"erro": "Método não permitido para esta rota."}
+            # Lápides desta remoção ou de remoções de outros processos trazidas do diário
+            _limpar_lapides(contexto.diario)
+            resultado = dict(resultado)
+            seq = contexto.diario.seq
+
+        contexto.gravacao.confirmar(seq)
+        return status, resultado
+
+    def do_GET(self):
+        self._tratar("GET")
+
+    def do_POST(self):
+        self._tratar("POST")
+
+    def do_PATCH(self):
+        self._tratar("PATCH")
+
+    def do_PUT(self):
+        self._tratar("PUT")
+
+    def do_DELETE(self):
+        self._tratar("DELETE")
+
+# ===========================
+# INÍCIO DO SERVIÇO
+# ===========================
+
+def _encerrar(*_):
+    raise KeyboardInterrupt
+
+
+def servir(culturas, insumos, diario, host="127.0.0.1", porta=8080, trabalhadores=16):
+    """Atende requisições até Ctrl+C; ao sair, grava o que estiver pendente."""
+    contexto = Contexto(culturas, insumos, diario)
+    servidor = ServidorFarmTech((host, porta), contexto, trabalhadores)
+    print(f"🌐 FarmTech atendendo em http://{host}:{servidor.server_address[1]} (Ctrl+C para sair)")
+
+    # SIGTERM (ex.: systemd, kill) encerra como o Ctrl+C, gravando o que falta
+    if threading.current_thread() is threading.main_thread():
+        signal.signal(signal.SIGTERM, _encerrar)
+
+    _limpar_lapides(diario)
+    with diario.em_lote():
+        contexto.gravacao.iniciar()
+        try:
+            servidor.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            servidor.server_close()
+            contexto.gravacao.parar()
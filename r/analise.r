@@ -14,9 +14,25 @@ library(ggplot2)
 # 1. Ler os dados exportados pelo Python
 # ================================
 
+# Se houver exportação Arrow (python gestao_agricola.py exportar --formato arrow)
+# tão recente quanto o CSV e o pacote arrow estiver instalado, lê as colunas
+# já tipadas, mapeadas em memória, em vez de interpretar o CSV.
+ler_colecao <- function(nome) {
+  csv   <- file.path("../dados", paste0(nome, ".csv"))
+  arrow <- file.path("../dados", paste0(nome, ".arrow"))
+  if (requireNamespace("arrow", quietly = TRUE) && file.exists(arrow) &&
+      (!file.exists(csv) || file.mtime(arrow) >= file.mtime(csv))) {
+    if (dir.exists(arrow)) {  # exportação particionada (--particionar)
+      return(as.data.frame(dplyr::collect(arrow::open_dataset(arrow, format = "arrow"))))
+    }
+    return(as.data.frame(arrow::read_feather(arrow, mmap = TRUE)))
+  }
+  read.csv(csv, encoding = "UTF-8")
+}
+
 tryCatch({
-  culturas <- read.csv("../dados/culturas.csv", encoding = "UTF-8")
-  insumos  <- read.csv("../dados/insumos.csv", encoding = "UTF-8")
+  culturas <- ler_colecao("culturas")
+  insumos  <- ler_colecao("insumos")
   print("✅ Dados carregados com sucesso!")
 }, error = function(e) {
   stop("❌ ERRO: Arquivos CSV não encontrados. Execute primeiro o programa em Python para gerar os dados.")
@@ -61,7 +77,26 @@ url <- paste0("https://api.openweathermap.org/data/2.5/weather?",
               "&units=metric&lang=pt_br&appid=", api_key)
 
 clima_info <- NULL
+
+# Reaproveita a leitura gravada pelo Python (dados/clima.json) enquanto for recente
+ttl_clima <- 600
 tryCatch({
+  cache_clima <- fromJSON("../dados/clima.json")
+  leitura <- cache_clima[[sprintf("%.2f,%.2f", lat, lon)]]$leitura
+  if (!is.null(leitura) &&
+      as.numeric(Sys.time()) - leitura$obtido_em < ttl_clima) {
+    clima_info <- data.frame(
+      Local = leitura$local,
+      Temperatura = leitura$temperatura,
+      Umidade = leitura$umidade,
+      Condicao = leitura$condicao
+    )
+    print("🌤️ Dados de clima do cache (dados/clima.json):")
+    print(clima_info)
+  }
+}, error = function(e) NULL)
+
+if (is.null(clima_info)) tryCatch({
   res <- GET(url)
   if (status_code(res) == 200) {
     dados_clima <- fromJSON(content(res, "text"))